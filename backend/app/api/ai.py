@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from ...database import get_db
-from ...models import AIQuery, AIResponse
-from ...auth import get_current_user
-from ...integrations.ai import process_ai_query
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import SessionLocal, get_db, get_async_read_db
+from ..models import AIQuery, AIResponse
+from ..auth import get_current_user
+from ..integration.ai import process_ai_query, stream_ai_query
+from ..utils.sse import sse_response
+from .. import crud_async
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -16,11 +19,26 @@ def ai_query(query_obj: AIQuery, current_user = Depends(get_current_user), db: S
     response = process_ai_query(db, current_user.user_id, query_obj)
     return response
 
+@router.post("/query/stream")
+def ai_query_stream(query_obj: AIQuery, current_user = Depends(get_current_user)):
+    """
+    /ai/query as server-sent events: `start` (answer source), `token` events as the answer is generated,
+    then `done` with the full AIResponse (or `error`).
+    """
+    user_id = current_user.user_id
+
+    def events():
+        db = SessionLocal()  # Owned by the stream: it outlives the endpoint call
+        try:
+            yield from stream_ai_query(db, user_id, query_obj)
+        finally:
+            db.close()
+    return sse_response(events())
+
 @router.get("/history")
-def get_ai_history(limit: int = 10, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+async def get_ai_history(limit: int = 10, db: AsyncSession = Depends(get_async_read_db), current_user = Depends(get_current_user)):
     """
     Retrieve conversation history (persistent memory).
     """
-    from ...crud import get_ai_memory
-    memories = get_ai_memory(db, current_user.user_id, limit)
+    memories = await crud_async.get_ai_memory(db, current_user.user_id, limit)
     return [{"query": m.query, "response": m.response, "timestamp": m.timestamp} for m in memories]
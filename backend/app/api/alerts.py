@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from typing import List, Optional
+import asyncio
+from ..database import SessionLocal
+from ..auth import get_current_user, user_from_token
+from ..utils.alerts import broker
+from ..utils.sse import sse_response
+
+router = APIRouter(prefix="/alerts", tags=["alerts"])
+
+ALERT_HEARTBEAT = 15  # Seconds between keep-alive pings on an idle stream
+
+async def _alert_events(site_ids, regions, states):
+    """
+    (event, data) pairs for one subscriber until the client goes away; pings keep idle proxies from closing it.
+    Subscribes on first iteration, so a stream that never starts never registers and every registration is undone here.
+    """
+    subscription = broker.subscribe(site_ids, regions, states)
+    try:
+        yield "ready", {"site_ids": sorted(subscription.site_ids), "regions": sorted(subscription.regions), "states": sorted(subscription.states)}
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), ALERT_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield "ping", {"dropped": subscription.dropped}
+                continue
+            yield event["type"], event
+    finally:
+        broker.unsubscribe(subscription)
+
+@router.get("/stream")
+async def stream_alerts(
+    site_id: Optional[List[int]] = Query(None),
+    region: Optional[List[str]] = Query(None),
+    state: Optional[List[str]] = Query(None),
+    current_user = Depends(get_current_user),
+):
+    """
+    Server-sent deviation alerts: `band` (a block settled in the partial/full band) and `settlement`
+    (new site-day totals). Filter with repeated site_id, region or state parameters; none means all sites.
+    """
+    return sse_response(_alert_events(site_id, region, state))
+
+@router.websocket("/ws")
+async def alerts_socket(
+    websocket: WebSocket,
+    token: str,
+    site_id: Optional[List[int]] = Query(None),
+    region: Optional[List[str]] = Query(None),
+    state: Optional[List[str]] = Query(None),
+):
+    """/alerts/stream over a WebSocket (?token=<access token>); each message is one event as JSON."""
+    db = SessionLocal()
+    try:
+        await user_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    finally:
+        db.close()
+    await websocket.accept()
+    subscription = broker.subscribe(site_id, region, state)
+
+    async def watch_disconnect():
+        while True:
+            if (await websocket.receive())["type"] == "websocket.disconnect":
+                return
+    disconnected = asyncio.ensure_future(watch_disconnect())  # Clients only listen; notice when they leave
+    getter = None
+    try:
+        while True:
+            getter = getter or asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await websocket.send_json(getter.result())
+                getter = None
+            if disconnected in done:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (getter, disconnected):
+            if task is not None:
+                task.cancel()
+        broker.unsubscribe(subscription)
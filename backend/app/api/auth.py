@@ -1,30 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from ...database import get_db
-from ...crud import create_user, get_user_by_email
-from ...models import UserCreate
-from ...auth import verify_password, create_access_token, get_current_user
+from starlette.concurrency import run_in_threadpool
+from ..database import get_db
+from ..crud import create_user, get_user_by_email, update_user_role
+from ..models import UserCreate, User, RoleEnum
+from ..auth import verify_password_async, get_password_hash_async, create_access_token, get_current_user, require_role, invalidate_user_cache
 import os
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/login")
-def login(form_data: dict, db: Session = Depends(get_db)):  # Use form or body
+async def login(form_data: dict, db: Session = Depends(get_db)):  # Use form or body
     email = form_data.get("email")
     password = form_data.get("password")
-    user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.password_hash):
+    user = await run_in_threadpool(get_user_by_email, db, email)
+    if not user or not await verify_password_async(password, user.password_hash):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     access_token = create_access_token({"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer", "role": user.role.value}
+    return {"access_token": access_token, "token_type": "bearer", "role": user.role}
 
 @router.post("/register")
-def register(user: UserCreate, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def register(user: UserCreate, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
     # Admin only
     if current_user.role.value != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
-    return create_user(db, user)
+    password_hash = await get_password_hash_async(user.password)  # bcrypt on its own pool, like login
+    return User.model_validate(await run_in_threadpool(create_user, db, user, password_hash))
+
+@router.put("/users/{user_id}/role")
+def change_role(user_id: int, role: RoleEnum, current_user = Depends(require_role("admin")), db: Session = Depends(get_db)):
+    db_user = update_user_role(db, user_id, role.value, current_user.user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_cache(db_user.email)  # This worker sees it immediately; other workers within USER_CACHE_TTL
+    return User.model_validate(db_user)
 
 @router.get("/me")
-def read_users_me(current_user: dict = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
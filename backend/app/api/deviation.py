@@ -1,5 +1,38 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import date
-from ...database import get_db
-from ...crud import calculate_and_store_deviation, get_dsm_summary
+from typing import Optional
+from ..database import get_db, get_read_db
+from ..crud import calculate_and_store_deviation, get_dsm_summary, settle_site_days
+from ..auth import get_current_user
+
+router = APIRouter(prefix="/deviation", tags=["deviation"])
+
+@router.post("/calculate/{site_id}/{target_date}/{block_no}")
+def calculate_block(site_id: int, target_date: date, block_no: int, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Recalculate deviation/DSM for a single block.
+    """
+    result = calculate_and_store_deviation(db, site_id, target_date, block_no, current_user.user_id)
+    if result is None:
+        raise HTTPException(404, "Schedule, generation or site missing for block")
+    return result
+
+@router.post("/settle")
+def settle(start_date: date, end_date: date, site_id: Optional[int] = None, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Batch settlement for one site or the whole fleet over a date range (e.g., month-end).
+    """
+    if end_date < start_date:
+        raise HTTPException(400, "end_date must not be before start_date")
+    summary = settle_site_days(db, [site_id] if site_id else None, start_date, end_date, current_user.user_id)
+    return {"message": "DSM settled", **summary}
+
+@router.get("/summary/{site_id}/{target_date}")
+def get_summary(site_id: int, target_date: date, db: Session = Depends(get_read_db)):
+    settlements = get_dsm_summary(db, site_id, target_date)
+    return {
+        "blocks": [{"block_no": s.block_no, "payable": s.dsm_payable, "receivable": s.dsm_receivable, "market_price": s.market_price} for s in settlements],
+        "total_payable": sum(s.dsm_payable for s in settlements),
+        "total_receivable": sum(s.dsm_receivable for s in settlements),
+    }
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import pandas as pd
 from io import BytesIO
 from datetime import date
-from ...database import get_db
-from ...crud import upload_generation
-from ...models import GenerationUpload
-from ...auth import get_current_user
+from ..database import get_db, get_async_read_db
+from ..crud import upload_generation, settle_site_days, get_site_ids, store_generation_day
+from .. import crud_async
+from ..models import GenerationUpload
+from ..auth import get_current_user
+from ..utils.audit import log_action
+from ..utils.ingest import CHUNK_ROWS, STREAM_EXTENSIONS, iter_upload_frames, ingest_block_frames
 
 router = APIRouter(prefix="/generation", tags=["generation"])
 
@@ -36,19 +40,38 @@ def upload_generation_file(file: UploadFile = File(...), current_user = Depends(
             blocks=[{"block_no": int(row['block_no']), "scheduled_mw": float(row['actual_mw'])} for _, row in df.iterrows()]  # Map to model
         )
         upload_generation(db, upload_data, current_user.user_id)
-        # Auto-trigger DSM calc after upload
-        for block in upload_data.blocks:
-            from ...crud import calculate_and_store_deviation
-            calculate_and_store_deviation(db, upload_data.site_id, upload_data.date, block.block_no, current_user.user_id)
+        # Auto-trigger DSM calc after upload (whole day in one vectorized pass)
+        settle_site_days(db, [upload_data.site_id], upload_data.date, upload_data.date, current_user.user_id)
         return {"message": "Generation uploaded and DSM calculated", "blocks": 96}
     except Exception as e:
         raise HTTPException(400, f"Upload error: {str(e)}")
 
+@router.post("/upload/bulk")
+def upload_generation_bulk(file: UploadFile = File(...), chunk_rows: int = CHUNK_ROWS, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Streaming upload of actuals for many sites and days (CSV, XLSX, JSON or JSON Lines).
+    Each complete 96-block day is written as one batch and settled; returns a per-group report,
+    including when the file breaks off partway; it fails with 400 only if nothing was written.
+    """
+    if not file.filename.lower().endswith(STREAM_EXTENSIONS):
+        raise HTTPException(400, "Only CSV, Excel or JSON allowed")
+    try:
+        report = ingest_block_frames(
+            iter_upload_frames(file.file, file.filename, chunk_rows),
+            "actual_mw",
+            get_site_ids(db),
+            lambda site_id, day, values: store_generation_day(db, site_id, day, values, current_user.user_id),
+        )
+    except Exception as e:
+        raise HTTPException(400, f"Upload error: {str(e)}")
+    log_action(db, current_user.user_id, "bulk_upload_generation", {"file": file.filename, "rows": report["rows"], "accepted": report["accepted"], "rejected": report["rejected"]})
+    return report
+
 @router.get("/{site_id}/{target_date}")
-def get_generation_detail(site_id: int, target_date: date, db: Session = Depends(get_db)):
-    return {"blocks": get_generation(db, site_id, target_date)}
+async def get_generation_detail(site_id: int, target_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    return {"blocks": await crud_async.get_generation(db, site_id, target_date)}
 
 @router.get("/summary/{site_id}/{target_date}")
-def get_summary(site_id: int, target_date: date, db: Session = Depends(get_db)):
-    gens = get_generation(db, site_id, target_date)
+async def get_summary(site_id: int, target_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    gens = await crud_async.get_generation(db, site_id, target_date)
     return {"total_actual": sum(g.actual_mw for g in gens), "avg_mw": sum(g.actual_mw for g in gens) / len(gens) if gens else 0}
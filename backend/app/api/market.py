@@ -1,30 +1,30 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
-from ...database import get_db
-from ...crud import get_market_prices, upload_market
-from ...models import MarketUpload
-from ...auth import get_current_user, require_role
-from ...integrations.iex import fetch_dam_prices
+from ..database import get_db, get_async_db
+from ..crud import upload_market
+from ..models import MarketUpload
+from ..auth import get_current_user, require_role
+from ..integration.iex import get_cached_market_prices, invalidate_price_cache
 
 router = APIRouter(prefix="/market", tags=["market"])
 
 @router.get("/dam/{target_date}")
-def get_dam_prices(target_date: date, db: Session = Depends(get_db)):
+async def get_dam_prices(target_date: date, db: AsyncSession = Depends(get_async_db)):
     """
-    Get DAM prices for date (auto-fetches from IEX if missing).
+    Get DAM prices for date (fetches from IEX only if the date is not fully stored).
     """
-    fetch_dam_prices(target_date, db)  # Ensure data
-    prices = get_market_prices(db, target_date)
-    return {"date": target_date, "blocks": [{"block_no": p.block_no, "dam_price": p.dam_price, "rtm_price": p.rtm_price} for p in prices]}
+    blocks = await get_cached_market_prices(db, target_date)
+    return {"date": target_date, "blocks": [{"block_no": b["block_no"], "dam_price": b["dam_price"], "rtm_price": b["rtm_price"]} for b in blocks]}
 
 @router.get("/rtm/{target_date}")
-def get_rtm_prices(target_date: date, db: Session = Depends(get_db)):
+async def get_rtm_prices(target_date: date, db: AsyncSession = Depends(get_async_db)):
     """
-    Get RTM prices (similar; mock if no API).
+    Get RTM prices (stored alongside DAM; no separate RTM feed yet).
     """
-    # Similar to DAM; use same fetch or separate RTM endpoint
-    return get_dam_prices(target_date, db)  # Placeholder; adapt for RTM
+    blocks = await get_cached_market_prices(db, target_date)
+    return {"date": target_date, "blocks": [{"block_no": b["block_no"], "rtm_price": b["rtm_price"]} for b in blocks]}
 
 @router.post("/update")
 def update_market_prices(upload: MarketUpload, current_user = Depends(require_role("admin")), db: Session = Depends(get_db)):
@@ -32,4 +32,5 @@ def update_market_prices(upload: MarketUpload, current_user = Depends(require_ro
     Manual override for prices (e.g., testing).
     """
     upload_market(db, upload, current_user.user_id)
+    invalidate_price_cache(upload.date)
     return {"message": "Market prices updated", "blocks": len(upload.blocks)}
@@ -1,88 +1,200 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from io import BytesIO
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
-from ...database import get_db
-from ...crud import create_report, get_reports, get_dsm_summary
-from ...models import ReportRequest
-from ...auth import get_current_user
-from ...utils.email import send_daily_report
-from ...utils.dsm_calc import calculate_dsm  # For summaries
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import os
+import time
+from ..database import get_db, get_async_db, get_async_read_db
+from .. import crud_async
+from ..auth import get_current_user
+from ..utils.email import send_daily_report
+from ..utils.report_render import EXPORT_FORMATS, artifact_path, artifacts_ready, find_pending_job, get_job_status, submit_render
+from ..utils.periods import period_range
+from ..utils.sse import sse_response
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+REPORT_STREAM_POLL = 0.25  # Seconds between render progress checks
+REPORT_STREAM_TIMEOUT = int(os.getenv("REPORT_STREAM_TIMEOUT", "300"))  # Seconds a progress stream waits for its render
+
+def _rollup(site_rows: list[dict], key: str) -> list[dict]:
+    groups = {}
+    for row in site_rows:
+        group = groups.setdefault(row[key], {key: row[key], "sites": 0, "blocks": 0, "total_payable": 0.0, "total_receivable": 0.0})
+        group["sites"] += 1
+        group["blocks"] += row["blocks"]
+        group["total_payable"] += row["total_payable"]
+        group["total_receivable"] += row["total_receivable"]
+    for group in groups.values():
+        group["net"] = group["total_receivable"] - group["total_payable"]
+    return list(groups.values())
+
+async def _dsm_breakdown(db: AsyncSession, start: date, end: date, site_id: Optional[int] = None) -> dict:
+    """Totals plus by-site/region/state breakdowns from a single grouped query."""
+    by_site = await crud_async.aggregate_dsm_by_site(db, start, end, site_id)
+    for row in by_site:
+        row["net"] = row["total_receivable"] - row["total_payable"]
+    total_payable = sum(row["total_payable"] for row in by_site)
+    total_receivable = sum(row["total_receivable"] for row in by_site)
+    return {
+        "start_date": str(start),
+        "end_date": str(end),
+        "total_payable": total_payable,
+        "total_receivable": total_receivable,
+        "net": total_receivable - total_payable,
+        "by_site": by_site,
+        "by_region": _rollup(by_site, "region"),
+        "by_state": _rollup(by_site, "state"),
+    }
+
+async def _report_cache_key(db: AsyncSession, report_type: str, period: str, site_id: Optional[int], start: date, end: date) -> str:
+    """Content address: same type/period/site over unchanged settlements -> same key."""
+    stamp = await crud_async.get_dsm_version_stamp(db, start, end, site_id)
+    return hashlib.sha256(json.dumps([report_type, period, site_id, stamp]).encode()).hexdigest()
+
+def _export_status(report_id: int, render_args: Optional[tuple] = None) -> dict:
+    """Reuse rendered or in-flight exports; queue a render only when neither exists."""
+    if artifacts_ready(report_id):
+        job_id, status = None, "done"
+    else:
+        job_id = find_pending_job(report_id)
+        if job_id is None and render_args is not None:
+            job_id = submit_render(report_id, *render_args)
+        status = "queued" if job_id else "missing"
+    return {
+        "job_id": job_id,
+        "status": status,
+        "downloads": {fmt: f"/reports/{report_id}/download/{fmt}" for fmt in EXPORT_FORMATS},
+    }
+
 @router.get("/daily/{target_date}")
-def get_daily_report(target_date: date, site_id: Optional[int] = None, db: Session = Depends(get_db)):
+async def get_daily_report(target_date: date, site_id: Optional[int] = None, db: AsyncSession = Depends(get_async_db), read_db: AsyncSession = Depends(get_async_read_db)):
     """
-    Generate daily DSM report (JSON + optional PDF/Excel export).
+    Generate daily DSM report (JSON now; PDF/Excel rendered in the background).
+    Aggregates read from the replica; the report row is written to the primary.
     """
-    summaries = []
+    cache_key = await _report_cache_key(read_db, 'daily', str(target_date), site_id, target_date, target_date)
+    report = await crud_async.get_report_by_cache_key(db, cache_key)  # Unchanged data -> reuse stored report
+    cached = report is not None
+    if cached:
+        json_data = report.json_data
+    elif site_id:
+        summaries = await crud_async.get_dsm_summary(read_db, site_id, target_date)
+        if not summaries:
+            raise HTTPException(404, "No data for date")
+        # JSON data for charts
+        json_data = {"date": str(target_date), "blocks": [{"block_no": s.block_no, "payable": s.dsm_payable, "receivable": s.dsm_receivable} for s in summaries]}
+    else:
+        # All sites: one grouped aggregate
+        json_data = {"date": str(target_date), **await _dsm_breakdown(read_db, target_date, target_date)}
+        if not json_data["by_site"]:
+            raise HTTPException(404, "No data for date")
+
     if site_id:
-        summaries = get_dsm_summary(db, site_id, target_date)
+        rows = json_data["blocks"]
+        lines = [f"Block {b['block_no']}: Payable INR {b['payable']}, Receivable INR {b['receivable']}" for b in rows]
     else:
-        # All sites; aggregate (expand query)
-        pass
-    
-    if not summaries:
-        raise HTTPException(404, "No data for date")
-    
-    # JSON data for charts
-    json_data = {"date": target_date, "blocks": [{"block_no": s.block_no, "payable": s.dsm_payable, "receivable": s.dsm_receivable} for s in summaries]}
-    report = create_report(db, site_id, 'daily', str(target_date), json_data)
-    
-    # PDF Export (simple)
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.drawString(100, 750, f"Daily DSM Report - {target_date}")
-    y = 700
-    for s in summaries:
-        p.drawString(100, y, f"Block {s.block_no}: Payable INR {s.dsm_payable}, Receivable INR {s.dsm_receivable}")
-        y -= 20
-    p.save()
-    buffer.seek(0)
-    pdf_base64 = base64.b64encode(buffer.read()).decode()
-    
-    # Excel Export (via pandas)
-    df = pd.DataFrame(json_data["blocks"])
-    excel_buffer = BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    excel_buffer.seek(0)
-    excel_base64 = base64.b64encode(excel_buffer.read()).decode()
-    
+        rows = json_data["by_site"]
+        lines = [f"{r['site_name']}: Payable INR {r['total_payable']:.2f}, Receivable INR {r['total_receivable']:.2f}" for r in rows]
+    if not cached:
+        report = await crud_async.create_report(db, site_id, 'daily', str(target_date), json_data, cache_key)
+
+    # PDF/Excel exports render on the worker pool; poll the job, then download
     return {
         "report_id": report.report_id,
         "json_data": json_data,
-        "pdf_export": pdf_base64,
-        "excel_export": excel_base64
+        "cached": cached,
+        **_export_status(report.report_id, (f"Daily DSM Report - {target_date}", lines, rows)),
     }
 
+async def _render_progress(report: dict):
+    """
+    `data` with the report JSON, then `pdf` and `xlsx` as each artifact lands (the worker writes them in
+    that order, atomically), then `done`; `error` if the render fails or outlasts REPORT_STREAM_TIMEOUT.
+    """
+    yield "data", report
+    report_id, job_id = report["report_id"], report["job_id"]
+    pending = list(EXPORT_FORMATS)
+    deadline = time.monotonic() + REPORT_STREAM_TIMEOUT
+    while True:
+        status = get_job_status(job_id) if job_id else None  # Read before the files: "done" then implies both exist
+        while pending and os.path.exists(artifact_path(report_id, pending[0])):
+            fmt = pending.pop(0)
+            yield fmt, {"report_id": report_id, "download": report["downloads"][fmt]}
+        if not pending:
+            break
+        if status is None or status["status"] in ("done", "failed"):
+            yield "error", status or {"report_id": report_id, "status": "missing"}
+            return
+        if time.monotonic() > deadline:
+            yield "error", {**status, "error": "Timed out waiting for the render"}
+            return
+        await asyncio.sleep(REPORT_STREAM_POLL)
+    yield "done", {"report_id": report_id, "downloads": report["downloads"]}
+
+@router.get("/daily/{target_date}/stream")
+async def stream_daily_report(target_date: date, site_id: Optional[int] = None, db: AsyncSession = Depends(get_async_db), read_db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Daily report as server-sent events: the JSON as soon as it is loaded, then PDF and Excel progress.
+    """
+    report = await get_daily_report(target_date, site_id, db, read_db)  # 404 before the stream starts
+    return sse_response(_render_progress(report))
+
 @router.get("/monthly/{month}")  # e.g., month='2025-10'
-def get_monthly_report(month: str, site_id: Optional[int] = None, db: Session = Depends(get_db)):
-    """
-    Monthly consolidated report (aggregate DSM).
-    """
-    # Parse month to dates (simplified)
-    year, mon = map(int, month.split('-'))
-    # Fetch all days in month, sum DSM
-    total_payable = 0.0
-    total_receivable = 0.0
-    # Loop days (use calendar module for full)
-    for day in range(1, 32):  # Rough
-        try:
-            d = date(year, mon, day)
-            summaries = get_dsm_summary(db, site_id, d) if site_id else []
-            total_payable += sum(s.dsm_payable for s in summaries)
-            total_receivable += sum(s.dsm_receivable for s in summaries)
-        except ValueError:
-            continue
-    
-    json_data = {"month": month, "total_payable": total_payable, "total_receivable": total_receivable, "net": total_receivable - total_payable}
-    report = create_report(db, site_id, 'monthly', month, json_data)
-    return {"report_id": report.report_id, "data": json_data}
+async def get_monthly_report(month: str, site_id: Optional[int] = None, db: AsyncSession = Depends(get_async_db), read_db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Monthly consolidated report (aggregate DSM), one grouped query for any number of sites/days.
+    """
+    start, end = period_range(month)
+    cache_key = await _report_cache_key(read_db, 'monthly', month, site_id, start, end)
+    report = await crud_async.get_report_by_cache_key(db, cache_key)
+    if report:
+        return {"report_id": report.report_id, "data": report.json_data, "cached": True}
+    json_data = {"month": month, **await _dsm_breakdown(read_db, start, end, site_id)}
+    report = await crud_async.create_report(db, site_id, 'monthly', month, json_data, cache_key)
+    return {"report_id": report.report_id, "data": json_data, "cached": False}
+
+@router.get("/consolidated/{period}")  # e.g., '2025-10', '2025-W41', '2025'
+async def get_consolidated_report(period: str, db: AsyncSession = Depends(get_async_db), read_db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Fleet-wide report for a day, ISO week, month or year, broken down by site, region and state.
+    """
+    start, end = period_range(period)
+    cache_key = await _report_cache_key(read_db, 'consolidated', period, None, start, end)
+    report = await crud_async.get_report_by_cache_key(db, cache_key)
+    if report:
+        return {"report_id": report.report_id, "data": report.json_data, "cached": True}
+    json_data = {"period": period, **await _dsm_breakdown(read_db, start, end)}
+    report = await crud_async.create_report(db, None, 'consolidated', period, json_data, cache_key)
+    return {"report_id": report.report_id, "data": json_data, "cached": False}
+
+@router.get("/jobs/{job_id}")
+async def get_render_job(job_id: str):
+    """
+    Status of a background PDF/Excel render (queued, running, done, failed). Jobs are tracked by the API
+    worker that queued them; other workers report "done" once the files exist and 404 until then.
+    """
+    status = get_job_status(job_id)
+    if status is None:
+        raise HTTPException(404, "Unknown job")
+    return status
+
+@router.get("/{report_id}/download/{fmt}")
+def download_report(report_id: int, fmt: str):
+    """
+    Stream a rendered artifact (fmt: pdf or xlsx) from disk.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(400, f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    path = artifact_path(report_id, fmt)
+    if not os.path.exists(path):
+        raise HTTPException(404, "Artifact not rendered (yet)")
+    return FileResponse(path, media_type=EXPORT_FORMATS[fmt], filename=f"dsm_report_{report_id}.{fmt}")
 
 @router.post("/email")
 def email_report(report_type: str, period: str, to_email: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
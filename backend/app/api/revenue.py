@@ -1,17 +1,46 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from ...database import get_db
-from ...crud import get_revenue_summary
-from ...models import RevenueSummary
-from ...auth import get_current_user
+from ..database import get_read_db
+from ..crud import get_revenue_summary, load_scenario_inputs
+from ..models import RevenueSummary, ScenarioRequest, ScenarioComparison
+from ..auth import get_current_user
+from ..utils.scenarios import run_scenarios
+from ..utils.periods import period_range
+
+MAX_SCENARIOS = 200
 
 router = APIRouter(prefix="/revenue", tags=["revenue"])
 
 @router.get("/summary/{site_id}/{month}", response_model=RevenueSummary)
-def get_revenue_analysis(site_id: int, month: str, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_revenue_analysis(site_id: int, month: str, current_user = Depends(get_current_user), db: Session = Depends(get_read_db)):
     """
     Financial summary: DSM loss/gain, scenarios (with/without DSM).
     Month e.g., '2025-10'.
     """
     summary = get_revenue_summary(db, site_id, month)
     return RevenueSummary(**summary)
+
+@router.post("/scenarios", response_model=ScenarioComparison)
+def compare_scenarios(request: ScenarioRequest, current_user = Depends(get_current_user), db: Session = Depends(get_read_db)):
+    """
+    What-if comparison for a site or the fleet over a period: band thresholds/factors, DAM vs RTM prices,
+    capacity and schedule accuracy. Block data is loaded once and all scenarios are evaluated together;
+    the baseline (current bands, DAM) is always the first row.
+    """
+    if len(request.scenarios) > MAX_SCENARIOS:
+        raise HTTPException(400, f"At most {MAX_SCENARIOS} scenarios per request")
+    if any(s.full_threshold < s.partial_threshold for s in request.scenarios):
+        raise HTTPException(400, "full_threshold must not be below partial_threshold")
+    start, end = period_range(request.period)
+    inputs = load_scenario_inputs(db, [request.site_id] if request.site_id else None, start, end)
+    if not len(inputs["actual"]):
+        raise HTTPException(404, "No schedule and generation data for period")
+    return {
+        "period": request.period,
+        "start_date": start,
+        "end_date": end,
+        "sites": inputs["sites"],
+        "site_days": inputs["site_days"],
+        "blocks": len(inputs["actual"]),
+        "results": run_scenarios(inputs, [s.model_dump(exclude_unset=True) for s in request.scenarios]),
+    }
@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import pandas as pd
 from io import BytesIO
 from datetime import date
-from ...database import get_db
-from ...crud import upload_schedule
-from ...models import ScheduleUpload
-from ...auth import get_current_user
+from ..database import get_db, get_async_read_db
+from ..crud import upload_schedule, get_site_ids, store_schedule_day
+from .. import crud_async
+from ..models import ScheduleUpload
+from ..auth import get_current_user
+from ..utils.audit import log_action
+from ..utils.ingest import CHUNK_ROWS, STREAM_EXTENSIONS, iter_upload_frames, ingest_block_frames
 
 router = APIRouter(prefix="/schedule", tags=["schedule"])
 
@@ -42,9 +46,31 @@ def upload_schedule_file(file: UploadFile = File(...), current_user = Depends(ge
     except Exception as e:
         raise HTTPException(400, f"Upload error: {str(e)}")
 
+@router.post("/upload/bulk")
+def upload_schedule_bulk(file: UploadFile = File(...), chunk_rows: int = CHUNK_ROWS, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Streaming upload for many sites and days (CSV, XLSX, JSON or JSON Lines).
+    Rows are grouped by (site_id, date); each complete 96-block day is written as one batch.
+    Returns a per-group accepted/rejected report, including when the file breaks off partway;
+    it fails with 400 only if nothing was written.
+    """
+    if not file.filename.lower().endswith(STREAM_EXTENSIONS):
+        raise HTTPException(400, "Only CSV, Excel or JSON allowed")
+    try:
+        report = ingest_block_frames(
+            iter_upload_frames(file.file, file.filename, chunk_rows),
+            "scheduled_mw",
+            get_site_ids(db),
+            lambda site_id, day, values: store_schedule_day(db, site_id, day, values),
+        )
+    except Exception as e:
+        raise HTTPException(400, f"Upload error: {str(e)}")
+    log_action(db, current_user.user_id, "bulk_upload_schedule", {"file": file.filename, "rows": report["rows"], "accepted": report["accepted"], "rejected": report["rejected"]})
+    return report
+
 @router.get("/{site_id}/{target_date}")
-def get_schedule_detail(site_id: int, target_date: date, db: Session = Depends(get_db)):
-    return {"blocks": get_schedule(db, site_id, target_date)}  # From crud
+async def get_schedule_detail(site_id: int, target_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    return {"blocks": await crud_async.get_schedule(db, site_id, target_date)}
 
 @router.put("/update")
 def update_schedule(upload: ScheduleUpload, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
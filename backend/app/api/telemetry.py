@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+import json
+from ..database import SessionLocal
+from ..auth import get_current_user, user_from_token
+from ..utils.telemetry import telemetry, parse_timestamp
+
+router = APIRouter(prefix="/telemetry", tags=["telemetry"])
+
+def _parse_samples(payload) -> tuple[list, int]:
+    """(site_id, timestamp, mw) tuples from one message or line: a sample object or a list of them; plus the reject count."""
+    items = payload if isinstance(payload, list) else [payload]
+    samples, rejected = [], 0
+    for item in items:
+        try:
+            samples.append((int(item["site_id"]), parse_timestamp(item["ts"]), float(item["mw"])))
+        except (KeyError, TypeError, ValueError):
+            rejected += 1
+    return samples, rejected
+
+def _ingest(raw: bytes | str, totals: dict):
+    if not raw.strip():
+        return
+    try:
+        samples, rejected = _parse_samples(json.loads(raw))
+    except ValueError:
+        totals["rejected"] += 1
+        return
+    result = telemetry.add_samples(samples)
+    totals["accepted"] += result["accepted"]
+    totals["late"] += result["late"]
+    totals["rejected"] += rejected
+
+@router.post("/samples")
+async def ingest_samples(request: Request, current_user = Depends(get_current_user)):
+    """
+    SCADA samples as NDJSON, typically a chunked upload: each line is {"site_id", "ts", "mw"} (ts as ISO 8601
+    or epoch seconds; naive times are IST) or a list of them. Lines are accumulated as the body streams in;
+    closed 15-minute blocks are written and settled in the background.
+    """
+    totals = {"accepted": 0, "late": 0, "rejected": 0}
+    pending = b""
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            _ingest(line, totals)
+    _ingest(pending, totals)
+    return totals
+
+@router.websocket("/ws")
+async def telemetry_socket(websocket: WebSocket, token: str):
+    """
+    Long-lived SCADA feed (?token=<access token>): each text message is one sample or a list of samples,
+    in the /telemetry/samples format, and is acknowledged with its accepted/late/rejected counts.
+    """
+    db = SessionLocal()
+    try:
+        await user_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=1008)  # Policy violation: bad or expired token
+        return
+    finally:
+        db.close()
+    await websocket.accept()
+    try:
+        while True:
+            totals = {"accepted": 0, "late": 0, "rejected": 0}
+            _ingest(await websocket.receive_text(), totals)
+            await websocket.send_json(totals)
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/status")
+def telemetry_status(current_user = Depends(get_current_user)):
+    """Accumulator counters: samples taken, late samples, blocks closed/written and blocks still open."""
+    return {**telemetry.stats, "open_blocks": telemetry.open_blocks()}
@@ -1,35 +1,48 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
-from ...database import get_db
-from ...crud import get_weather
-from ...models import WeatherResponse
-from ...auth import get_current_user
-from ...integrations.weather import fetch_weather
-from ...crud import get_site  # For lat/lon
+from typing import List, Optional
+from fastapi import Query
+from ..database import SessionLocal, get_db, get_async_db, get_async_read_db
+from .. import crud_async
+from ..models import WeatherResponse
+from ..auth import get_current_user, require_role
+from ..integration.weather import fetch_weather, refresh_fleet_weather
 
 router = APIRouter(prefix="/weather", tags=["weather"])
 
 @router.get("/{site_id}/{target_date}", response_model=list[WeatherResponse])
-def get_weather_data(site_id: int, target_date: date, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_weather_data(site_id: int, target_date: date, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """
     Get weather for site/date (auto-fetches from OpenWeather if missing).
     """
-    site = get_site(db, site_id)
+    site = await crud_async.get_site(db, site_id)
     if not site or not site.latitude or not site.longitude:
         raise HTTPException(400, "Site location (lat/lon) required for weather fetch")
     
-    fetch_weather(site.latitude, site.longitude, target_date, site_id, db)  # Populate if needed
-    weather_blocks = get_weather(db, site_id, target_date)
+    weather_blocks = await crud_async.get_weather(db, site_id, target_date)
+    if len(weather_blocks) < 96:
+        with SessionLocal() as write_db:  # Storing stays on the sync crud path
+            await fetch_weather(site.latitude, site.longitude, target_date, site_id, write_db)  # Populate if needed
+        weather_blocks = await crud_async.get_weather(db, site_id, target_date)
     return [WeatherResponse(irradiance=w.irradiance, temp=w.temp, wind_speed=w.wind_speed, cloud_cover=w.cloud_cover) for w in weather_blocks]
 
+@router.post("/refresh/{target_date}")
+async def refresh_weather(target_date: date, site_ids: Optional[List[int]] = Query(None), force: bool = False, current_user = Depends(require_role("admin")), db: Session = Depends(get_db)):
+    """
+    Fleet weather refresh (e.g., every morning): concurrent fetch, one request per shared grid cell,
+    already-stored site-days skipped unless force=true.
+    """
+    return await refresh_fleet_weather(db, target_date, site_ids, force)
+
 @router.get("/forecast/{site_id}/{target_date}")
-def get_weather_forecast(site_id: int, target_date: date, db: Session = Depends(get_db)):
+async def get_weather_forecast(site_id: int, target_date: date, db: AsyncSession = Depends(get_async_read_db)):
     """
     Simple forecast (use OpenWeather forecast endpoint; mock here).
     """
     # Similar to get_weather but for future date (API supports up to 5 days)
-    site = get_site(db, site_id)
+    site = await crud_async.get_site(db, site_id)
     if not site:
         raise HTTPException(404, "Site not found")
     # Mock forecast
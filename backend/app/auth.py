@@ -1,26 +1,55 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from typing import Optional
+from collections import OrderedDict
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from .database import get_db
 from .crud import get_user_by_email
 from .models import User
+from .utils.security import verify_password_async, get_password_hash_async  # noqa: F401  (re-exported for api/auth.py)
 import os
+import threading
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkeychangeme")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24  # 1 day for enterprise
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved users by token subject; bounds how long a deleted user's token keeps working
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))  # Seconds
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+_user_cache: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+def _user_cache_get(email: str) -> Optional[User]:
+    with _user_cache_lock:
+        entry = _user_cache.get(email)
+        if entry is None or entry[0] < time.monotonic():
+            _user_cache.pop(email, None)
+            return None
+        _user_cache.move_to_end(email)
+        return entry[1]
+
+def _user_cache_put(email: str, user: User):
+    with _user_cache_lock:
+        _user_cache[email] = (time.monotonic() + USER_CACHE_TTL, user)
+        _user_cache.move_to_end(email)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def invalidate_user_cache(email: str = None):
+    """Drop one user (after a role change) or everyone."""
+    with _user_cache_lock:
+        if email is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(email, None)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -36,25 +65,40 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
+    """
+    Resolve the bearer token to a User. Cached per subject for USER_CACHE_TTL; on a miss the
+    lookup runs in the threadpool so the event loop never waits on the DB.
+    Returns a detached pydantic User (not an ORM object), safe to share across requests.
+    """
+    return await user_from_token(credentials.credentials, db)
+
+async def user_from_token(token: str, db: Session) -> User:
+    """get_current_user for a raw access token (e.g. a WebSocket's ?token=); raises 401 HTTPException."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=email)
-    if user is None:
-        raise credentials_exception
+    user = _user_cache_get(email)
+    if user is not None:
+        return user
+    db_user = await run_in_threadpool(get_user_by_email, db, email)
+    if db_user is None:
+        raise credentials_exception  # Not cached: a user created later must not be locked out
+    user = User.model_validate(db_user)
+    _user_cache_put(email, user)
     return user
 
 def require_role(required_role: str):
-    def role_dep(current_user: User = Depends(get_current_user)):
+    # async so the role check doesn't cost a threadpool hop per request
+    async def role_dep(current_user: User = Depends(get_current_user)):
         if current_user.role.value != required_role:
             raise HTTPException(status_code=403, detail=f"Role {current_user.role.value} not authorized for this action")
         return current_user
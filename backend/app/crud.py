@@ -1,16 +1,25 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from .schemas import User, Site, Schedule, Generation, Deviation, DsmSettlement, MarketPrice, WeatherData, Report, AuditLog, AiMemory
-from .models import UserCreate, SiteCreate, ScheduleUpload, GenerationUpload
-from .auth import get_password_hash
-from .utils.audit import log_action  # Circular? Import at bottom if needed
+from sqlalchemy import and_, case, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+import os
+from .schemas import User, Site, Schedule, Generation, Deviation, DsmSettlement, DsmSiteDay, DsmSiteMonth, MarketPrice, WeatherData, Report, AuditLog, AiMemory, AiSummary, SiteDayBlocks, NightlyCheckpoint, BLOCKS_PER_DAY
+from .models import UserCreate, SiteCreate, ScheduleUpload, GenerationUpload, MarketUpload, MarketPriceBlock
+from .utils.security import get_password_hash
+from .utils.audit import log_action
+from .utils.alerts import broker
+from .utils.dsm_calc import PENALTY_BANDS, PENALTY_CODES, calculate_dsm, calculate_dsm_batch
 
 # Users
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate) -> User:
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, password_hash: str = None) -> User:
+    """password_hash: already hashed by the caller (async routes hash off the threadpool); else hashed here."""
+    hashed_password = password_hash or get_password_hash(user.password)
     db_user = User(name=user.name, email=user.email, password_hash=hashed_password, role=user.role)
     db.add(db_user)
     db.commit()
@@ -18,10 +27,29 @@ def create_user(db: Session, user: UserCreate) -> User:
     log_action(db, db_user.user_id, "create_user", {"email": user.email})  # Audit
     return db_user
 
+def update_user_role(db: Session, user_id: int, role: str, actor_id: int):
+    """Returns the updated user, or None if it doesn't exist. Callers must invalidate auth's user cache."""
+    db_user = db.query(User).filter(User.user_id == user_id).first()
+    if db_user is None:
+        return None
+    previous = db_user.role
+    db_user.role = role
+    log_action(db, actor_id, "update_user_role", {"user_id": user_id, "from": previous, "to": role}, strict=True)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
 # Sites
 def get_sites(db: Session, skip: int = 0, limit: int = 100):
     return db.query(Site).offset(skip).limit(limit).all()
 
+def get_located_sites(db: Session, site_ids: list[int] = None):
+    """Sites with coordinates (weather-capable), optionally restricted to site_ids."""
+    query = db.query(Site).filter(Site.latitude.isnot(None), Site.longitude.isnot(None))
+    if site_ids:
+        query = query.filter(Site.site_id.in_(site_ids))
+    return query.order_by(Site.site_id).all()
+
 def create_site(db: Session, site: SiteCreate, user_id: int) -> Site:
     db_site = Site(**site.dict())
     db.add(db_site)
@@ -30,42 +58,885 @@ def create_site(db: Session, site: SiteCreate, user_id: int) -> Site:
     log_action(db, user_id, "create_site", {"site_id": db_site.site_id})
     return db_site
 
+def update_site(db: Session, site_id: int, site: SiteCreate, user_id: int) -> Site:
+    db_site = get_site(db, site_id)
+    if db_site is None:
+        return None
+    for field, value in site.dict().items():
+        setattr(db_site, field, value)
+    db.commit()
+    db.refresh(db_site)
+    log_action(db, user_id, "update_site", {"site_id": site_id})
+    return db_site
+
 def get_site(db: Session, site_id: int) -> Site:
     return db.query(Site).filter(Site.site_id == site_id).first()
 
+def get_site_ids(db: Session) -> set:
+    return set(db.execute(select(Site.site_id)).scalars())
+
+def get_site_names(db: Session) -> dict:
+    return dict(db.execute(select(Site.site_id, Site.site_name)).all())
+
+# Bulk upserts
+UPSERT_BATCH_SIZE = 500  # Rows per statement; keeps SQLite under its bound-parameter limit
+
+def upsert_rows(db: Session, model, rows: list[dict], conflict_cols: list[str], update_cols: list[str]):
+    """
+    INSERT ... ON CONFLICT (conflict_cols) DO UPDATE SET update_cols for many rows at once.
+    Native upsert on PostgreSQL and SQLite (needs the matching UNIQUE constraint); other dialects
+    fall back to delete + insert. Does not commit, so callers control the transaction.
+    """
+    table = model.__table__
+    dialect = db.get_bind().dialect.name
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        if dialect in ("postgresql", "sqlite"):
+            stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table).values(batch)
+            stmt = stmt.on_conflict_do_update(index_elements=conflict_cols, set_={col: stmt.excluded[col] for col in update_cols})
+            db.execute(stmt)
+        else:
+            keys = [tuple(row[col] for col in conflict_cols) for row in batch]
+            db.execute(delete(table).where(tuple_(*(table.c[col] for col in conflict_cols)).in_(keys)))
+            db.execute(insert(table), batch)
+
+def _validate_blocks(blocks):
+    for block in blocks:
+        if not 1 <= block.block_no <= 96:
+            raise ValueError("Block number must be 1-96")
+
+def bulk_upsert_blocks(db: Session, model, value_col: str, site_id: int, date: date, values: dict[int, float]):
+    """Upsert one site-day of {block_no: value} into a per-block table (schedules, generations) and/or its packed vector."""
+    if WRITE_ROWS:
+        rows = [{"site_id": site_id, "date": date, "block_no": block_no, value_col: value} for block_no, value in values.items()]
+        upsert_rows(db, model, rows, ["site_id", "date", "block_no"], [value_col])
+    if USE_VECTORS:
+        store_block_values(db, site_id, date, {value_col: values})
+    return len(values)
+
+# Packed block vectors (schemas.SiteDayBlocks)
+# rows: per-block tables only (default). both: per-block tables and vectors are written, reads use vectors
+# (switch-over/rollback period). vectors: only vectors; schedules/generations/deviations/dsm_settlements/weather_data stay empty.
+BLOCK_STORAGE = os.getenv("BLOCK_STORAGE", "rows")
+WRITE_ROWS = BLOCK_STORAGE != "vectors"
+USE_VECTORS = BLOCK_STORAGE in ("vectors", "both")
+VECTOR_COLUMNS = ("scheduled_mw", "actual_mw", "deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable", "market_price", "irradiance", "temp", "wind_speed", "cloud_cover")
+EMPTY_VECTOR = np.full(BLOCKS_PER_DAY, np.nan)
+EMPTY_VECTOR.flags.writeable = False
+
+def get_block_vectors(db: Session, site_id: int, date: date, columns=VECTOR_COLUMNS, for_update: bool = False) -> dict[str, np.ndarray]:
+    """One site-day as {column: (96,) float array}, a single-row fetch. Missing blocks (or days) are NaN."""
+    query = select(*(getattr(SiteDayBlocks, col) for col in columns)).where(SiteDayBlocks.site_id == site_id, SiteDayBlocks.date == date)
+    row = db.execute(query.with_for_update() if for_update else query).first()
+    return {col: row[i] if row is not None and row[i] is not None else EMPTY_VECTOR for i, col in enumerate(columns)}
+
+def store_block_values(db: Session, site_id: int, date: date, values_by_col: dict[str, dict[int, float]]):
+    """Write {column: {block_no: value}} into a site-day's vectors, keeping stored blocks a partial update doesn't touch. Does not commit."""
+    columns = list(values_by_col)
+    partial = any(len(values) < BLOCKS_PER_DAY for values in values_by_col.values())
+    current = get_block_vectors(db, site_id, date, columns, for_update=True) if partial else {}
+    row = {"site_id": site_id, "date": date}
+    for col, values in values_by_col.items():
+        vector = np.array(current.get(col, EMPTY_VECTOR))
+        vector[np.fromiter(values.keys(), dtype=np.intp, count=len(values)) - 1] = np.fromiter(values.values(), dtype=np.float64, count=len(values))
+        row[col] = vector
+    upsert_rows(db, SiteDayBlocks, [row], ["site_id", "date"], columns)
+
+def vector_block_records(site_id: int, date: date, vectors: dict[str, np.ndarray], required: str) -> list:
+    """Per-block records (attribute access like the ORM rows) for blocks where `required` is present."""
+    present = np.flatnonzero(~np.isnan(vectors[required]))
+    columns = {col: vector[present].tolist() for col, vector in vectors.items()}
+    return [
+        SimpleNamespace(site_id=site_id, date=date, block_no=int(i) + 1, **{col: values[n] for col, values in columns.items()})
+        for n, i in enumerate(present)
+    ]
+
 # Schedules
 def create_or_update_schedule(db: Session, site_id: int, date: date, block_no: int, scheduled_mw: float, user_id: int):
-    existing = db.query(Schedule).filter(and_(Schedule.site_id == site_id, Schedule.date == date, Schedule.block_no == block_no)).first()
-    if existing:
-        existing.scheduled_mw = scheduled_mw
-    else:
-        db_schedule = Schedule(site_id=site_id, date=date, block_no=block_no, scheduled_mw=scheduled_mw)
-        db.add(db_schedule)
+    bulk_upsert_blocks(db, Schedule, "scheduled_mw", site_id, date, {block_no: scheduled_mw})
     db.commit()
     log_action(db, user_id, "update_schedule", {"site_id": site_id, "date": date, "block_no": block_no})
 
 def get_schedule(db: Session, site_id: int, date: date):
+    if USE_VECTORS:
+        return vector_block_records(site_id, date, get_block_vectors(db, site_id, date, ("scheduled_mw",)), "scheduled_mw")
     return db.query(Schedule).filter(and_(Schedule.site_id == site_id, Schedule.date == date)).all()
 
 def upload_schedule(db: Session, upload: ScheduleUpload, user_id: int):
-    for block in upload.blocks:
-        if not 1 <= block.block_no <= 96:
-            raise ValueError("Block number must be 1-96")
-        create_or_update_schedule(db, upload.site_id, upload.date, block.block_no, block.scheduled_mw, user_id)
-    log_action(db, user_id, "upload_schedule", {"site_id": upload.site_id, "date": upload.date})
+    """Whole-day upload: one upsert statement and one audit record in a single transaction."""
+    _validate_blocks(upload.blocks)
+    count = bulk_upsert_blocks(db, Schedule, "scheduled_mw", upload.site_id, upload.date, {b.block_no: b.scheduled_mw for b in upload.blocks})
+    log_action(db, user_id, "upload_schedule", {"site_id": upload.site_id, "date": upload.date, "blocks": count}, strict=True)
+    db.commit()
 
 # Generations (similar to schedules)
 def create_or_update_generation(db: Session, site_id: int, date: date, block_no: int, actual_mw: float, user_id: int):
-    existing = db.query(Generation).filter(and_(Generation.site_id == site_id, Generation.date == date, Generation.block_no == block_no)).first()
-    if existing:
-        existing.actual_mw = actual_mw
-    else:
-        db_gen = Generation(site_id=site_id, date=date, block_no=block_no, actual_mw=actual_mw)
-        db.add(db_gen)
+    bulk_upsert_blocks(db, Generation, "actual_mw", site_id, date, {block_no: actual_mw})
     db.commit()
 
 def upload_generation(db: Session, upload: GenerationUpload, user_id: int):
-    for block in upload.blocks:
-        if not 1 <= block.block_no <= 96:
-            raise ValueError("Block number must be 1-96")
-        create_or
+    """Whole-day upload: one upsert statement and one audit record in a single transaction."""
+    _validate_blocks(upload.blocks)
+    count = bulk_upsert_blocks(db, Generation, "actual_mw", upload.site_id, upload.date, {b.block_no: b.scheduled_mw for b in upload.blocks})
+    log_action(db, user_id, "upload_generation", {"site_id": upload.site_id, "date": upload.date, "blocks": count}, strict=True)
+    db.commit()
+
+def store_schedule_day(db: Session, site_id: int, date: date, values: dict[int, float]):
+    """Upsert and commit one site-day from a streamed bulk upload; rolls back on failure so the next day can proceed."""
+    try:
+        bulk_upsert_blocks(db, Schedule, "scheduled_mw", site_id, date, values)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def store_generation_day(db: Session, site_id: int, date: date, values: dict[int, float], user_id: int):
+    """Upsert and commit one site-day of actuals from a streamed bulk upload, then settle it; rolls back on failure."""
+    try:
+        bulk_upsert_blocks(db, Generation, "actual_mw", site_id, date, values)
+        db.commit()
+        settle_site_days(db, [site_id], date, date, user_id)
+    except Exception:
+        db.rollback()
+        raise
+
+def get_generation(db: Session, site_id: int, date: date):
+    if USE_VECTORS:
+        return vector_block_records(site_id, date, get_block_vectors(db, site_id, date, ("actual_mw",)), "actual_mw")
+    return db.query(Generation).filter(and_(Generation.site_id == site_id, Generation.date == date)).all()
+
+# Deviations & DSM settlements
+def _get_market_price(db: Session, date: date, block_no: int) -> float:
+    price = db.query(MarketPrice).filter(and_(MarketPrice.date == date, MarketPrice.block_no == block_no)).first()
+    return price.dam_price if price and price.dam_price is not None else 3.0
+
+def calculate_and_store_deviation(db: Session, site_id: int, date: date, block_no: int, user_id: int):
+    """
+    Single-block path: compute deviation/DSM for one block and store it.
+    Use settle_site_days for whole days or fleets.
+    """
+    if USE_VECTORS:
+        inputs = get_block_vectors(db, site_id, date, ("scheduled_mw", "actual_mw"))
+        scheduled_mw, actual_mw = (float(inputs[col][block_no - 1]) for col in ("scheduled_mw", "actual_mw"))
+        scheduled_mw, actual_mw = (None if np.isnan(v) else v for v in (scheduled_mw, actual_mw))
+    else:
+        schedule = db.query(Schedule).filter(and_(Schedule.site_id == site_id, Schedule.date == date, Schedule.block_no == block_no)).first()
+        generation = db.query(Generation).filter(and_(Generation.site_id == site_id, Generation.date == date, Generation.block_no == block_no)).first()
+        scheduled_mw, actual_mw = (schedule.scheduled_mw if schedule else None), (generation.actual_mw if generation else None)
+    site = get_site(db, site_id)
+    if scheduled_mw is None or actual_mw is None or not site:
+        return None
+    market_price = _get_market_price(db, date, block_no)
+    result = calculate_dsm(actual_mw, scheduled_mw, site.capacity_mw, market_price)
+    if USE_VECTORS:
+        outputs = {
+            "deviation_percent": result["deviation_percent"],
+            "penalty_code": PENALTY_CODES[result["penalty_band"]],
+            "dsm_payable": result["dsm_payable"],
+            "dsm_receivable": result["dsm_receivable"],
+            "market_price": market_price,
+        }
+        store_block_values(db, site_id, date, {col: {block_no: value} for col, value in outputs.items()})
+    if WRITE_ROWS:
+        _store_block_rows(db, site_id, date, block_no, result, market_price)
+    refresh_rollups(db, [site_id], date, date)
+    db.commit()
+    log_action(db, user_id, "calculate_deviation", {"site_id": site_id, "date": date, "block_no": block_no})
+    if broker.active:
+        bands = [band_event(site, date, block_no, result["deviation_percent"], result["penalty_band"], result["dsm_payable"], result["dsm_receivable"])] if result["penalty_band"] != "none" else []
+        broker.publish(bands + settlement_events(db, [site_id], date, date))
+    return result
+
+def _store_block_rows(db: Session, site_id: int, date: date, block_no: int, result: dict, market_price: float):
+    deviation = db.query(Deviation).filter(and_(Deviation.site_id == site_id, Deviation.date == date, Deviation.block_no == block_no)).first()
+    if not deviation:
+        deviation = Deviation(site_id=site_id, date=date, block_no=block_no)
+        db.add(deviation)
+    deviation.deviation_percent = result["deviation_percent"]
+    deviation.penalty_band = result["penalty_band"]
+
+    settlement = db.query(DsmSettlement).filter(and_(DsmSettlement.site_id == site_id, DsmSettlement.date == date, DsmSettlement.block_no == block_no)).first()
+    if not settlement:
+        settlement = DsmSettlement(site_id=site_id, date=date, block_no=block_no)
+        db.add(settlement)
+    settlement.dsm_payable = result["dsm_payable"]
+    settlement.dsm_receivable = result["dsm_receivable"]
+    settlement.market_price = market_price
+
+def _load_block_matrix(db: Session, column, site_index: dict, start: date, days: int, packed: bool = None) -> np.ndarray:
+    """
+    Load one per-block column for many sites/days into a (sites, days, 96) array; missing blocks are NaN.
+    Reads the same-named packed vectors when USE_VECTORS (or packed=True), one row per site-day.
+    """
+    matrix = np.full((len(site_index), days, 96), np.nan)
+    if USE_VECTORS if packed is None else packed:
+        vectors = getattr(SiteDayBlocks, column.key)
+        rows = db.execute(
+            select(SiteDayBlocks.site_id, SiteDayBlocks.date, vectors).where(
+                SiteDayBlocks.site_id.in_(list(site_index)),
+                SiteDayBlocks.date >= start,
+                SiteDayBlocks.date < start + timedelta(days=days),
+                vectors.isnot(None),
+            )
+        ).all()
+        for site_id, d, vector in rows:
+            matrix[site_index[site_id], (d - start).days] = vector
+        return matrix
+    model = column.class_
+    rows = db.execute(
+        select(model.site_id, model.date, model.block_no, column).where(
+            model.site_id.in_(list(site_index)),
+            model.date >= start,
+            model.date < start + timedelta(days=days),
+        )
+    ).all()
+    if rows:
+        site_ids, dates, block_nos, values = zip(*rows)
+        s_idx = np.fromiter((site_index[s] for s in site_ids), dtype=np.intp, count=len(rows))
+        d_idx = np.fromiter(((d - start).days for d in dates), dtype=np.intp, count=len(rows))
+        b_idx = np.asarray(block_nos, dtype=np.intp) - 1
+        matrix[s_idx, d_idx, b_idx] = np.asarray(values, dtype=np.float64)
+    return matrix
+
+def _load_price_matrix(db: Session, start: date, days: int, column=MarketPrice.dam_price, fallback: np.ndarray = None) -> np.ndarray:
+    """(days, 96) prices from `column`; missing blocks take `fallback`, else 3.0 INR/kWh like the single-block path."""
+    prices = np.full((days, 96), 3.0) if fallback is None else fallback.copy()
+    rows = db.execute(
+        select(MarketPrice.date, MarketPrice.block_no, column).where(
+            MarketPrice.date >= start,
+            MarketPrice.date < start + timedelta(days=days),
+            column.isnot(None),
+        )
+    ).all()
+    for d, block_no, price in rows:
+        prices[(d - start).days, block_no - 1] = price
+    return prices
+
+def settle_site_days(db: Session, site_ids: list[int], start_date: date, end_date: date, user_id: int = None) -> dict:
+    """
+    Recompute deviations and DSM settlements for sites x [start_date, end_date] in one vectorized pass.
+    Existing rows for the range are replaced in a single transaction; blocks lacking a schedule or
+    actual are left out. Pass site_ids=None for the whole fleet.
+    """
+    site_query = select(Site.site_id, Site.capacity_mw)
+    if site_ids is not None:
+        site_query = site_query.where(Site.site_id.in_(site_ids))
+    sites = db.execute(site_query.order_by(Site.site_id)).all()
+    if not sites:
+        return {"site_days": 0, "blocks": 0}
+    site_index = {site_id: i for i, (site_id, _) in enumerate(sites)}
+    days = (end_date - start_date).days + 1
+
+    scheduled = _load_block_matrix(db, Schedule.scheduled_mw, site_index, start_date, days)
+    actual = _load_block_matrix(db, Generation.actual_mw, site_index, start_date, days)
+    prices = _load_price_matrix(db, start_date, days)
+    capacity = np.array([capacity for _, capacity in sites], dtype=np.float64)[:, None, None]
+
+    valid = ~np.isnan(scheduled) & ~np.isnan(actual)
+    result = calculate_dsm_batch(np.nan_to_num(actual), np.nan_to_num(scheduled), capacity, prices)
+
+    if USE_VECTORS:
+        _store_settlement_vectors(db, sites, start_date, end_date, valid, result, prices)
+    if WRITE_ROWS:
+        _store_settlement_rows(db, sites, site_index, start_date, end_date, valid, result, prices)
+    refresh_rollups(db, list(site_index), start_date, end_date)
+    summary = {"site_days": int(valid.any(axis=2).sum()), "blocks": int(valid.sum())}
+    log_action(db, user_id, "settle_site_days", {"site_ids": list(site_index), "start_date": start_date, "end_date": end_date, **summary}, strict=True)
+    db.commit()
+    if broker.active:
+        broker.publish(settlement_events(db, list(site_index), start_date, end_date))
+    return summary
+
+def _store_settlement_vectors(db: Session, sites: list, start_date: date, end_date: date, valid: np.ndarray, result: dict, prices: np.ndarray):
+    """One upsert row per settled site-day; days in range with nothing settled lose their old outputs."""
+    output_cols = ("deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable", "market_price")
+    site_ids = [site_id for site_id, _ in sites]
+    db.execute(
+        update(SiteDayBlocks)
+        .where(SiteDayBlocks.site_id.in_(site_ids), SiteDayBlocks.date >= start_date, SiteDayBlocks.date <= end_date)
+        .values({col: None for col in output_cols})
+    )
+    outputs = {col: np.where(valid, result[col], np.nan) for col in ("deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable")}
+    outputs["market_price"] = np.where(valid, prices, np.nan)
+    rows = [
+        {"site_id": site_ids[s], "date": start_date + timedelta(days=d), **{col: outputs[col][s, d] for col in output_cols}}
+        for s, d in zip(*(idx.tolist() for idx in np.nonzero(valid.any(axis=2))))
+    ]
+    if rows:
+        upsert_rows(db, SiteDayBlocks, rows, ["site_id", "date"], list(output_cols))
+
+def _store_settlement_rows(db: Session, sites: list, site_index: dict, start_date: date, end_date: date, valid: np.ndarray, result: dict, prices: np.ndarray):
+    s_idx, d_idx, b_idx = np.nonzero(valid)
+    keys = list(zip(
+        [sites[i][0] for i in s_idx.tolist()],
+        [start_date + timedelta(days=d) for d in d_idx.tolist()],
+        (b_idx + 1).tolist(),
+    ))
+    deviation_rows = [
+        {"site_id": s, "date": d, "block_no": b, "deviation_percent": dev, "penalty_band": band}
+        for (s, d, b), dev, band in zip(keys, result["deviation_percent"][valid].tolist(), result["penalty_band"][valid].tolist())
+    ]
+    settlement_rows = [
+        {"site_id": s, "date": d, "block_no": b, "dsm_payable": pay, "dsm_receivable": rec, "market_price": price}
+        for (s, d, b), pay, rec, price in zip(keys, result["dsm_payable"][valid].tolist(), result["dsm_receivable"][valid].tolist(),
+                                              np.broadcast_to(prices, valid.shape)[valid].tolist())
+    ]
+
+    for model in (Deviation, DsmSettlement):
+        db.execute(delete(model).where(model.site_id.in_(list(site_index)), model.date >= start_date, model.date <= end_date))
+    if settlement_rows:
+        db.execute(insert(Deviation), deviation_rows)
+        db.execute(insert(DsmSettlement), settlement_rows)
+
+def store_telemetry_blocks(db: Session, blocks: dict[tuple[int, date], dict[int, float]], user_id: int = None) -> dict:
+    """
+    Closed live-telemetry blocks {(site_id, date): {block_no: actual_mw}}: upsert them into generations and
+    settle just those blocks (deviation, DSM, the touched site-days' rollups) in one transaction. Commits.
+    Blocks without a schedule are stored but not settled; unknown sites are skipped.
+    """
+    sites = {row.site_id: row for row in db.execute(select(Site.site_id, Site.capacity_mw, Site.region, Site.state).where(Site.site_id.in_({site_id for site_id, _ in blocks})))}
+    blocks = {key: values for key, values in blocks.items() if key[0] in sites and values}
+    if not blocks:
+        return {"blocks": 0, "settled": 0}
+    for (site_id, day), values in blocks.items():
+        bulk_upsert_blocks(db, Generation, "actual_mw", site_id, day, values)
+
+    site_index = {site_id: i for i, site_id in enumerate(sorted({site_id for site_id, _ in blocks}))}
+    start_date, end_date = min(day for _, day in blocks), max(day for _, day in blocks)
+    days = (end_date - start_date).days + 1
+    keys = [(site_id, day, block_no, mw) for (site_id, day), values in blocks.items() for block_no, mw in values.items()]
+    s_idx = np.array([site_index[k[0]] for k in keys])
+    d_idx = np.array([(k[1] - start_date).days for k in keys])
+    b_idx = np.array([k[2] - 1 for k in keys])
+    scheduled = _load_block_matrix(db, Schedule.scheduled_mw, site_index, start_date, days)[s_idx, d_idx, b_idx]
+    prices = _load_price_matrix(db, start_date, days)[d_idx, b_idx]
+    capacity = np.array([sites[k[0]].capacity_mw for k in keys], dtype=np.float64)
+    result = calculate_dsm_batch(np.array([k[3] for k in keys], dtype=np.float64), np.nan_to_num(scheduled), capacity, prices)
+    settled = np.flatnonzero(~np.isnan(scheduled)).tolist()
+
+    if WRITE_ROWS and settled:
+        block_keys = [{"site_id": keys[i][0], "date": keys[i][1], "block_no": keys[i][2]} for i in settled]
+        upsert_rows(db, Deviation, [
+            {**key, "deviation_percent": float(result["deviation_percent"][i]), "penalty_band": str(result["penalty_band"][i])}
+            for key, i in zip(block_keys, settled)
+        ], ["site_id", "date", "block_no"], ["deviation_percent", "penalty_band"])
+        upsert_rows(db, DsmSettlement, [
+            {**key, "dsm_payable": float(result["dsm_payable"][i]), "dsm_receivable": float(result["dsm_receivable"][i]), "market_price": float(prices[i])}
+            for key, i in zip(block_keys, settled)
+        ], ["site_id", "date", "block_no"], ["dsm_payable", "dsm_receivable", "market_price"])
+    if USE_VECTORS and settled:
+        outputs = {}
+        for i in settled:
+            site_id, day, block_no, _ = keys[i]
+            by_col = outputs.setdefault((site_id, day), {col: {} for col in ("deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable", "market_price")})
+            for col in ("deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable"):
+                by_col[col][block_no] = float(result[col][i])
+            by_col["market_price"][block_no] = float(prices[i])
+        for (site_id, day), values_by_col in outputs.items():
+            store_block_values(db, site_id, day, values_by_col)
+    refresh_rollups(db, list(site_index), start_date, end_date)
+    summary = {"blocks": len(keys), "settled": len(settled)}
+    log_action(db, user_id, "store_telemetry_blocks", {"site_ids": list(site_index), "start_date": start_date, "end_date": end_date, **summary}, strict=True)
+    db.commit()
+    if broker.active:
+        bands = [
+            band_event(sites[keys[i][0]], keys[i][1], keys[i][2], result["deviation_percent"][i], result["penalty_band"][i], result["dsm_payable"][i], result["dsm_receivable"][i])
+            for i in settled if result["penalty_code"][i] > 0
+        ]
+        broker.publish(bands + settlement_events(db, list(site_index), start_date, end_date))
+    return summary
+
+# Alert events (utils/alerts.py), published after the settlement commits
+def band_event(site, date: date, block_no: int, deviation_percent: float, band: str, dsm_payable: float, dsm_receivable: float) -> dict:
+    """A block settled in the partial or full band; `site` needs site_id, region and state."""
+    return {
+        "type": "band", "site_id": site.site_id, "region": site.region, "state": site.state, "date": str(date), "block_no": int(block_no),
+        "band": str(band), "deviation_percent": float(deviation_percent), "dsm_payable": float(dsm_payable), "dsm_receivable": float(dsm_receivable),
+    }
+
+def settlement_events(db: Session, site_ids: list[int], start_date: date, end_date: date) -> list[dict]:
+    """Current day totals (dsm_site_days) of the given site-days, one event each."""
+    rows = db.execute(
+        select(
+            DsmSiteDay.site_id, DsmSiteDay.date, Site.region, Site.state, DsmSiteDay.blocks, DsmSiteDay.blocks_partial, DsmSiteDay.blocks_full,
+            DsmSiteDay.total_payable, DsmSiteDay.total_receivable, DsmSiteDay.net, DsmSiteDay.max_abs_deviation,
+        ).join(Site, Site.site_id == DsmSiteDay.site_id)
+        .where(DsmSiteDay.site_id.in_(site_ids), DsmSiteDay.date >= start_date, DsmSiteDay.date <= end_date)
+    )
+    return [{"type": "settlement", **row._asdict(), "date": str(row.date)} for row in rows]
+
+def get_dsm_summary(db: Session, site_id: int, date: date):
+    if USE_VECTORS:
+        return vector_block_records(site_id, date, get_block_vectors(db, site_id, date, ("dsm_payable", "dsm_receivable", "market_price")), "dsm_payable")
+    return db.query(DsmSettlement).filter(and_(DsmSettlement.site_id == site_id, DsmSettlement.date == date)).order_by(DsmSettlement.block_no).all()
+
+# Market prices
+def get_market_prices(db: Session, date: date):
+    return db.query(MarketPrice).filter(MarketPrice.date == date).order_by(MarketPrice.block_no).all()
+
+def count_complete_dam_blocks(db: Session, date: date) -> int:
+    """Number of blocks on a date that already carry a DAM price (96 = complete day)."""
+    return db.execute(
+        select(func.count(func.distinct(MarketPrice.block_no))).where(MarketPrice.date == date, MarketPrice.dam_price.isnot(None))
+    ).scalar_one()
+
+def create_or_update_market(db: Session, date: date, block_no: int, dam_price: float = None, rtm_price: float = None):
+    existing = db.query(MarketPrice).filter(and_(MarketPrice.date == date, MarketPrice.block_no == block_no)).first()
+    if not existing:
+        existing = MarketPrice(date=date, block_no=block_no)
+        db.add(existing)
+    if dam_price is not None:
+        existing.dam_price = dam_price
+    if rtm_price is not None:
+        existing.rtm_price = rtm_price
+    db.commit()
+
+def store_market_prices(db: Session, date: date, blocks: list[MarketPriceBlock], columns: tuple = ("dam_price",)):
+    """Upsert a day of prices in one statement; only `columns` are written/overwritten."""
+    rows = [{"date": date, "block_no": b.block_no, **{col: getattr(b, col) for col in columns}} for b in blocks]
+    upsert_rows(db, MarketPrice, rows, ["date", "block_no"], list(columns))
+    db.commit()
+
+def upload_market(db: Session, upload: MarketUpload, user_id: int):
+    _validate_blocks(upload.blocks)
+    store_market_prices(db, upload.date, upload.blocks, columns=("dam_price", "rtm_price"))
+    log_action(db, user_id, "upload_market", {"date": upload.date, "blocks": len(upload.blocks)})
+
+# Weather
+WEATHER_COLUMNS = ("irradiance", "temp", "wind_speed", "cloud_cover")
+
+def get_weather(db: Session, site_id: int, date: date):
+    if USE_VECTORS:
+        return vector_block_records(site_id, date, get_block_vectors(db, site_id, date, WEATHER_COLUMNS), "irradiance")
+    return db.query(WeatherData).filter(and_(WeatherData.site_id == site_id, WeatherData.date == date)).order_by(WeatherData.block_no).all()
+
+def create_or_update_weather(db: Session, site_id: int, date: date, block_no: int, irradiance: float, temp: float, wind_speed: float, cloud_cover: int):
+    if USE_VECTORS:
+        values = {"irradiance": irradiance, "temp": temp, "wind_speed": wind_speed, "cloud_cover": cloud_cover}
+        store_block_values(db, site_id, date, {col: {block_no: value} for col, value in values.items()})
+    if not WRITE_ROWS:
+        db.commit()
+        return
+    existing = db.query(WeatherData).filter(and_(WeatherData.site_id == site_id, WeatherData.date == date, WeatherData.block_no == block_no)).first()
+    if not existing:
+        existing = WeatherData(site_id=site_id, date=date, block_no=block_no)
+        db.add(existing)
+    existing.irradiance = irradiance
+    existing.temp = temp
+    existing.wind_speed = wind_speed
+    existing.cloud_cover = cloud_cover
+    db.commit()
+
+def get_populated_weather_sites(db: Session, site_ids: list[int], date: date) -> set:
+    """Sites that already have all 96 weather blocks stored for the date (one grouped query)."""
+    if USE_VECTORS:  # Fleet refreshes always write whole days
+        query = select(SiteDayBlocks.site_id).where(SiteDayBlocks.date == date, SiteDayBlocks.site_id.in_(site_ids), SiteDayBlocks.irradiance.isnot(None))
+        return set(db.execute(query).scalars())
+    query = (
+        select(WeatherData.site_id)
+        .where(WeatherData.date == date, WeatherData.site_id.in_(site_ids))
+        .group_by(WeatherData.site_id)
+        .having(func.count(func.distinct(WeatherData.block_no)) >= 96)
+    )
+    return set(db.execute(query).scalars())
+
+def store_weather_days(db: Session, date: date, blocks_by_site: dict):
+    """
+    Write a full day of weather for many sites: one delete and one multi-row insert (or one vector upsert), one commit.
+    blocks_by_site maps site_id -> a single WeatherResponse-like reading or a list of 96 of them.
+    """
+    if not blocks_by_site:
+        return
+    days = {site_id: blocks if isinstance(blocks, (list, tuple)) else [blocks] * 96 for site_id, blocks in blocks_by_site.items()}
+    if USE_VECTORS:
+        vector_rows = [
+            {"site_id": site_id, "date": date, **{col: np.array([getattr(b, col) for b in blocks], dtype=np.float64) for col in WEATHER_COLUMNS}}
+            for site_id, blocks in days.items()
+        ]
+        upsert_rows(db, SiteDayBlocks, vector_rows, ["site_id", "date"], list(WEATHER_COLUMNS))
+    if WRITE_ROWS:
+        rows = [
+            {"site_id": site_id, "date": date, "block_no": block_no, "irradiance": b.irradiance, "temp": b.temp, "wind_speed": b.wind_speed, "cloud_cover": b.cloud_cover}
+            for site_id, blocks in days.items()
+            for block_no, b in enumerate(blocks, start=1)
+        ]
+        db.execute(delete(WeatherData).where(WeatherData.date == date, WeatherData.site_id.in_(list(blocks_by_site))))
+        db.execute(insert(WeatherData), rows)
+    db.commit()
+
+# DSM rollups
+BLOCK_HOURS = 0.25  # 15-minute blocks
+ROLLUP_SUM_COLS = ("blocks", "blocks_none", "blocks_partial", "blocks_full", "total_payable", "total_receivable", "net", "actual_mwh", "energy_revenue")
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def _month_end(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+def refresh_rollups(db: Session, site_ids: list[int], start_date: date, end_date: date):
+    """
+    Recompute dsm_site_days for sites x [start_date, end_date] and the dsm_site_months covering them.
+    Runs in the caller's transaction (flushes, never commits) so rollups change atomically with
+    the settlements they summarize. site_ids=None means every site.
+    """
+    db.flush()
+    in_range = lambda model: and_(model.date >= start_date, model.date <= end_date, *([model.site_id.in_(site_ids)] if site_ids is not None else []))
+    day_rows = _day_rollups_from_vectors(db, in_range(SiteDayBlocks)) if USE_VECTORS else _day_rollups_from_rows(db, in_range)
+    _write_rollups(db, DsmSiteDay, DsmSiteDay.date, day_rows, in_range(DsmSiteDay))
+
+    # Months: re-sum the (at most 31 per site) day rollups of every touched month
+    month_start, month_end = _month_start(start_date), _month_end(end_date)
+    day_totals = select(DsmSiteDay.site_id, DsmSiteDay.date, DsmSiteDay.max_abs_deviation, *(getattr(DsmSiteDay, col) for col in ROLLUP_SUM_COLS)).where(DsmSiteDay.date >= month_start, DsmSiteDay.date <= month_end)
+    month_scope = and_(DsmSiteMonth.month >= month_start, DsmSiteMonth.month <= month_end)
+    if site_ids is not None:
+        day_totals = day_totals.where(DsmSiteDay.site_id.in_(site_ids))
+        month_scope = and_(month_scope, DsmSiteMonth.site_id.in_(site_ids))
+    months = {}
+    for day in db.execute(day_totals):
+        month = months.setdefault((day.site_id, _month_start(day.date)), {"site_id": day.site_id, "month": _month_start(day.date), "days": 0, "max_abs_deviation": None, **{col: 0 for col in ROLLUP_SUM_COLS}})
+        month["days"] += 1
+        for col in ROLLUP_SUM_COLS:
+            month[col] += getattr(day, col) or 0
+        if day.max_abs_deviation is not None:
+            month["max_abs_deviation"] = max(month["max_abs_deviation"] or 0.0, day.max_abs_deviation)
+    _write_rollups(db, DsmSiteMonth, DsmSiteMonth.month, list(months.values()), month_scope)
+
+def _write_rollups(db: Session, model, key_column, rows: list[dict], scope):
+    """
+    Upsert rollup rows on (site_id, key_column) and delete those in scope that no longer have settlements.
+    Not delete + insert: two transactions refreshing the same site-day (telemetry flush vs. an upload) would
+    both get past the delete and the second insert would hit the unique key.
+    """
+    key_cols = ["site_id", key_column.key]
+    rows.sort(key=lambda row: (row["site_id"], row[key_column.key]))  # Same lock order in every refresh
+    fresh = {(row["site_id"], row[key_column.key]) for row in rows}
+    stale = [tuple(key) for key in db.execute(select(model.site_id, key_column).where(scope)) if tuple(key) not in fresh]
+    if stale:
+        db.execute(delete(model).where(tuple_(model.site_id, key_column).in_(stale)))
+    if rows:
+        upsert_rows(db, model, rows, key_cols, [col for col in rows[0] if col not in key_cols] + ["updated_at"])
+
+def _day_rollups_from_rows(db: Session, in_range) -> list[dict]:
+    """Day rollups from dsm_settlements (+ generations, deviations): two grouped queries merged in Python."""
+    settlement_query = (
+        select(
+            DsmSettlement.site_id,
+            DsmSettlement.date,
+            func.count(DsmSettlement.dsm_id).label("blocks"),
+            func.coalesce(func.sum(DsmSettlement.dsm_payable), 0.0).label("total_payable"),
+            func.coalesce(func.sum(DsmSettlement.dsm_receivable), 0.0).label("total_receivable"),
+            func.coalesce(func.sum(Generation.actual_mw), 0.0).label("actual_mw"),
+            func.coalesce(func.sum(Generation.actual_mw * DsmSettlement.market_price), 0.0).label("actual_mw_price"),
+        )
+        .outerjoin(Generation, and_(Generation.site_id == DsmSettlement.site_id, Generation.date == DsmSettlement.date, Generation.block_no == DsmSettlement.block_no))
+        .where(in_range(DsmSettlement))
+        .group_by(DsmSettlement.site_id, DsmSettlement.date)
+    )
+    band = Deviation.penalty_band
+    deviation_query = (
+        select(
+            Deviation.site_id,
+            Deviation.date,
+            func.sum(case((band == "none", 1), else_=0)).label("blocks_none"),
+            func.sum(case((band == "partial", 1), else_=0)).label("blocks_partial"),
+            func.sum(case((band == "full", 1), else_=0)).label("blocks_full"),
+            func.max(func.abs(Deviation.deviation_percent)).label("max_abs_deviation"),
+        )
+        .where(in_range(Deviation))
+        .group_by(Deviation.site_id, Deviation.date)
+    )
+    bands = {(row.site_id, row.date): row._mapping for row in db.execute(deviation_query)}
+
+    day_rows = []
+    for row in db.execute(settlement_query):
+        band_counts = bands.get((row.site_id, row.date), {})
+        day_rows.append({
+            "site_id": row.site_id,
+            "date": row.date,
+            "blocks": row.blocks,
+            "blocks_none": band_counts.get("blocks_none", 0),
+            "blocks_partial": band_counts.get("blocks_partial", 0),
+            "blocks_full": band_counts.get("blocks_full", 0),
+            "total_payable": row.total_payable,
+            "total_receivable": row.total_receivable,
+            "net": row.total_receivable - row.total_payable,
+            "max_abs_deviation": band_counts.get("max_abs_deviation"),
+            "actual_mwh": row.actual_mw * BLOCK_HOURS,
+            "energy_revenue": row.actual_mw_price * BLOCK_HOURS * 1000,  # MWh -> kWh at INR/kWh
+        })
+    return day_rows
+
+def _day_rollups_from_vectors(db: Session, condition) -> list[dict]:
+    """Same figures as _day_rollups_from_rows, computed from one packed row per site-day."""
+    query = select(
+        SiteDayBlocks.site_id, SiteDayBlocks.date, SiteDayBlocks.actual_mw, SiteDayBlocks.deviation_percent,
+        SiteDayBlocks.penalty_code, SiteDayBlocks.dsm_payable, SiteDayBlocks.dsm_receivable, SiteDayBlocks.market_price,
+    ).where(condition, SiteDayBlocks.dsm_payable.isnot(None))
+    day_rows = []
+    for row in db.execute(query):
+        settled = ~np.isnan(row.dsm_payable)
+        if not settled.any():
+            continue
+        actual = np.where(settled, np.nan_to_num(row.actual_mw if row.actual_mw is not None else EMPTY_VECTOR), 0.0)
+        total_payable, total_receivable = float(row.dsm_payable[settled].sum()), float(row.dsm_receivable[settled].sum())
+        band_counts = np.bincount(row.penalty_code[settled].astype(np.intp), minlength=len(PENALTY_BANDS))
+        abs_deviation = np.abs(row.deviation_percent[settled])
+        day_rows.append({
+            "site_id": row.site_id,
+            "date": row.date,
+            "blocks": int(settled.sum()),
+            "blocks_none": int(band_counts[0]),
+            "blocks_partial": int(band_counts[1]),
+            "blocks_full": int(band_counts[2]),
+            "total_payable": total_payable,
+            "total_receivable": total_receivable,
+            "net": total_receivable - total_payable,
+            "max_abs_deviation": float(abs_deviation.max()),
+            "actual_mwh": float(actual.sum()) * BLOCK_HOURS,
+            "energy_revenue": float((actual * np.nan_to_num(row.market_price)).sum()) * BLOCK_HOURS * 1000,
+        })
+    return day_rows
+
+def rebuild_rollups(db: Session) -> int:
+    """Regenerate all rollups from dsm_settlements, one committed month at a time. Returns months processed."""
+    db.execute(delete(DsmSiteDay))
+    db.execute(delete(DsmSiteMonth))
+    db.commit()
+    if USE_VECTORS:
+        first, last = db.execute(select(func.min(SiteDayBlocks.date), func.max(SiteDayBlocks.date)).where(SiteDayBlocks.dsm_payable.isnot(None))).one()
+    else:
+        first, last = db.execute(select(func.min(DsmSettlement.date), func.max(DsmSettlement.date))).one()
+    months = 0
+    month = _month_start(first) if first else None
+    while month and month <= last:
+        refresh_rollups(db, None, month, _month_end(month))
+        db.commit()
+        months += 1
+        month = _month_end(month) + timedelta(days=1)
+    return months
+
+def pack_block_vectors(db: Session, start_date: date, end_date: date) -> int:
+    """
+    Copy per-block rows for [start_date, end_date] into site_day_blocks (switching BLOCK_STORAGE to both/vectors
+    on existing data). Overwrites packed columns for site-days that have rows; commits. Returns site-days written.
+    """
+    site_index = {site_id: i for i, site_id in enumerate(sorted(get_site_ids(db)))}
+    if not site_index:
+        return 0
+    days = (end_date - start_date).days + 1
+    sources = {
+        "scheduled_mw": Schedule.scheduled_mw, "actual_mw": Generation.actual_mw, "deviation_percent": Deviation.deviation_percent,
+        "dsm_payable": DsmSettlement.dsm_payable, "dsm_receivable": DsmSettlement.dsm_receivable, "market_price": DsmSettlement.market_price,
+        **{col: getattr(WeatherData, col) for col in WEATHER_COLUMNS},
+    }
+    matrices = {col: _load_block_matrix(db, column, site_index, start_date, days, packed=False) for col, column in sources.items()}
+    penalty = np.full((len(site_index), days, 96), np.nan)
+    rows = db.execute(
+        select(Deviation.site_id, Deviation.date, Deviation.block_no, Deviation.penalty_band)
+        .where(Deviation.site_id.in_(list(site_index)), Deviation.date >= start_date, Deviation.date <= end_date, Deviation.penalty_band.isnot(None))
+    ).all()
+    for site_id, d, block_no, band in rows:
+        penalty[site_index[site_id], (d - start_date).days, block_no - 1] = PENALTY_CODES[band]
+    matrices["penalty_code"] = penalty
+
+    site_ids = list(site_index)
+    present = {col: ~np.isnan(matrix).all(axis=2) for col, matrix in matrices.items()}
+    vector_rows = []
+    for s, d in zip(*(idx.tolist() for idx in np.nonzero(np.logical_or.reduce(list(present.values()))))):
+        vector_rows.append({
+            "site_id": site_ids[s],
+            "date": start_date + timedelta(days=d),
+            **{col: matrix[s, d] if present[col][s, d] else None for col, matrix in matrices.items()},
+        })
+    if vector_rows:
+        upsert_rows(db, SiteDayBlocks, vector_rows, ["site_id", "date"], list(VECTOR_COLUMNS))
+    db.commit()
+    return len(vector_rows)
+
+def dsm_by_site_query(start_date: date, end_date: date, site_id: int = None):
+    """Statement behind aggregate_dsm_by_site (shared with crud_async)."""
+    if start_date.day == 1 and end_date == _month_end(end_date):
+        model, period_col, days = DsmSiteMonth, DsmSiteMonth.month, func.sum(DsmSiteMonth.days)
+    else:
+        model, period_col, days = DsmSiteDay, DsmSiteDay.date, func.count(DsmSiteDay.rollup_id)
+    query = (
+        select(
+            Site.site_id,
+            Site.site_name,
+            Site.region,
+            Site.state,
+            func.coalesce(func.sum(model.blocks), 0).label("blocks"),
+            func.coalesce(days, 0).label("days"),
+            func.coalesce(func.sum(model.total_payable), 0.0).label("total_payable"),
+            func.coalesce(func.sum(model.total_receivable), 0.0).label("total_receivable"),
+            func.coalesce(func.sum(model.blocks_partial), 0).label("blocks_partial"),
+            func.coalesce(func.sum(model.blocks_full), 0).label("blocks_full"),
+            func.max(model.max_abs_deviation).label("max_abs_deviation"),
+        )
+        .join(Site, Site.site_id == model.site_id)
+        .where(period_col >= start_date, period_col <= end_date)
+        .group_by(Site.site_id, Site.site_name, Site.region, Site.state)
+        .order_by(Site.site_id)
+    )
+    if site_id is not None:
+        query = query.where(model.site_id == site_id)
+    return query
+
+def aggregate_dsm_by_site(db: Session, start_date: date, end_date: date, site_id: int = None) -> list[dict]:
+    """
+    Per-site DSM totals for [start_date, end_date] in one grouped query over the rollups
+    (dsm_site_months when the range is whole months, dsm_site_days otherwise).
+    Region/state roll-ups are derived from these rows, so a fleet-wide month costs a single query.
+    """
+    return [dict(row._mapping) for row in db.execute(dsm_by_site_query(start_date, end_date, site_id))]
+
+# Revenue
+def load_scenario_inputs(db: Session, site_ids: list[int], start_date: date, end_date: date) -> dict:
+    """
+    Settleable blocks (schedule and actual both present) for sites x [start_date, end_date], flattened to
+    1-D arrays: actual, scheduled, capacity, dam and rtm price per block (RTM falls back to DAM where missing).
+    site_ids=None loads the whole fleet.
+    """
+    site_query = select(Site.site_id, Site.capacity_mw)
+    if site_ids is not None:
+        site_query = site_query.where(Site.site_id.in_(site_ids))
+    sites = db.execute(site_query.order_by(Site.site_id)).all()
+    site_index = {site_id: i for i, (site_id, _) in enumerate(sites)}
+    days = (end_date - start_date).days + 1
+    scheduled = _load_block_matrix(db, Schedule.scheduled_mw, site_index, start_date, days)
+    actual = _load_block_matrix(db, Generation.actual_mw, site_index, start_date, days)
+    dam = _load_price_matrix(db, start_date, days)
+    rtm = _load_price_matrix(db, start_date, days, MarketPrice.rtm_price, fallback=dam)
+    capacity = np.array([capacity for _, capacity in sites], dtype=np.float64)[:, None, None]
+
+    valid = ~np.isnan(scheduled) & ~np.isnan(actual)
+    return {
+        "sites": len(sites),
+        "site_days": int(valid.any(axis=2).sum()),
+        "actual": actual[valid],
+        "scheduled": scheduled[valid],
+        "capacity": np.broadcast_to(capacity, valid.shape)[valid],
+        "dam": np.broadcast_to(dam, valid.shape)[valid],
+        "rtm": np.broadcast_to(rtm, valid.shape)[valid],
+    }
+
+def get_revenue_summary(db: Session, site_id: int, month: str) -> dict:
+    """
+    Month revenue vs DSM impact for a site, read from its dsm_site_months rollup row.
+    """
+    year, mon = map(int, month.split('-'))
+    rollup = db.query(DsmSiteMonth).filter(and_(DsmSiteMonth.site_id == site_id, DsmSiteMonth.month == date(year, mon, 1))).first()
+    energy_revenue = rollup.energy_revenue if rollup else 0.0
+    dsm_loss = (rollup.total_payable - rollup.total_receivable) if rollup else 0.0
+    return {
+        "total_revenue": energy_revenue - dsm_loss,
+        "dsm_loss": dsm_loss,
+        "scenarios": {"with_dsm": energy_revenue - dsm_loss, "without_dsm": energy_revenue},
+    }
+
+# Reports
+def dsm_version_stamp_query(start_date: date, end_date: date, site_id: int = None):
+    """Statement behind get_dsm_version_stamp (shared with crud_async)."""
+    query = select(
+        func.count(DsmSiteDay.rollup_id),
+        func.max(DsmSiteDay.updated_at),
+        func.sum(DsmSiteDay.blocks),
+        func.sum(DsmSiteDay.blocks_partial),
+        func.sum(DsmSiteDay.blocks_full),
+        func.round(func.sum(DsmSiteDay.total_payable), 2),
+        func.round(func.sum(DsmSiteDay.total_receivable), 2),
+    ).where(DsmSiteDay.date >= start_date, DsmSiteDay.date <= end_date)
+    if site_id is not None:
+        query = query.where(DsmSiteDay.site_id == site_id)
+    return query
+
+def get_dsm_version_stamp(db: Session, start_date: date, end_date: date, site_id: int = None) -> list:
+    """
+    Cheap fingerprint of the settlements behind a report, read from dsm_site_days: any re-settlement
+    rewrites those rows (new updated_at, counts, totals), so the stamp changes with the data.
+    """
+    return [str(value) if value is not None else None for value in db.execute(dsm_version_stamp_query(start_date, end_date, site_id)).one()]
+
+def get_report_by_cache_key(db: Session, cache_key: str) -> Report:
+    return db.query(Report).filter(Report.cache_key == cache_key).order_by(Report.report_id.desc()).first()
+
+def create_report(db: Session, site_id: int, report_type: str, period: str, json_data: dict, cache_key: str = None) -> Report:
+    db_report = Report(site_id=site_id, report_type=report_type, period=period, json_data=json_data, cache_key=cache_key)
+    db.add(db_report)
+    db.commit()
+    db.refresh(db_report)
+    return db_report
+
+def get_reports(db: Session, site_id: int = None, report_type: str = None, limit: int = 50, period: str = None):
+    query = db.query(Report)
+    if site_id is not None:
+        query = query.filter(Report.site_id == site_id)
+    if report_type:
+        query = query.filter(Report.report_type == report_type)
+    if period:
+        query = query.filter(Report.period == period)
+    return query.order_by(Report.created_at.desc()).limit(limit).all()
+
+# Nightly pipeline checkpoints
+def get_checkpointed_sites(db: Session, site_ids: list[int], date: date) -> set:
+    rows = db.execute(select(NightlyCheckpoint.site_id).where(NightlyCheckpoint.date == date, NightlyCheckpoint.site_id.in_(site_ids)))
+    return {row[0] for row in rows}
+
+def save_checkpoints(db: Session, date: date, run_id: str, blocks_by_site: dict[int, int]):
+    """Mark site-days done (re-marking overwrites the run id and time). Commits."""
+    rows = [{"site_id": site_id, "date": date, "run_id": run_id, "blocks": blocks, "completed_at": datetime.now()} for site_id, blocks in blocks_by_site.items()]
+    upsert_rows(db, NightlyCheckpoint, rows, ["site_id", "date"], ["run_id", "blocks", "completed_at"])
+    db.commit()
+
+def count_settled_blocks(db: Session, site_ids: list[int], date: date) -> dict[int, int]:
+    """Settled blocks per site for one day (sites with none are absent)."""
+    if USE_VECTORS:
+        rows = db.execute(select(SiteDayBlocks.site_id, SiteDayBlocks.dsm_payable).where(SiteDayBlocks.date == date, SiteDayBlocks.site_id.in_(site_ids)))
+        counts = {site_id: int((~np.isnan(vector)).sum()) for site_id, vector in rows if vector is not None}
+        return {site_id: n for site_id, n in counts.items() if n}
+    rows = db.execute(
+        select(DsmSettlement.site_id, func.count()).where(DsmSettlement.date == date, DsmSettlement.site_id.in_(site_ids)).group_by(DsmSettlement.site_id)
+    )
+    return {site_id: n for site_id, n in rows}
+
+# AI memory
+def get_ai_memory(db: Session, user_id: int, limit: int = 10):
+    """Most recent exchanges first."""
+    return db.query(AiMemory).filter(AiMemory.user_id == user_id).order_by(AiMemory.timestamp.desc(), AiMemory.memory_id.desc()).limit(limit).all()
+
+def create_ai_memory(db: Session, user_id: int, query: str, response: str, context: dict = None) -> AiMemory:
+    memory = AiMemory(user_id=user_id, query=query, response=response, context=context)
+    db.add(memory)
+    db.commit()
+    db.refresh(memory)
+    return memory
+
+def count_ai_memory(db: Session, user_id: int) -> int:
+    return db.execute(select(func.count()).where(AiMemory.user_id == user_id)).scalar_one()
+
+def get_ai_summary(db: Session, user_id: int) -> AiSummary:
+    return db.get(AiSummary, user_id)
+
+def get_compactable_ai_memory(db: Session, user_id: int, keep: int, before: datetime) -> list[AiMemory]:
+    """Oldest first: a user's turns beyond the newest `keep`, and any older than `before`."""
+    newest = db.execute(
+        select(AiMemory.memory_id).where(AiMemory.user_id == user_id).order_by(AiMemory.memory_id.desc()).limit(keep)
+    ).scalars().all()
+    query = db.query(AiMemory).filter(AiMemory.user_id == user_id)
+    if newest:
+        query = query.filter(or_(AiMemory.memory_id.not_in(newest), AiMemory.timestamp < before))
+    return query.order_by(AiMemory.memory_id).all()
+
+def get_ai_memory_users(db: Session, keep: int, before: datetime) -> list[int]:
+    """Users with more than `keep` turns or turns older than `before`."""
+    rows = db.execute(
+        select(AiMemory.user_id).group_by(AiMemory.user_id).having(or_(func.count() > keep, func.min(AiMemory.timestamp) < before))
+    )
+    return [row[0] for row in rows]
+
+def fold_ai_memory(db: Session, user_id: int, summary: str, turns: int, memory_ids: list[int]):
+    """Store the user's new rolling summary and delete the turns folded into it, in one transaction. Commits."""
+    upsert_rows(db, AiSummary, [{"user_id": user_id, "summary": summary, "turns": turns, "updated_at": datetime.now()}], ["user_id"], ["summary", "turns", "updated_at"])
+    db.execute(delete(AiMemory).where(AiMemory.memory_id.in_(memory_ids)))
+    db.commit()
@@ -0,0 +1,77 @@
+"""
+Async counterparts of the read queries in crud.py, for endpoints on get_async_db / get_async_read_db.
+Writes stay in crud.py; where a query is non-trivial the statement is built there and shared.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from .schemas import Site, Schedule, Generation, DsmSettlement, MarketPrice, WeatherData, Report, AiMemory, SiteDayBlocks
+from .crud import USE_VECTORS, EMPTY_VECTOR, WEATHER_COLUMNS, dsm_by_site_query, dsm_version_stamp_query, vector_block_records
+
+async def get_block_vectors(db: AsyncSession, site_id: int, date: date, columns: tuple) -> dict:
+    row = (await db.execute(
+        select(*(getattr(SiteDayBlocks, col) for col in columns)).where(SiteDayBlocks.site_id == site_id, SiteDayBlocks.date == date)
+    )).first()
+    return {col: row[i] if row is not None and row[i] is not None else EMPTY_VECTOR for i, col in enumerate(columns)}
+
+async def _vector_records(db: AsyncSession, site_id: int, date: date, columns: tuple):
+    return vector_block_records(site_id, date, await get_block_vectors(db, site_id, date, columns), columns[0])
+
+async def get_site(db: AsyncSession, site_id: int) -> Site:
+    return await db.get(Site, site_id)
+
+async def get_schedule(db: AsyncSession, site_id: int, date: date):
+    if USE_VECTORS:
+        return await _vector_records(db, site_id, date, ("scheduled_mw",))
+    result = await db.scalars(select(Schedule).where(Schedule.site_id == site_id, Schedule.date == date).order_by(Schedule.block_no))
+    return result.all()
+
+async def get_generation(db: AsyncSession, site_id: int, date: date):
+    if USE_VECTORS:
+        return await _vector_records(db, site_id, date, ("actual_mw",))
+    result = await db.scalars(select(Generation).where(Generation.site_id == site_id, Generation.date == date).order_by(Generation.block_no))
+    return result.all()
+
+async def get_dsm_summary(db: AsyncSession, site_id: int, date: date):
+    if USE_VECTORS:
+        return await _vector_records(db, site_id, date, ("dsm_payable", "dsm_receivable", "market_price"))
+    result = await db.scalars(select(DsmSettlement).where(DsmSettlement.site_id == site_id, DsmSettlement.date == date).order_by(DsmSettlement.block_no))
+    return result.all()
+
+async def get_market_prices(db: AsyncSession, date: date):
+    result = await db.scalars(select(MarketPrice).where(MarketPrice.date == date).order_by(MarketPrice.block_no))
+    return result.all()
+
+async def count_complete_dam_blocks(db: AsyncSession, date: date) -> int:
+    return await db.scalar(
+        select(func.count(func.distinct(MarketPrice.block_no))).where(MarketPrice.date == date, MarketPrice.dam_price.isnot(None))
+    )
+
+async def get_weather(db: AsyncSession, site_id: int, date: date):
+    if USE_VECTORS:
+        return await _vector_records(db, site_id, date, WEATHER_COLUMNS)
+    result = await db.scalars(select(WeatherData).where(WeatherData.site_id == site_id, WeatherData.date == date).order_by(WeatherData.block_no))
+    return result.all()
+
+async def aggregate_dsm_by_site(db: AsyncSession, start_date: date, end_date: date, site_id: int = None) -> list[dict]:
+    result = await db.execute(dsm_by_site_query(start_date, end_date, site_id))
+    return [dict(row._mapping) for row in result]
+
+async def get_dsm_version_stamp(db: AsyncSession, start_date: date, end_date: date, site_id: int = None) -> list:
+    result = await db.execute(dsm_version_stamp_query(start_date, end_date, site_id))
+    return [str(value) if value is not None else None for value in result.one()]
+
+async def get_report_by_cache_key(db: AsyncSession, cache_key: str) -> Report:
+    return await db.scalar(select(Report).where(Report.cache_key == cache_key).order_by(Report.report_id.desc()).limit(1))
+
+async def create_report(db: AsyncSession, site_id: int, report_type: str, period: str, json_data: dict, cache_key: str = None) -> Report:
+    db_report = Report(site_id=site_id, report_type=report_type, period=period, json_data=json_data, cache_key=cache_key)
+    db.add(db_report)
+    await db.commit()  # expire_on_commit=False: report_id is populated by the flush, no refresh needed
+    return db_report
+
+async def get_ai_memory(db: AsyncSession, user_id: int, limit: int = 10):
+    result = await db.scalars(
+        select(AiMemory).where(AiMemory.user_id == user_id).order_by(AiMemory.timestamp.desc(), AiMemory.memory_id.desc()).limit(limit)
+    )
+    return result.all()
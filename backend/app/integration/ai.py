@@ -1,53 +1,207 @@
-import google.generativeai as genai
+import hashlib
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import date
-from ...models import AIQuery, AIResponse
-from ...crud import create_ai_memory, get_ai_memory, get_dsm_summary, get_site  # Etc. for data grounding
-from ...database import get_db
+from types import SimpleNamespace
+from ..models import AIQuery, AIResponse
+from ..crud import create_ai_memory, get_site, get_site_names, get_dsm_version_stamp
+from ..utils.ai_context import build_context, dsm_facts, maybe_compact
+from ..utils.intent import parse_intent, normalize_query
 from sqlalchemy.orm import Session
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY", "your_gemini_api_key"))
-model = genai.GenerativeModel('gemini-1.5-flash')  # Or 'gemini-pro'
+AI_MODEL = os.getenv("AI_MODEL", "gemini")  # "fake": local stand-in, no API key or network (tests, benchmarks)
+AI_FAKE_LATENCY_MS = int(os.getenv("AI_FAKE_LATENCY_MS", "0"))  # Simulated model latency for the fake
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))  # Seconds; data-referencing answers also expire when the data changes
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "512"))
+ALL_DATES = (date.min, date.max)
+MAX_SITES = 8  # Sites loaded for one question's context and cache key
 
-def process_ai_query(db: Session, user_id: int, query_obj: AIQuery) -> AIResponse:
+
+class FakeModel:
+    """
+    Deterministic stand-in for the Gemini model: echoes the user query (and grounding data) back.
+    With stream=True the answer arrives word by word, spread over AI_FAKE_LATENCY_MS.
+    """
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        lines = [line.strip() for line in prompt.splitlines()]
+        query = next((line[len("User query: "):] for line in lines if line.startswith("User query: ")), "")
+        data = [line[2:] for line in lines if line.startswith("* ")]
+        text = f"[fake model] {query}" + (f" | {'; '.join(data)}" if data else "")
+        if stream:
+            return self._stream(text)
+        if AI_FAKE_LATENCY_MS:
+            time.sleep(AI_FAKE_LATENCY_MS / 1000)
+        return SimpleNamespace(text=text)
+
+    def _stream(self, text: str):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if AI_FAKE_LATENCY_MS:
+                time.sleep(AI_FAKE_LATENCY_MS / 1000 / len(words))
+            yield SimpleNamespace(text=word if i == 0 else " " + word)
+
+
+def _load_model():
+    if AI_MODEL == "fake":
+        return FakeModel()
+    import google.generativeai as genai  # Only needed for the real model
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY", "your_gemini_api_key"))
+    return genai.GenerativeModel('gemini-1.5-flash')  # Or 'gemini-pro'
+
+model = _load_model()
+
+# Model answers by normalized query + version of the data the query references
+_response_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _cache_get(key: str):
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            _response_cache.pop(key, None)
+            return None
+        _response_cache.move_to_end(key)
+        return entry[1]
+
+def _cache_put(key: str, text: str):
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic() + AI_CACHE_TTL, text)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > AI_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def _cache_key(db: Session, query: str, intent: dict, sites: dict, user_id: int = None) -> str:
     """
-    Process natural language query using Gemini, grounded in DB data (e.g., DSM reports).
-    Maintains memory by fetching recent context and appending to prompt.
-    Examples: "Show DSM for REWA on 2025-10-07" -> Fetches and summarizes.
+    Normalized query plus the referenced data's version: the site rows and the dsm_site_days stamp over
+    the referenced sites/dates (all dates when none is named, the fleet when several sites are), so
+    re-settlement or a site edit yields a new key. Queries referencing neither rely on AI_CACHE_TTL alone.
+    With user_id the key is private to that user (answers shaped by their conversation).
     """
-    # Fetch memory context
-    recent_memory = get_ai_memory(db, user_id, limit=3)
-    context_str = "\n".join([f"Q: {m.query}\nA: {m.response}" for m in recent_memory]) if recent_memory else ""
-    
-    # Ground prompt with data (parse query for intent, e.g., site/date)
-    prompt = f"""
+    stamp = None
+    if intent["site_ids"] or intent["dates"]:
+        start, end = (intent["dates"][0], intent["dates"][-1]) if intent["dates"] else ALL_DATES
+        stamp = get_dsm_version_stamp(db, start, end, intent["site_id"])
+    site_versions = [[site.site_id, site.site_name, site.capacity_mw, site.region, site.state] for site in sites.values()]
+    return hashlib.sha256(json.dumps([normalize_query(query), intent["site_ids"], [str(d) for d in intent["dates"]], stamp, site_versions, user_id]).encode()).hexdigest()
+
+def _lookup_answer(db: Session, intent: dict, site) -> str:
+    """Answer for a parsed site/date/metric lookup, straight from the stored settlements."""
+    name = site.site_name
+    if intent["metric"] == "capacity":
+        return f"{name}: {site.capacity_mw:g} MW capacity ({site.region or 'unknown region'}, {site.state or 'unknown state'})."
+    day = intent["date"]
+    facts = dsm_facts(db, site.site_id, day)
+    if not facts["blocks"]:
+        return f"No DSM settlement stored for {name} on {day}."
+    if intent["metric"] == "payable":
+        return f"{name} on {day}: DSM payable INR {facts['payable']:,.2f} across {facts['penalty_blocks']} penalty blocks."
+    if intent["metric"] == "receivable":
+        return f"{name} on {day}: DSM receivable INR {facts['receivable']:,.2f}."
+    if intent["metric"] == "net":
+        return f"{name} on {day}: net DSM INR {facts['net']:,.2f} (receivable {facts['receivable']:,.2f}, payable {facts['payable']:,.2f})."
+    if intent["metric"] == "price":
+        if facts["avg_price"] is None:
+            return f"No market prices recorded with the {name} settlement on {day}."
+        return f"{name} on {day}: average settlement price INR {facts['avg_price']:.2f}/kWh."
+    return (
+        f"DSM for {name} on {day}: payable INR {facts['payable']:,.2f}, receivable INR {facts['receivable']:,.2f}, "
+        f"net INR {facts['net']:,.2f}; {facts['penalty_blocks']} of {facts['blocks']} blocks in a penalty band."
+    )
+
+def _remember(db: Session, user_id: int, query: str, ai_text: str, source: str, context_tokens: int = 0) -> AIResponse:
+    """Store the turn (metadata only: earlier turns live in their own rows and the summary) and compact if due."""
+    create_ai_memory(db, user_id, query, ai_text, {"source": source, "context_tokens": context_tokens})
+    maybe_compact(db, user_id)
+    return AIResponse(response=ai_text, context=ai_text[:200], source=source)
+
+def _prompt(query: str, context: dict) -> str:
+    history = "\n".join(context["turns"]) or "(none)"
+    data = "\n".join(f"    * {line}" for line in context["data"]) or "    * No site or date recognized in the query."
+    return f"""
     You are a DSM expert for SPRNG Energy. Use CERC rules. Ground responses in provided data.
-    Recent conversation: {context_str}
-    
-    User query: {query_obj.query}
-    
-    Available data examples:
-    - Sites: REWA Solar (50MW, Madhya Pradesh)
-    - DSM Summary: For a site/date, compute deviation/penalty.
-    
-    If query asks for report: e.g., "DSM for REWA 2025-10-07" -> "Deviation 5%, Payable INR 1000".
+    Earlier conversation (summary): {context["summary"] or "(none)"}
+    Recent conversation:
+{history}
+
+    User query: {query}
+
+    Data:
+{data}
+
+    CERC bands: 0-15% deviation no penalty, 15-20% 50%, >20% 100%.
     If predictive: "Predict tomorrow's penalty" -> Use trends/weather.
     Keep responses concise, actionable.
     """
-    
+
+def _prepare(db: Session, user_id: int, query_obj: AIQuery) -> dict:
+    """
+    {"answer": AIResponse} when the query is answered without the model (lookup or cache hit),
+    else {"prompt", "cache_key", "context"} for the model call.
+    """
+    intent = parse_intent(query_obj.query, get_site_names(db))
+    sites = {site_id: get_site(db, site_id) for site_id in intent["site_ids"][:MAX_SITES]}
+    if intent["answerable"]:
+        return {"answer": _remember(db, user_id, query_obj.query, _lookup_answer(db, intent, sites[intent["site_id"]]), "lookup")}
+    shared_key = _cache_key(db, query_obj.query, intent, sites)
+    user_key = _cache_key(db, query_obj.query, intent, sites, user_id)
+    for key in (user_key, shared_key):
+        ai_text = _cache_get(key)
+        if ai_text is not None:
+            return {"answer": _remember(db, user_id, query_obj.query, ai_text, "cache")}
+    context = build_context(db, user_id, intent, sites)
+    # Only answers built without conversation history are shared; the rest stay with the asking user
+    cache_key = user_key if context["turns"] or context["summary"] else shared_key
+    return {"prompt": _prompt(query_obj.query, context), "cache_key": cache_key, "context": context}
+
+def _model_error(db: Session, user_id: int, query: str, e: Exception) -> AIResponse:
+    error_msg = f"AI error: {e}. Fallback: Query logged, manual check needed."
+    create_ai_memory(db, user_id, query, error_msg, {"source": "error"})
+    return AIResponse(response=error_msg, context=None, source="error")
+
+def process_ai_query(db: Session, user_id: int, query_obj: AIQuery) -> AIResponse:
+    """
+    Answer a natural-language DSM query. Site/date/metric lookups ("Show DSM for REWA on 2025-10-07") are
+    answered from the DB without the model; other queries reuse a cached model answer while the referenced
+    data is unchanged, and only otherwise go to Gemini with a token-budgeted context (utils/ai_context.py).
+    Model answers are shared across users only when no conversation history went into the prompt.
+    """
+    prepared = _prepare(db, user_id, query_obj)
+    if "answer" in prepared:
+        return prepared["answer"]
     try:
-        # Query Gemini
-        response = model.generate_content(prompt)
+        response = model.generate_content(prepared["prompt"])
         ai_text = response.text if response.text else "Sorry, could not process query."
-        
-        # Store memory
-        create_ai_memory(db, user_id, query_obj.query, ai_text, {"context": context_str})
-        
-        # Update context for next (simple last response)
-        new_context = ai_text[:200]  # Truncate
-        
-        return AIResponse(response=ai_text, context=new_context)
     except Exception as e:
-        error_msg = f"AI error: {e}. Fallback: Query logged, manual check needed."
-        create_ai_memory(db, user_id, query_obj.query, error_msg)
-        return AIResponse(response=error_msg, context=None)
+        return _model_error(db, user_id, query_obj.query, e)
+    _cache_put(prepared["cache_key"], ai_text)
+    return _remember(db, user_id, query_obj.query, ai_text, "model", prepared["context"]["tokens"])
+
+def stream_ai_query(db: Session, user_id: int, query_obj: AIQuery):
+    """
+    process_ai_query as (event, data) pairs for SSE: "start" with the answer's source (lookup, cache or
+    model), "token" events with text as the model produces it, then "done" with the AIResponse (or "error").
+    Lookup and cached answers arrive as a single token. The turn is stored and cached only once the answer is complete.
+    """
+    prepared = _prepare(db, user_id, query_obj)
+    if "answer" in prepared:
+        yield "start", {"source": prepared["answer"].source}
+        yield "token", {"text": prepared["answer"].response}
+        yield "done", prepared["answer"].dict()
+        return
+    yield "start", {"source": "model"}
+    parts = []
+    try:
+        for chunk in model.generate_content(prepared["prompt"], stream=True):
+            if chunk.text:
+                parts.append(chunk.text)
+                yield "token", {"text": chunk.text}
+    except Exception as e:
+        yield "error", _model_error(db, user_id, query_obj.query, e).dict()
+        return
+    ai_text = "".join(parts) or "Sorry, could not process query."
+    _cache_put(prepared["cache_key"], ai_text)
+    yield "done", _remember(db, user_id, query_obj.query, ai_text, "model", prepared["context"]["tokens"]).dict()
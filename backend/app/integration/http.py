@@ -0,0 +1,128 @@
+import asyncio
+import os
+import random
+import time
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))  # Seconds; doubles per retry
+BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))  # Consecutive failed calls before opening
+BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "60"))  # Seconds before a trial call is let through
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while a host's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-host breaker: opens after BREAKER_THRESHOLD consecutive failures, half-opens after BREAKER_RESET.
+    Half-open lets exactly one trial call through; it closes the breaker on success and re-opens it on failure.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial_in_flight or time.monotonic() - self.opened_at < self.reset_after:
+            return False
+        self.trial_in_flight = True  # This caller is the trial; everyone else waits for its outcome
+        return True
+
+    def end_trial(self):
+        """Called by the trial caller when it finishes, however it ended (a 4xx or cancellation records nothing)."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class AsyncHttpClient:
+    """
+    Shared async client for upstream integrations (IEX, OpenWeather): keep-alive pooling,
+    per-host concurrency limits, timeouts, retry with exponential backoff and a circuit breaker.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport = None):
+        self._transport = transport  # Tests: httpx.MockTransport or an ASGITransport around the stub server
+        self._client = None
+        self._loop = None
+        self._host_limits = {}
+        self._breakers = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Connections belong to the loop that opened them; scripts calling asyncio.run get their own
+            self._client = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            )
+            self._loop = loop
+            self._host_limits = {}
+        return self._client
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        return self._breakers.setdefault(host, CircuitBreaker())
+
+    async def get_json(self, url: str, params: dict = None) -> dict:
+        client = self._get_client()
+        host = httpx.URL(url).host
+        breaker = self.breaker(host)
+        trial = breaker.opened_at is not None  # Allowed while open means this call is the half-open trial
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            return await self._get_with_retries(client, breaker, host, url, params)
+        finally:
+            if trial:
+                breaker.end_trial()
+
+    async def _get_with_retries(self, client: httpx.AsyncClient, breaker: CircuitBreaker, host: str, url: str, params: dict) -> dict:
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(HTTP_PER_HOST_LIMIT))
+        last_error = None
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                async with limit:
+                    response = await client.get(url, params=params)
+                if response.status_code in RETRYABLE_STATUS:
+                    raise httpx.HTTPStatusError(f"Upstream returned {response.status_code}", request=response.request, response=response)
+                response.raise_for_status()  # Other 4xx: caller's problem, not retried and not a breaker failure
+                breaker.record_success()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS:
+                    raise
+                last_error = e
+            except httpx.TransportError as e:  # Timeouts, refused/reset connections
+                last_error = e
+            if attempt < HTTP_RETRIES:
+                await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt) * (1 + random.random() / 2))
+        breaker.record_failure()
+        raise last_error
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+http_client = AsyncHttpClient()
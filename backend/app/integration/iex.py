@@ -1,39 +1,131 @@
-import requests
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import date
-from ...models import MarketPriceBlock
-from ...crud import create_or_update_market
-from ...database import get_db
+from ..models import MarketPriceBlock
+from ..crud import store_market_prices
+from .. import crud_async
+from ..database import SessionLocal
+from .http import http_client
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import httpx
 
 IEX_API_KEY = os.getenv("IEX_API_KEY", "your_iex_api_key_here")  # Get from posoco.in or IEX India
+IEX_BASE_URL = os.getenv("IEX_BASE_URL", "https://api.iexindia.in")  # Point at app.integration.stub_server locally
 
-def fetch_dam_prices(target_date: date, db: Session = None) -> list[MarketPriceBlock]:
+# Read-through price cache: past dates never change, today/tomorrow may still be revised
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", "128"))
+PAST_PRICE_TTL = int(os.getenv("PAST_PRICE_TTL", str(24 * 3600)))
+CURRENT_PRICE_TTL = int(os.getenv("CURRENT_PRICE_TTL", "300"))
+MISSING_PRICE_TTL = 30  # Back off before re-fetching a date the upstream could not complete
+
+_price_cache: "OrderedDict[date, tuple[float, list[dict]]]" = OrderedDict()
+_price_cache_lock = threading.Lock()
+_price_loads: "dict[date, asyncio.Future]" = {}  # Single-flight: date -> the miss being loaded, awaited by concurrent misses
+
+def _dam_blocks(data: dict) -> list[MarketPriceBlock]:
+    # Assume API returns hourly; interpolate to 15-min blocks (simplified)
+    blocks = []
+    for hour in range(24):
+        price = data.get(f"hour_{hour+1}", 3.0)  # Default 3 INR/kWh
+        for block_offset in range(4):  # 4 x 15-min per hour
+            block_no = hour * 4 + block_offset + 1
+            blocks.append(MarketPriceBlock(block_no=block_no, dam_price=price))
+    return blocks
+
+async def fetch_dam_prices(target_date: date, db: Session = None) -> list[MarketPriceBlock]:
     """
     Fetch Day-Ahead Market (DAM) prices from IEX API for a date (96 blocks).
     Stores in DB if session provided. Returns list of blocks.
     Note: IEX API may require registration; this uses a placeholder endpoint.
     """
     # Real IEX endpoint example (adapt to official API; may need auth)
-    url = f"https://api.iexindia.in/v1/market-data/day-ahead/{target_date.strftime('%Y-%m-%d')}?apikey={IEX_API_KEY}"
+    url = f"{IEX_BASE_URL}/v1/market-data/day-ahead/{target_date.strftime('%Y-%m-%d')}"
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            # Assume API returns hourly; interpolate to 15-min blocks (simplified)
-            blocks = []
-            for hour in range(24):
-                price = data.get(f"hour_{hour+1}", 3.0)  # Default 3 INR/kWh
-                for block_offset in range(4):  # 4 x 15-min per hour
-                    block_no = hour * 4 + block_offset + 1
-                    if 1 <= block_no <= 96:
-                        create_or_update_market(db, target_date, block_no, dam_price=price) if db else None
-                        blocks.append(MarketPriceBlock(block_no=block_no, dam_price=price))
-            return blocks
-        else:
-            # Fallback: Mock data for testing
-            return [MarketPriceBlock(block_no=i, dam_price=3.0 + i*0.1) for i in range(1, 97)]
+        data = await http_client.get_json(url, params={"apikey": IEX_API_KEY})
+        blocks = _dam_blocks(data)
+        if db:
+            await run_in_threadpool(store_market_prices, db, target_date, blocks)  # One upsert for the whole day
+        return blocks
+    except httpx.HTTPStatusError:
+        # Fallback: Mock data for testing
+        return [MarketPriceBlock(block_no=i, dam_price=3.0 + i*0.1) for i in range(1, 97)]
     except Exception as e:
         print(f"IEX API error: {e}")
         # Fallback mock
         return [MarketPriceBlock(block_no=i, dam_price=3.0) for i in range(1, 97)]
+
+def _price_ttl(target_date: date, complete: bool) -> float:
+    if not complete:
+        return MISSING_PRICE_TTL
+    return PAST_PRICE_TTL if target_date < date.today() else CURRENT_PRICE_TTL
+
+def _cache_get(target_date: date):
+    with _price_cache_lock:
+        entry = _price_cache.get(target_date)
+        if entry is None:
+            return None
+        expires_at, blocks = entry
+        if expires_at < time.monotonic():
+            del _price_cache[target_date]
+            return None
+        _price_cache.move_to_end(target_date)
+        return blocks
+
+def _cache_put(target_date: date, blocks: list[dict], ttl: float):
+    with _price_cache_lock:
+        _price_cache[target_date] = (time.monotonic() + ttl, blocks)
+        _price_cache.move_to_end(target_date)
+        while len(_price_cache) > PRICE_CACHE_SIZE:
+            _price_cache.popitem(last=False)
+
+def invalidate_price_cache(target_date: date = None):
+    """Drop one date (or everything), e.g. after a manual price override."""
+    with _price_cache_lock:
+        if target_date is None:
+            _price_cache.clear()
+        else:
+            _price_cache.pop(target_date, None)
+
+async def get_cached_market_prices(db: AsyncSession, target_date: date) -> list[dict]:
+    """
+    Read-through price lookup: in-process LRU first, then market_prices, and only if the
+    date's 96 DAM blocks are not all stored, a fetch from IEX. Returns block dicts.
+    Reads are awaited on the async session; the (rare) store goes through a sync session in the threadpool.
+    Concurrent misses for a date wait for the first one's load instead of each querying and fetching.
+    """
+    while True:
+        blocks = _cache_get(target_date)
+        if blocks is not None:
+            return blocks
+        pending = _price_loads.get(target_date)
+        if pending is None:
+            break
+        blocks = await asyncio.shield(pending)
+        if blocks is not None:
+            return blocks
+        # The load failed or was cancelled; its error went to its own caller, so try again here
+    pending = _price_loads[target_date] = asyncio.get_running_loop().create_future()
+    try:
+        blocks = await _load_market_prices(db, target_date)
+        pending.set_result(blocks)
+        return blocks
+    finally:
+        if not pending.done():
+            pending.set_result(None)
+        del _price_loads[target_date]
+
+async def _load_market_prices(db: AsyncSession, target_date: date) -> list[dict]:
+    complete = await crud_async.count_complete_dam_blocks(db, target_date) == 96
+    if not complete:
+        with SessionLocal() as write_db:
+            await fetch_dam_prices(target_date, write_db)
+        complete = await crud_async.count_complete_dam_blocks(db, target_date) == 96
+    prices = await crud_async.get_market_prices(db, target_date)
+    blocks = [{"block_no": p.block_no, "dam_price": p.dam_price, "rtm_price": p.rtm_price} for p in prices]
+    _cache_put(target_date, blocks, _price_ttl(target_date, complete))
+    return blocks
@@ -0,0 +1,42 @@
+"""
+Local stand-in for the IEX and OpenWeather upstreams.
+
+    uvicorn app.integration.stub_server:app --port 8081
+    IEX_BASE_URL=http://localhost:8081 OPENWEATHER_BASE_URL=http://localhost:8081 python run.py
+
+STUB_LATENCY_MS adds a delay per request and STUB_FAIL_EVERY=n answers every n-th request
+with a 503, to exercise timeouts, retries and the circuit breaker.
+"""
+import asyncio
+import itertools
+import os
+from datetime import datetime
+from fastapi import FastAPI, Response
+
+STUB_LATENCY_MS = int(os.getenv("STUB_LATENCY_MS", "0"))
+STUB_FAIL_EVERY = int(os.getenv("STUB_FAIL_EVERY", "0"))
+
+app = FastAPI(title="SPRNG upstream stub")
+_requests = itertools.count(1)
+
+async def _simulate(response: Response) -> bool:
+    """Apply configured latency; returns False when this request should fail."""
+    if STUB_LATENCY_MS:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    if STUB_FAIL_EVERY and next(_requests) % STUB_FAIL_EVERY == 0:
+        response.status_code = 503
+        return False
+    return True
+
+@app.get("/v1/market-data/day-ahead/{target_date}")
+async def day_ahead(target_date: str, response: Response):
+    if not await _simulate(response):
+        return {"error": "unavailable"}
+    day = datetime.strptime(target_date, "%Y-%m-%d").timetuple().tm_yday
+    return {f"hour_{hour}": round(2.5 + (hour % 12) * 0.25 + (day % 7) * 0.1, 2) for hour in range(1, 25)}
+
+@app.get("/data/2.5/onecall/timemachine")
+async def timemachine(lat: float, lon: float, dt: int, response: Response):
+    if not await _simulate(response):
+        return {"error": "unavailable"}
+    return {"lat": lat, "lon": lon, "current": {"dt": dt, "uvi": 6.5, "temp": 28.0 + lat % 3, "wind_speed": 4.5, "clouds": int(abs(lon)) % 100}}
@@ -1,40 +1,116 @@
-import requests
-from datetime import date, datetime
+import asyncio
 import os
-from ...models import WeatherResponse
-from ...crud import create_or_update_weather
-from ...database import get_db
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from ..models import WeatherResponse
+from ..crud import get_located_sites, get_populated_weather_sites, store_weather_days
+from .http import http_client
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import httpx
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "your_owm_key")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org")  # Point at app.integration.stub_server locally
+
+# Sites whose coordinates round to the same grid cell share one upstream call (2 decimals ~ 1 km)
+WEATHER_GRID_DECIMALS = int(os.getenv("WEATHER_GRID_DECIMALS", "2"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "2048"))
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "1800"))
+
+_cell_cache: "OrderedDict[tuple, tuple[float, WeatherResponse]]" = OrderedDict()
+_cell_cache_lock = threading.Lock()
 
-def fetch_weather(site_lat: float, site_lon: float, target_date: date, site_id: int, db: Session = None) -> list[WeatherResponse]:
+def _grid_cell(lat: float, lon: float, target_date: date) -> tuple:
+    return (round(lat, WEATHER_GRID_DECIMALS), round(lon, WEATHER_GRID_DECIMALS), target_date)
+
+def _cache_get(cell: tuple):
+    with _cell_cache_lock:
+        entry = _cell_cache.get(cell)
+        if entry is None or entry[0] < time.monotonic():
+            _cell_cache.pop(cell, None)
+            return None
+        _cell_cache.move_to_end(cell)
+        return entry[1]
+
+def _cache_put(cell: tuple, reading: WeatherResponse):
+    with _cell_cache_lock:
+        _cell_cache[cell] = (time.monotonic() + WEATHER_CACHE_TTL, reading)
+        _cell_cache.move_to_end(cell)
+        while len(_cell_cache) > WEATHER_CACHE_SIZE:
+            _cell_cache.popitem(last=False)
+
+async def _fetch_cell(cell: tuple) -> WeatherResponse:
+    """One upstream reading per grid cell/date; raises on upstream failure."""
+    cached = _cache_get(cell)
+    if cached is not None:
+        return cached
+    lat, lon, target_date = cell
+    timestamp = int(datetime(target_date.year, target_date.month, target_date.day).timestamp())
+    url = f"{OPENWEATHER_BASE_URL}/data/2.5/onecall/timemachine"
+    params = {"lat": lat, "lon": lon, "dt": timestamp, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    data = await http_client.get_json(url, params=params)
+    current = data.get('current', {})
+    # Assume hourly data; interpolate to 15-min (simplified: repeat per block)
+    reading = WeatherResponse(
+        irradiance=current.get('uvi', 0) * 100,  # UVI to rough W/m²
+        temp=current.get('temp', 25.0),
+        wind_speed=current.get('wind_speed', 5.0),
+        cloud_cover=current.get('clouds', 50),
+    )
+    _cache_put(cell, reading)
+    return reading
+
+async def fetch_weather(site_lat: float, site_lon: float, target_date: date, site_id: int, db: Session = None) -> list[WeatherResponse]:
     """
     Fetch weather data for a site/date from OpenWeatherMap (historical via timemachine).
     Interpolates to 96 blocks. Stores in DB if session provided.
     """
-    timestamp = int(datetime(target_date.year, target_date.month, target_date.day).timestamp())
-    url = f"https://api.openweathermap.org/data/2.5/onecall/timemachine?lat={site_lat}&lon={site_lon}&dt={timestamp}&appid={OPENWEATHER_API_KEY}&units=metric"
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            current = data.get('current', {})
-            # Assume hourly data; interpolate to 15-min (simplified: repeat per block)
-            irradiance = current.get('uvi', 0) * 100  # UVI to rough W/m²
-            temp = current.get('temp', 25.0)
-            wind_speed = current.get('wind_speed', 5.0)
-            cloud_cover = current.get('clouds', 50)
-            
-            blocks = []
-            for block_no in range(1, 97):
-                create_or_update_weather(db, site_id, target_date, block_no, irradiance, temp, wind_speed, cloud_cover) if db else None
-                blocks.append(WeatherResponse(irradiance=irradiance, temp=temp, wind_speed=wind_speed, cloud_cover=cloud_cover))
-            return blocks
-        else:
-            # Fallback mock
-            return [WeatherResponse(irradiance=500.0, temp=25.0, wind_speed=5.0, cloud_cover=50) for _ in range(96)]
+        reading = await _fetch_cell(_grid_cell(site_lat, site_lon, target_date))
+        if db:
+            await run_in_threadpool(store_weather_days, db, target_date, {site_id: reading})
+        return [reading] * 96
+    except httpx.HTTPStatusError:
+        # Fallback mock
+        return [WeatherResponse(irradiance=500.0, temp=25.0, wind_speed=5.0, cloud_cover=50) for _ in range(96)]
     except Exception as e:
         print(f"Weather API error: {e}")
         # Fallback
         return [WeatherResponse(irradiance=0, temp=0, wind_speed=0, cloud_cover=0) for _ in range(96)]
+
+async def refresh_fleet_weather(db: Session, target_date: date, site_ids: list[int] = None, force: bool = False) -> dict:
+    """
+    Fetch and store a day of weather for many sites at once.
+    Site-days already holding 96 blocks are skipped (unless force), sites sharing a grid cell
+    share one request, cells are fetched concurrently (bounded by the HTTP client's per-host
+    limit) and all results are written in one bulk statement. Failed cells are reported, not mocked.
+    """
+    sites = await run_in_threadpool(get_located_sites, db, site_ids)
+    populated = set() if force or not sites else await run_in_threadpool(get_populated_weather_sites, db, [s.site_id for s in sites], target_date)
+    pending = [s for s in sites if s.site_id not in populated]
+
+    cells = {}
+    for site in pending:
+        cells.setdefault(_grid_cell(site.latitude, site.longitude, target_date), []).append(site.site_id)
+    results = await asyncio.gather(*(_fetch_cell(cell) for cell in cells), return_exceptions=True)
+
+    readings, failed = {}, []
+    for (cell, cell_sites), result in zip(cells.items(), results):
+        if isinstance(result, Exception):
+            print(f"Weather API error for cell {cell[:2]}: {result}")
+            failed.extend(cell_sites)
+            continue
+        for site_id in cell_sites:
+            readings[site_id] = result
+    if readings:
+        await run_in_threadpool(store_weather_days, db, target_date, readings)
+    return {
+        "date": str(target_date),
+        "sites": len(sites),
+        "skipped": len(populated),
+        "cells": len(cells),
+        "stored": len(readings),
+        "failed_sites": failed,
+    }
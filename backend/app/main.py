@@ -1,13 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sqlalchemy import text
-from .database import engine, Base, get_db
-from .api import auth, sites, schedule, generation, deviation, market, weather_api, reports, ai, revenue  # Import all routers
+from .database import engine, Base, get_db, pool_stats, dispose_async_engines
+from .api import auth, sites, schedule, generation, deviation, market, weather_api, reports, ai, revenue, telemetry, alerts  # Import all routers
+from .integration.http import http_client
+from .utils.report_render import shutdown_render_pool
+from .utils.audit import audit_buffer
+from .utils.telemetry import telemetry as telemetry_accumulator
+from .utils.metrics import MetricsMiddleware, render_metrics
 from sqlalchemy.orm import Session
 import os
 
-# Create all tables on startup (use migrations in prod)
-Base.metadata.create_all(bind=engine)
+# Schema is managed by Alembic (`cd backend && alembic upgrade head`); create_all only for throwaway SQLite databases
+DB_AUTO_CREATE = os.getenv("DB_AUTO_CREATE", "1" if engine.dialect.name == "sqlite" else "0").lower() in ("1", "true", "yes")
+if DB_AUTO_CREATE:
+    Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="SPRNG DSM Portal API", version="1.0.0", description="Unified DSM Automation for SPRNG Energy")
 
@@ -18,7 +26,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)  # Latency/status/DB-statement metrics and the Server-Timing header
 
 # Include routers (prefix /api already in each router file)
 app.include_router(auth.router)
@@ -31,16 +41,36 @@ app.include_router(weather_api.router)
 app.include_router(reports.router)
 app.include_router(ai.router)
 app.include_router(revenue.router)
+app.include_router(telemetry.router)
+app.include_router(alerts.router)
 
 @app.get("/")
 def root():
     return {"message": "SPRNG DSM Portal API - Ready for DSM Automation"}
 
+@app.get("/health/db")
+def db_health():
+    """Connection pool usage and checkout wait per engine (primary / replica)."""
+    return pool_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: per-route latency, status, in-flight and SQL counts, plus pool stats."""
+    return PlainTextResponse(render_metrics(pool_stats()), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 async def startup_event():
     # Optional: Init scheduler or fetch market data
     pass
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.aclose()  # Close pooled upstream connections
+    shutdown_render_pool()
+    telemetry_accumulator.close()  # Write open telemetry blocks as they stand
+    audit_buffer.close()  # Drain buffered audit events
+    await dispose_async_engines()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
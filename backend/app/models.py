@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import date
-from typing import List, Optional
+from typing import List, Literal, Optional
 from enum import Enum
 
 class RoleEnum(str, Enum):
@@ -101,8 +101,44 @@ class AIQuery(BaseModel):
 class AIResponse(BaseModel):
     response: str
     context: Optional[str] = None  # For next query memory
+    source: Optional[str] = None  # lookup (answered from the DB), cache, model or error
 
 class RevenueSummary(BaseModel):
     total_revenue: float
     dsm_loss: float
     scenarios: dict  # e.g., {"with_dsm": 10000, "without_dsm": 12000}
+
+class ScenarioParams(BaseModel):
+    name: str
+    price: Literal["dam", "rtm"] = "dam"  # Price series for energy revenue and DSM amounts
+    partial_threshold: float = 15.0  # |deviation| % above which the partial band starts
+    full_threshold: float = 20.0
+    partial_factor: float = 0.5
+    full_factor: float = 1.0
+    capacity_scale: float = Field(1.0, gt=0)  # e.g. 1.2 = 20% more output with the same profile; energy and DSM scale linearly
+    schedule_accuracy: float = Field(0.0, ge=0, le=1)  # Fraction of each block's schedule error removed
+
+class ScenarioRequest(BaseModel):
+    period: str  # e.g., '2025-10' (a site's month) or '2025' (a fleet's year)
+    site_id: Optional[int] = None  # None = whole fleet
+    scenarios: List[ScenarioParams]
+
+class ScenarioResult(ScenarioParams):
+    energy_revenue: float
+    dsm_payable: float
+    dsm_receivable: float
+    dsm_loss: float
+    net_revenue: float
+    net_vs_baseline: float
+    blocks_none: int
+    blocks_partial: int
+    blocks_full: int
+
+class ScenarioComparison(BaseModel):
+    period: str
+    start_date: date
+    end_date: date
+    sites: int
+    site_days: int
+    blocks: int
+    results: List[ScenarioResult]  # Baseline first
@@ -1,7 +1,32 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Enum as SQLEnum, ForeignKey, DateTime, JSON, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, Enum as SQLEnum, ForeignKey, DateTime, JSON, Text, Boolean, UniqueConstraint, LargeBinary, Index
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
+import numpy as np
 from .database import Base
 
+BLOCKS_PER_DAY = 96
+
+class BlockVector(TypeDecorator):
+    """
+    One site-day of a 15-minute series packed as 96 little-endian float64 (768 bytes, bytea/BLOB).
+    Binds any 96-length sequence (missing blocks as NaN) and loads a read-only numpy array.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        vector = np.asarray(value, dtype="<f8")
+        if vector.shape != (BLOCKS_PER_DAY,):
+            raise ValueError(f"Block vector must have {BLOCKS_PER_DAY} values, got shape {vector.shape}")
+        return vector.tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype="<f8")
+
 # Users
 class User(Base):
     __tablename__ = "users"
@@ -24,9 +49,14 @@ class Site(Base):
     longitude = Column(Float)
     created_at = Column(DateTime, default=func.now())
 
+# Block tables: (site_id, date, block_no) is unique and doubles as the site/date lookup index.
+# On Postgres, schedules/generations/dsm_settlements are range-partitioned by month (migration 0003),
+# where the primary key becomes (id, date); the ORM keeps the single-column key for identity.
+
 # Schedules
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (UniqueConstraint("site_id", "date", "block_no", name="schedules_site_id_date_block_no_key"),)  # Matches db/schema.sql
     schedule_id = Column(Integer, primary_key=True, index=True)
     site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
@@ -37,6 +67,7 @@ class Schedule(Base):
 # Generations
 class Generation(Base):
     __tablename__ = "generations"
+    __table_args__ = (UniqueConstraint("site_id", "date", "block_no", name="generations_site_id_date_block_no_key"),)  # Matches db/schema.sql
     generation_id = Column(Integer, primary_key=True, index=True)
     site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
@@ -47,6 +78,7 @@ class Generation(Base):
 # Deviations
 class Deviation(Base):
     __tablename__ = "deviations"
+    __table_args__ = (UniqueConstraint("site_id", "date", "block_no", name="deviations_site_id_date_block_no_key"),)
     deviation_id = Column(Integer, primary_key=True, index=True)
     site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
@@ -58,6 +90,7 @@ class Deviation(Base):
 # DSM Settlements
 class DsmSettlement(Base):
     __tablename__ = "dsm_settlements"
+    __table_args__ = (UniqueConstraint("site_id", "date", "block_no", name="dsm_settlements_site_id_date_block_no_key"),)  # Matches db/schema.sql
     dsm_id = Column(Integer, primary_key=True, index=True)
     site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
@@ -67,9 +100,51 @@ class DsmSettlement(Base):
     market_price = Column(Float)
     created_at = Column(DateTime, default=func.now())
 
+# DSM rollups (maintained from dsm_settlements by crud.refresh_rollups)
+class DsmSiteDay(Base):
+    __tablename__ = "dsm_site_days"
+    __table_args__ = (UniqueConstraint("site_id", "date", name="dsm_site_days_site_id_date_key"),)
+    rollup_id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    blocks = Column(Integer, default=0)
+    blocks_none = Column(Integer, default=0)
+    blocks_partial = Column(Integer, default=0)
+    blocks_full = Column(Integer, default=0)
+    total_payable = Column(Float, default=0.0)
+    total_receivable = Column(Float, default=0.0)
+    net = Column(Float, default=0.0)  # receivable - payable
+    max_abs_deviation = Column(Float)
+    actual_mwh = Column(Float, default=0.0)
+    energy_revenue = Column(Float, default=0.0)  # actual energy x market price, INR
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class DsmSiteMonth(Base):
+    __tablename__ = "dsm_site_months"
+    __table_args__ = (UniqueConstraint("site_id", "month", name="dsm_site_months_site_id_month_key"),)
+    rollup_id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
+    month = Column(Date, nullable=False)  # First day of month
+    days = Column(Integer, default=0)
+    blocks = Column(Integer, default=0)
+    blocks_none = Column(Integer, default=0)
+    blocks_partial = Column(Integer, default=0)
+    blocks_full = Column(Integer, default=0)
+    total_payable = Column(Float, default=0.0)
+    total_receivable = Column(Float, default=0.0)
+    net = Column(Float, default=0.0)
+    max_abs_deviation = Column(Float)
+    actual_mwh = Column(Float, default=0.0)
+    energy_revenue = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # Market Prices
 class MarketPrice(Base):
     __tablename__ = "market_prices"
+    __table_args__ = (  # Match db/schema.sql
+        UniqueConstraint("date", "block_no", name="market_prices_date_block_no_key"),
+        Index("idx_market_prices_date", "date"),
+    )
     market_id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False)
     block_no = Column(Integer, nullable=False)
@@ -80,6 +155,7 @@ class MarketPrice(Base):
 # Weather Data
 class WeatherData(Base):
     __tablename__ = "weather_data"
+    __table_args__ = (UniqueConstraint("site_id", "date", "block_no", name="weather_data_site_id_date_block_no_key"),)
     weather_id = Column(Integer, primary_key=True, index=True)
     site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
@@ -90,6 +166,37 @@ class WeatherData(Base):
     cloud_cover = Column(Integer)
     created_at = Column(DateTime, default=func.now())
 
+# Packed per-site-day series (BLOCK_STORAGE=vectors|both): one row per site-day instead of 96 per table
+class SiteDayBlocks(Base):
+    __tablename__ = "site_day_blocks"
+    __table_args__ = (UniqueConstraint("site_id", "date", name="site_day_blocks_site_id_date_key"),)
+    vector_id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    scheduled_mw = Column(BlockVector)
+    actual_mw = Column(BlockVector)
+    deviation_percent = Column(BlockVector)
+    penalty_code = Column(BlockVector)  # Index into dsm_calc.PENALTY_BANDS
+    dsm_payable = Column(BlockVector)
+    dsm_receivable = Column(BlockVector)
+    market_price = Column(BlockVector)
+    irradiance = Column(BlockVector)
+    temp = Column(BlockVector)
+    wind_speed = Column(BlockVector)
+    cloud_cover = Column(BlockVector)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Nightly pipeline checkpoints: a site-day is recorded once fetched and settled, so re-runs skip it
+class NightlyCheckpoint(Base):
+    __tablename__ = "nightly_checkpoints"
+    __table_args__ = (UniqueConstraint("site_id", "date", name="nightly_checkpoints_site_id_date_key"),)
+    checkpoint_id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    run_id = Column(String(32), nullable=False)
+    blocks = Column(Integer, default=0)  # Blocks settled for the site-day
+    completed_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # Reports
 class Report(Base):
     __tablename__ = "reports"
@@ -98,6 +205,7 @@ class Report(Base):
     report_type = Column(SQLEnum('daily', 'weekly', 'monthly', 'consolidated', name='report_types'))
     period = Column(String(50))
     json_data = Column(JSON)
+    cache_key = Column(String(64), index=True)  # sha256 of type/period/site + data version stamp
     created_at = Column(DateTime, default=func.now())
 
 # Audit Logs
@@ -112,9 +220,18 @@ class AuditLog(Base):
 # AI Memory
 class AiMemory(Base):
     __tablename__ = "ai_memory"
+    __table_args__ = (Index("idx_ai_memory_user", "user_id"),)  # Matches db/schema.sql
     memory_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     query = Column(Text, nullable=False)
     context = Column(JSON)
     response = Column(Text)
     timestamp = Column(DateTime, default=func.now())
+
+# Rolling per-user summary of AI turns compacted out of ai_memory (utils/ai_context.py)
+class AiSummary(Base):
+    __tablename__ = "ai_summaries"
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    turns = Column(Integer, nullable=False, default=0)  # Turns folded in so far
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
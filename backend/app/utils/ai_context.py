@@ -0,0 +1,145 @@
+"""
+Prompt context for /ai/query, assembled to a token budget: DSM data for the sites and dates the question
+names, the user's rolling summary, then as many recent turns as still fit. Turns beyond the newest
+AI_MEMORY_KEEP_TURNS (or older than AI_MEMORY_RETENTION_DAYS) are folded into the rolling summary and
+deleted, so both the prompt and ai_memory stay bounded however long a conversation runs.
+"""
+import os
+import re
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+from ..crud import (
+    get_ai_memory, get_ai_summary, get_compactable_ai_memory, get_ai_memory_users, fold_ai_memory, count_ai_memory,
+    get_dsm_summary,
+)
+
+AI_CONTEXT_TOKENS = int(os.getenv("AI_CONTEXT_TOKENS", "1500"))  # Summary + recent turns + data per prompt
+AI_SUMMARY_TOKENS = int(os.getenv("AI_SUMMARY_TOKENS", "300"))  # Rolling summary size per user
+AI_MEMORY_KEEP_TURNS = int(os.getenv("AI_MEMORY_KEEP_TURNS", "20"))  # Turns kept verbatim per user
+AI_MEMORY_RETENTION_DAYS = int(os.getenv("AI_MEMORY_RETENTION_DAYS", "30"))  # Older turns are compacted regardless
+AI_COMPACT_SLACK = 10  # Extra turns tolerated before a query compacts its user's memory inline
+DATA_SHARE = 0.5  # Share of the budget the data section may take
+MAX_SITE_DAYS = 8  # Site-days of data attached per prompt
+CHARS_PER_TOKEN = 4  # Rough estimate for English/numeric text; no tokenizer needed
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+def _fit(lines: list[str], budget: int) -> list[str]:
+    """Leading lines whose total estimate stays within budget."""
+    kept = []
+    for line in lines:
+        budget -= estimate_tokens(line) + 1
+        if budget < 0:
+            break
+        kept.append(line)
+    return kept
+
+
+def dsm_facts(db: Session, site_id: int, target_date: date) -> dict:
+    """Day totals for a site from its settlement rows, plus the rows themselves."""
+    rows = get_dsm_summary(db, site_id, target_date)
+    payable = sum(row.dsm_payable or 0.0 for row in rows)
+    receivable = sum(row.dsm_receivable or 0.0 for row in rows)
+    prices = [row.market_price for row in rows if row.market_price is not None]
+    return {
+        "rows": rows,
+        "blocks": len(rows),
+        "penalty_blocks": sum(1 for row in rows if (row.dsm_payable or 0.0) > 0),
+        "payable": payable,
+        "receivable": receivable,
+        "net": receivable - payable,
+        "avg_price": sum(prices) / len(prices) if prices else None,
+    }
+
+
+def data_lines(db: Session, intent: dict, sites: dict) -> list[str]:
+    """
+    Site lines, then per site-day a totals line followed by its blocks with a DSM amount, largest first.
+    Blocks settled to zero carry no information and are left out.
+    """
+    lines = [f"Site {site.site_id}: {site.site_name}, {site.capacity_mw:g} MW, {site.region}, {site.state}" for site in sites.values()]
+    site_days = [(site, day) for site in sites.values() for day in intent["dates"]][:MAX_SITE_DAYS]
+    for site, day in site_days:
+        facts = dsm_facts(db, site.site_id, day)
+        lines.append(
+            f"{site.site_name} {day}: {facts['blocks']} settled blocks, {facts['penalty_blocks']} in a penalty band, "
+            f"payable INR {facts['payable']:.2f}, receivable INR {facts['receivable']:.2f}"
+        )
+        charged = [row for row in facts["rows"] if (row.dsm_payable or 0.0) or (row.dsm_receivable or 0.0)]
+        charged.sort(key=lambda row: max(row.dsm_payable or 0.0, row.dsm_receivable or 0.0), reverse=True)
+        lines += [
+            f"  block {row.block_no}: payable {row.dsm_payable or 0.0:.2f}, receivable {row.dsm_receivable or 0.0:.2f}, price {row.market_price}"
+            for row in charged
+        ]
+    return lines
+
+
+def build_context(db: Session, user_id: int, intent: dict, sites: dict, budget: int = AI_CONTEXT_TOKENS) -> dict:
+    """
+    {"data", "summary", "turns", "tokens"}: data lines first (up to DATA_SHARE of the budget), then the
+    rolling summary, then recent turns newest first until the budget is spent (returned oldest first).
+    """
+    data = _fit(data_lines(db, intent, sites), int(budget * DATA_SHARE))
+    remaining = budget - sum(estimate_tokens(line) + 1 for line in data)
+    summary_row = get_ai_summary(db, user_id)
+    summary = _clip(summary_row.summary, min(AI_SUMMARY_TOKENS, max(remaining, 0))) if summary_row and summary_row.summary else ""
+    remaining -= estimate_tokens(summary)
+    turns = []
+    for memory in get_ai_memory(db, user_id, limit=AI_MEMORY_KEEP_TURNS):
+        turn = _clip(f"Q: {memory.query}\nA: {memory.response or ''}", budget // 4)  # One long answer cannot crowd out the rest
+        cost = estimate_tokens(turn) + 1
+        if cost > remaining:
+            break
+        turns.append(turn)
+        remaining -= cost
+    turns.reverse()
+    return {"data": data, "summary": summary, "turns": turns, "tokens": budget - remaining}
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", (text or "").strip(), maxsplit=1)[0]
+
+
+def summary_line(memory) -> str:
+    """One compacted turn: date, clipped question and the first sentence of the answer."""
+    stamp = memory.timestamp.strftime("%Y-%m-%d") if memory.timestamp else "?"
+    return f"- {stamp}: {_clip(memory.query, 30)} -> {_clip(_first_sentence(memory.response), 40)}"
+
+
+def merge_summary(summary: str, lines: list[str], budget: int = AI_SUMMARY_TOKENS) -> str:
+    """Existing summary lines plus the new ones, keeping the newest that fit the budget."""
+    merged = [line for line in summary.splitlines() if line] + lines
+    return "\n".join(reversed(_fit(list(reversed(merged)), budget)))
+
+
+def compact_user_memory(db: Session, user_id: int, keep: int = AI_MEMORY_KEEP_TURNS, retention_days: int = AI_MEMORY_RETENTION_DAYS) -> int:
+    """Fold a user's turns beyond `keep` (or older than retention_days) into their summary; returns turns folded."""
+    rows = get_compactable_ai_memory(db, user_id, keep, datetime.now() - timedelta(days=retention_days))
+    if not rows:
+        return 0
+    current = get_ai_summary(db, user_id)
+    summary = merge_summary(current.summary if current else "", [summary_line(row) for row in rows])
+    fold_ai_memory(db, user_id, summary, (current.turns if current else 0) + len(rows), [row.memory_id for row in rows])
+    return len(rows)
+
+
+def maybe_compact(db: Session, user_id: int):
+    """Inline compaction once a user is AI_COMPACT_SLACK turns past the limit (the daily job handles retention)."""
+    if count_ai_memory(db, user_id) > AI_MEMORY_KEEP_TURNS + AI_COMPACT_SLACK:
+        compact_user_memory(db, user_id)
+
+
+def compact_ai_memory(db: Session, keep: int = AI_MEMORY_KEEP_TURNS, retention_days: int = AI_MEMORY_RETENTION_DAYS) -> dict:
+    """Retention/compaction pass over every user (scheduler job)."""
+    before = datetime.now() - timedelta(days=retention_days)
+    users = get_ai_memory_users(db, keep, before)
+    folded = sum(compact_user_memory(db, user_id, keep, retention_days) for user_id in users)
+    return {"users": len(users), "turns_compacted": folded}
@@ -0,0 +1,163 @@
+"""
+Deviation alerts pushed to dashboards: "band" events when a settled block lands in the partial or full
+penalty band (live telemetry and single-block settlement), and "settlement" events with new day totals when
+a site-day is (re-)settled. Subscribers filter by site, region or state and receive events over SSE or a
+WebSocket (api/alerts.py).
+
+Fan-out goes through an in-process broker. ALERTS_BACKEND picks how events reach it:
+- local (default): straight to this process's subscribers; fine for a single API worker.
+- postgres: NOTIFY on ALERTS_CHANNEL; every worker LISTENs and fans out to its own subscribers, so events
+  from other workers, the scheduler and nightly processes arrive too.
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+from sqlalchemy import text
+from ..database import engine
+
+ALERTS_BACKEND = os.getenv("ALERTS_BACKEND", "local")
+ALERTS_CHANNEL = os.getenv("ALERTS_CHANNEL", "dsm_alerts")
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))  # Per subscriber; oldest events dropped for slow clients
+NOTIFY_MAX_BYTES = 7900  # Postgres NOTIFY payloads must stay under 8000 bytes
+
+
+class Subscription:
+    """One client's filters and queue; events are put from any thread through the owning loop."""
+
+    def __init__(self, site_ids=None, regions=None, states=None):
+        self.site_ids = set(site_ids or ())
+        self.regions = set(regions or ())
+        self.states = set(states or ())
+        self.queue = asyncio.Queue(maxsize=ALERT_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        """No filters: everything. Otherwise any matching site, region or state."""
+        if not (self.site_ids or self.regions or self.states):
+            return True
+        return event.get("site_id") in self.site_ids or event.get("region") in self.regions or event.get("state") in self.states
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def offer(self, event: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # Loop closed: the client is gone
+            pass
+
+
+class LocalBackend:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, events: list[dict]):
+        for event in events:
+            self.broker.deliver(event)
+
+    @property
+    def needs_publish(self) -> bool:
+        return self.broker.has_subscribers()
+
+
+class PostgresBackend:
+    """NOTIFY to publish; a listener thread per process LISTENs and hands payloads to the local broker."""
+
+    def __init__(self, broker, channel: str = ALERTS_CHANNEL):
+        self.broker = broker
+        self.channel = channel
+        self._thread = None
+        self._lock = threading.Lock()
+
+    needs_publish = True  # Subscribers may live in other processes
+
+    def publish(self, events: list[dict]):
+        payloads = [json.dumps(event, default=str) for event in events]
+        payloads = [payload for payload in payloads if len(payload.encode()) <= NOTIFY_MAX_BYTES]
+        if not payloads:
+            return
+        with engine.connect() as conn:
+            for payload in payloads:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            conn.commit()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name="alerts-listen", daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:  # Reconnect after connection loss
+            try:
+                conn = engine.raw_connection()
+                try:
+                    dbapi_conn = conn.dbapi_connection
+                    dbapi_conn.set_session(autocommit=True)
+                    dbapi_conn.cursor().execute(f'LISTEN "{self.channel}"')
+                    while True:
+                        if select.select([dbapi_conn], [], [], 30)[0]:
+                            dbapi_conn.poll()
+                            while dbapi_conn.notifies:
+                                self.broker.deliver(json.loads(dbapi_conn.notifies.pop(0).payload))
+                finally:
+                    conn.invalidate()  # Autocommit + LISTEN state must not go back to the pool
+            except Exception as e:
+                print(f"Alert listener error: {e}; reconnecting")
+                threading.Event().wait(5)
+
+
+class AlertBroker:
+    def __init__(self, backend: str = ALERTS_BACKEND):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self.backend = PostgresBackend(self) if backend == "postgres" else LocalBackend(self)
+
+    def subscribe(self, site_ids=None, regions=None, states=None) -> Subscription:
+        """Register a subscriber; call from the event loop that will read its queue."""
+        subscription = Subscription(site_ids, regions, states)
+        self.backend.start()
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def deliver(self, event: dict):
+        """Fan an event out to this process's matching subscribers."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    def publish(self, events: list[dict]):
+        """Send events from any thread or process. Never raises: alerts must not fail the write behind them."""
+        if not events or not self.backend.needs_publish:
+            return
+        try:
+            self.backend.publish(events)
+        except Exception as e:
+            print(f"Alert publish error: {e}")
+
+    @property
+    def active(self) -> bool:
+        """Whether publishing reaches anyone; lets callers skip building events."""
+        return self.backend.needs_publish
+
+
+broker = AlertBroker()
@@ -1,8 +1,109 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from datetime import datetime
 from ..schemas import AuditLog
+from ..database import SessionLocal
+import atexit
+import json
+import os
+import threading
 
-def log_action(db: Session, user_id: int, action: str, details: dict = None):
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2.0"))  # Seconds
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", str(AUDIT_BATCH_SIZE * 50)))  # Oldest events are dropped beyond this if the DB stays down
+
+class AuditBuffer:
+    """
+    Collects audit events in memory and writes them with multi-row INSERTs from a background thread, either
+    when AUDIT_BATCH_SIZE events are waiting (add() wakes it) or every AUDIT_FLUSH_INTERVAL seconds, using
+    its own session. add() never writes on the caller's thread; past AUDIT_MAX_BUFFER the oldest events are dropped.
+    close() drains whatever is left (called on app shutdown and at interpreter exit).
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 max_buffer: int = AUDIT_MAX_BUFFER):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, event: dict):
+        with self._lock:
+            self._events.append(event)
+            self._trim()
+            if len(self._events) >= self.batch_size:
+                self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+                self._thread.start()
+
+    def _trim(self):
+        """Drop the oldest events past max_buffer; call with _lock held."""
+        excess = len(self._events) - self.max_buffer
+        if excess > 0:
+            del self._events[:excess]
+            self.dropped += excess
+
+    def flush(self) -> bool:
+        """Write everything waiting; False if the write failed (the events are kept for the next flush)."""
+        with self._flush_lock:  # One writer at a time keeps events in order
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return True
+            db = None
+            try:
+                db = self.session_factory()
+                db.execute(insert(AuditLog), events)
+                db.commit()
+                return True
+            except Exception as e:
+                if db is not None:
+                    db.rollback()
+                print(f"Audit flush error: {e}")
+                with self._lock:  # Retry on the next flush, bounded
+                    self._events = events + self._events
+                    self._trim()
+                return False
+            finally:
+                if db is not None:
+                    db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self.flush():
+                self._stop.wait(self.flush_interval)  # DB down: don't spin on a full buffer
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+audit_buffer = AuditBuffer()
+atexit.register(audit_buffer.close)
+
+def log_action(db: Session, user_id: int, action: str, details: dict = None, strict: bool = False):
     """
     Log user actions to audit_logs table.
+    Default: buffered and written in batches off the request path.
+    strict=True: added to the caller's session so it commits (or rolls back) with the caller's transaction.
     """
-    db_log = AuditLog(user_id
+    event = {
+        "user_id": user_id,
+        "action": action,
+        "details": json.loads(json.dumps(details, default=str)) if details else details,
+        "timestamp": datetime.now(),  # Event time, not flush time
+    }
+    if strict:
+        db.add(AuditLog(**event))
+    else:
+        audit_buffer.add(event)
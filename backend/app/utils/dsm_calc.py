@@ -1,3 +1,5 @@
+import numpy as np
+
 def calculate_dsm(actual_mw: float, scheduled_mw: float, capacity_mw: float, market_price: float = 3.0) -> dict:
     """
     CERC DSM 2022/2024/2025 compliant calculation.
@@ -37,3 +39,65 @@ def calculate_dsm(actual_mw: float, scheduled_mw: float, capacity_mw: float, mar
         "dsm_payable": round(dsm_payable, 2),
         "dsm_receivable": round(dsm_receivable, 2)
     }
+
+
+PENALTY_BANDS = np.array(["none", "partial", "full"])
+PENALTY_CODES = {band: code for code, band in enumerate(PENALTY_BANDS.tolist())}
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Vectorized round(x, 2) matching Python's built-in exactly.
+    np.round scales by 100 first, which disagrees with round() on values sitting on a .xx5 tie;
+    those few elements are re-rounded with the built-in.
+    """
+    scaled = values * 100.0
+    rounded = np.rint(scaled) / 100.0
+    frac = np.abs(scaled - np.trunc(scaled))
+    ties = np.abs(frac - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    if ties.any():
+        rounded[ties] = [round(v, 2) for v in values[ties].tolist()]
+    return rounded
+
+
+def calculate_dsm_batch(actual_mw, scheduled_mw, capacity_mw, market_price=3.0, partial_threshold=15.0, full_threshold=20.0,
+                        partial_factor=0.5, full_factor=1.0, with_bands: bool = True) -> dict:
+    """
+    Array version of calculate_dsm for many sites x days x 96 blocks in one pass.
+    Inputs broadcast against each other (e.g. capacity as (sites, 1, 1), price as (days, 96)), and so do the
+    band thresholds (% deviation) and penalty factors, which default to the CERC bands calculate_dsm uses.
+    Returns the same keys as calculate_dsm, each an array of the broadcast shape (deviation_percent and
+    dsm_receivable don't involve the bands, so they keep the shape of the MW/capacity/price inputs);
+    penalty_band holds the band names (skipped when with_bands=False), penalty_code their index into PENALTY_BANDS.
+    """
+    actual, scheduled, capacity, price = np.broadcast_arrays(
+        np.asarray(actual_mw, dtype=np.float64),
+        np.asarray(scheduled_mw, dtype=np.float64),
+        np.asarray(capacity_mw, dtype=np.float64),
+        np.asarray(market_price, dtype=np.float64),
+    )
+    has_schedule = scheduled != 0
+    safe_scheduled = np.where(has_schedule, scheduled, 1.0)
+
+    deviation_mw = actual - scheduled
+    deviation_percent = np.where(has_schedule, (deviation_mw / safe_scheduled) * 100, 0.0)
+    abs_dev = np.abs(deviation_percent)
+
+    penalty_code = np.where(abs_dev <= partial_threshold, 0, np.where(abs_dev <= full_threshold, 1, 2)).astype(np.int8)
+    penalty_factor = np.where(penalty_code == 0, 0.0, np.where(penalty_code == 1, partial_factor, full_factor))
+
+    base_amount = np.abs(deviation_mw) * price * capacity
+    over = (deviation_mw > 0) & has_schedule
+    under = (deviation_mw <= 0) & has_schedule
+    dsm_payable = np.where(over, base_amount * penalty_factor, 0.0)
+    dsm_receivable = np.where(under, base_amount * 1.0, 0.0)
+
+    result = {
+        "deviation_percent": _round2(deviation_percent),
+        "penalty_code": penalty_code,
+        "dsm_payable": _round2(dsm_payable),
+        "dsm_receivable": _round2(dsm_receivable),
+    }
+    if with_bands:
+        result["penalty_band"] = PENALTY_BANDS[penalty_code]
+    return result
@@ -0,0 +1,183 @@
+import io
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Callable, Iterator
+
+CHUNK_ROWS = 10000
+BLOCKS_PER_DAY = 96
+STREAM_EXTENSIONS = ('.csv', '.xlsx', '.xls', '.json', '.jsonl', '.ndjson')
+
+
+def iter_upload_frames(fileobj, filename: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield an uploaded file as DataFrames of at most chunk_rows rows.
+    CSV, XLSX and JSON Lines are read incrementally; .xls and plain JSON arrays
+    cannot be streamed and are loaded whole, then sliced.
+    """
+    name = filename.lower()
+    if name.endswith('.csv'):
+        yield from pd.read_csv(io.TextIOWrapper(fileobj, encoding='utf-8'), chunksize=chunk_rows)
+    elif name.endswith('.xlsx'):
+        yield from _iter_xlsx(fileobj, chunk_rows)
+    elif name.endswith(('.jsonl', '.ndjson')) or (name.endswith('.json') and _peek_first_char(fileobj) != '['):
+        yield from pd.read_json(io.TextIOWrapper(fileobj, encoding='utf-8'), lines=True, chunksize=chunk_rows)
+    else:
+        df = pd.read_excel(fileobj) if name.endswith('.xls') else pd.read_json(fileobj)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _peek_first_char(fileobj) -> str:
+    pos = fileobj.tell()
+    head = fileobj.read(64).lstrip()
+    fileobj.seek(pos)
+    return chr(head[0]) if head else ''
+
+
+def _iter_xlsx(fileobj, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else '' for c in next(rows, ())]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _row_reasons(df: pd.DataFrame, value_col: str, known_sites: set) -> tuple:
+    """Vectorized per-row validation; returns parsed columns plus a reason array ('' = valid)."""
+    site_id = pd.to_numeric(df['site_id'], errors='coerce')
+    day = pd.to_datetime(df['date'], errors='coerce')
+    block_no = pd.to_numeric(df['block_no'], errors='coerce')
+    value = pd.to_numeric(df[value_col], errors='coerce')
+
+    bad_site = site_id.isna() | ~site_id.isin(known_sites)
+    bad_date = day.isna()
+    bad_block = block_no.isna() | (block_no % 1 != 0) | ~block_no.between(1, BLOCKS_PER_DAY)
+    bad_value = value.isna() | ~np.isfinite(value) | (value < 0)
+    reasons = np.select(
+        [bad_site.to_numpy(), bad_date.to_numpy(), bad_block.to_numpy(), bad_value.to_numpy()],
+        ['unknown site_id', 'invalid date', 'block_no must be 1-96', f'invalid {value_col}'],
+        default='',
+    )
+    return site_id, day, block_no, value, reasons
+
+
+def ingest_block_frames(
+    frames: Iterator[pd.DataFrame],
+    value_col: str,
+    known_sites: set,
+    write_group: Callable[[int, date, dict], None],
+) -> dict:
+    """
+    Group streamed rows by (site_id, date) and hand each complete, clean 96-block day to write_group.
+    Only days still being assembled are kept in memory, so memory depends on how many
+    site-days are interleaved in the file, not on its length. A day with a repeated block_no is rejected;
+    rows for a day that arrive after it was written are ignored and reported in its warnings. A day whose
+    write_group raises is rejected with the error and the file carries on. If the file itself fails to read
+    (bad columns, a malformed chunk), the error is raised when nothing has been written yet; otherwise the
+    report so far is returned with an 'error' entry, so callers always learn which days landed.
+    Returns a per-group accepted/rejected report.
+    """
+    required_cols = ['site_id', 'date', 'block_no', value_col]
+    open_groups = {}  # (site_id, date) -> {block_no: value}
+    errors = {}  # (site_id, date) -> {reason: count}
+    results = {}  # (site_id, date) -> report entry once decided
+    total_rows = 0
+    unattributed = {}
+
+    def reject(key, reason):
+        open_groups.pop(key, None)
+        results[key] = {'site_id': key[0], 'date': key[1], 'status': 'rejected', 'reason': reason}
+
+    def count_errors(key, counts):
+        group_errors = errors.setdefault(key, {})
+        for reason, count in counts.items():
+            group_errors[reason] = group_errors.get(reason, 0) + int(count)
+
+    def checked(frames):
+        for df in frames:
+            missing = [col for col in required_cols if col not in df.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+            yield df
+
+    stopped = None
+    try:
+        for df in checked(frames):
+            total_rows += len(df)
+            site_id, day, block_no, value, reasons = _row_reasons(df, value_col, known_sites)
+
+            attributable = (reasons != 'unknown site_id') & (reasons != 'invalid date')
+            for reason, count in pd.Series(reasons[~attributable]).value_counts().items():
+                unattributed[reason] = unattributed.get(reason, 0) + int(count)
+
+            parsed = pd.DataFrame({
+                'site_id': site_id.to_numpy(),
+                'date': day.dt.date.to_numpy(),
+                'block_no': block_no.to_numpy(),
+                'value': value.to_numpy(),
+                'reason': reasons,
+            })[attributable]
+
+            touched = set()
+            for (sid, d), group in parsed.groupby(['site_id', 'date'], sort=False):
+                key = (int(sid), d)
+                touched.add(key)
+                bad = group['reason'] != ''
+                if bad.any():
+                    count_errors(key, group.loc[bad, 'reason'].value_counts())
+                clean = group[~bad]
+                if key in results:  # Already written or rejected; late rows are reported, never applied
+                    if len(clean):
+                        count_errors(key, {'rows after the day was written (ignored)': len(clean)})
+                    continue
+                blocks = open_groups.setdefault(key, {})
+                block_nos = clean['block_no'].astype(int)
+                duplicates = block_nos.duplicated(keep='first') | block_nos.isin(blocks)
+                if duplicates.any():  # A second value for a block: ambiguous, so the day is rejected
+                    count_errors(key, {'duplicate block_no': duplicates.sum()})
+                blocks.update(zip(block_nos.tolist(), clean['value'].astype(float).tolist()))
+
+            for key in touched:
+                if key in results:
+                    continue
+                if key in errors:
+                    reject(key, '; '.join(f'{reason} ({count} rows)' for reason, count in errors[key].items()))
+                elif len(open_groups[key]) == BLOCKS_PER_DAY:
+                    try:
+                        write_group(key[0], key[1], open_groups.pop(key))
+                    except Exception as e:  # This day only; the rest of the file carries on
+                        reject(key, f'write failed: {e}')
+                    else:
+                        results[key] = {'site_id': key[0], 'date': key[1], 'status': 'accepted', 'blocks': BLOCKS_PER_DAY}
+    except Exception as e:
+        if not results:
+            raise  # Nothing written or decided yet: the caller fails the whole upload
+        stopped = str(e)
+
+    for key in list(open_groups):
+        reject(key, f'incomplete: {len(open_groups[key])} of {BLOCKS_PER_DAY} blocks' + (' (upload stopped)' if stopped else ''))
+
+    groups = list(results.values())
+    for entry in groups:
+        late_errors = errors.get((entry['site_id'], entry['date']))
+        if entry['status'] == 'accepted' and late_errors:
+            entry['warnings'] = late_errors
+    return {
+        'rows': total_rows,
+        'accepted': sum(1 for g in groups if g['status'] == 'accepted'),
+        'rejected': sum(1 for g in groups if g['status'] == 'rejected'),
+        'unattributed_rows': unattributed,
+        'groups': groups,
+        **({'error': f'Upload stopped: {stopped}'} if stopped else {}),
+    }
@@ -0,0 +1,104 @@
+"""
+Intent parsing for /ai/query: recognizes site / date / metric lookups ("Show DSM for REWA on 2025-10-07")
+that can be answered straight from the database. Anything it cannot pin down to one site (and one date,
+where the metric needs it), or that asks for reasoning, is left to the language model.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+# Metric keywords, checked in order; the first hit wins
+METRICS = (
+    ("capacity", ("capacity", "rated")),
+    ("payable", ("payable", "penalty", "penalties", "charge", "charges")),
+    ("receivable", ("receivable", "credit", "credits")),
+    ("net", ("net",)),
+    ("price", ("price", "prices", "rate", "tariff")),
+    ("dsm", ("dsm", "deviation", "settlement", "summary")),
+)
+DATE_METRICS = {"payable", "receivable", "net", "price", "dsm"}  # Need a date; capacity does not
+# Questions asking for judgement, forecasts or comparisons always go to the model
+REASONING_WORDS = ("why", "predict", "forecast", "tomorrow", "next", "explain", "compare", "trend", "should", "suggest", "reduce", "improve", "what if")
+GENERIC_NAME_WORDS = {"solar", "wind", "hybrid", "park", "plant", "project", "site", "power", "energy"}
+MONTHS = {name: n for n, name in enumerate(("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DMY_DATE = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b")
+_NAMED_DATE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)? (jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*,? (\d{4})\b")
+_SITE_ID = re.compile(r"\bsite(?: id)? ?#?(\d+)\b")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation: the response cache's key text."""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?.! ")
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"(?<![\w-]){re.escape(phrase)}(?![\w-])", text) is not None
+
+
+def _dates(text: str, today: date) -> set:
+    found = set()
+    for pattern, order in ((_ISO_DATE, "ymd"), (_DMY_DATE, "dmy"), (_NAMED_DATE, "dMy")):
+        for match in pattern.finditer(text):
+            parts = dict(zip(order, match.groups()))
+            month = MONTHS[parts["M"]] if "M" in parts else int(parts["m"])
+            try:
+                found.add(date(int(parts["y"]), month, int(parts["d"])))
+            except ValueError:
+                continue
+    if _contains(text, "today"):
+        found.add(today)
+    if _contains(text, "yesterday"):
+        found.add(today - timedelta(days=1))
+    return found
+
+
+def site_aliases(site_names: dict) -> dict:
+    """
+    Lowercased name -> site_id, plus the name without generic words ("REWA Solar" -> "rewa").
+    Aliases shared by several sites are dropped rather than guessed.
+    """
+    aliases, ambiguous = {}, set()
+    for site_id, name in site_names.items():
+        full = normalize_query(name)
+        short = " ".join(word for word in full.split() if word not in GENERIC_NAME_WORDS)
+        for alias in {full, short} - {""}:
+            if aliases.get(alias, site_id) != site_id:
+                ambiguous.add(alias)
+            aliases[alias] = site_id
+    return {alias: site_id for alias, site_id in aliases.items() if alias not in ambiguous}
+
+
+def _sites(text: str, aliases: dict, site_ids: set) -> set:
+    found = {int(match) for match in _SITE_ID.findall(text) if int(match) in site_ids}
+    found |= {site_id for alias, site_id in aliases.items() if _contains(text, alias)}
+    return found
+
+
+def parse_intent(query: str, site_names: dict, today: Optional[date] = None) -> dict:
+    """
+    {"site_id", "date", "site_ids", "dates", "metric", "answerable"} for a query against site_names
+    (site_id -> name). site_ids/dates list everything mentioned; site_id/date are set only when exactly
+    one of each is. answerable means the lookup path can answer the query without the model.
+    """
+    text = normalize_query(query)
+    today = today or datetime.now().date()
+    sites = _sites(text, site_aliases(site_names), set(site_names))
+    dates = _dates(text, today)
+    metric = next((name for name, words in METRICS if any(_contains(text, word) for word in words)), None)
+    intent = {
+        "site_id": next(iter(sites)) if len(sites) == 1 else None,
+        "date": next(iter(dates)) if len(dates) == 1 else None,
+        "site_ids": sorted(sites),
+        "dates": sorted(dates),
+        "metric": metric,
+    }
+    needs_date = metric in DATE_METRICS
+    intent["answerable"] = (
+        metric is not None
+        and intent["site_id"] is not None
+        and (intent["date"] is not None or not needs_date)
+        and not any(_contains(text, word) for word in REASONING_WORDS)
+    )
+    return intent
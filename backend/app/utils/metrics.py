@@ -0,0 +1,197 @@
+"""
+Request metrics in Prometheus text format: per-route latency histograms, status counts and in-flight
+gauges from an ASGI middleware, and SQL statement counts / DB time per request from SQLAlchemy cursor
+events (attributed through a context variable, which follows requests into threadpool and async-driver calls).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+UNMATCHED_ROUTE = "(unmatched)"
+BACKGROUND_ROUTE = "(background)"  # Statements outside any request: scheduler, audit flusher, render workers
+
+
+class RequestStats:
+    """DB work attributed to one request."""
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_current_request: ContextVar = ContextVar("current_request_stats", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self, kind: str = "counter") -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind}"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_label_text(self.labels, values)}}} {total:g}" if values else f"{self.name} {total:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *label_values):
+        self.inc(*label_values, amount=-1.0)
+
+    def render(self) -> list[str]:
+        return super().render("gauge")
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)  # First bucket with bound >= value
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                labels = _label_text(self.labels, values)
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:g}")
+                lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route template.", ("method", "route"), LATENCY_BUCKETS)
+REQUESTS = Counter("http_requests_total", "Requests by route template and status code.", ("method", "route", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served.", ("method",))
+REQUEST_STATEMENTS = Histogram("http_request_db_statements", "SQL statements issued per request.", ("method", "route"), STATEMENT_BUCKETS)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed, by route template.", ("route",))
+DB_SECONDS = Counter("db_statement_seconds_total", "Time spent executing SQL, by route template.", ("route",))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    stats = _current_request.get()
+    if stats is None:
+        DB_STATEMENTS.inc(BACKGROUND_ROUTE)
+        DB_SECONDS.inc(BACKGROUND_ROUTE, amount=elapsed)
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+
+
+def _route_template(scope: dict) -> str:
+    """Path template of the matched route ('/schedule/{site_id}/{target_date}'), keeping label cardinality bounded."""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    routes = getattr(app, "_metrics_route_paths", None)
+    if routes is None:
+        routes = {getattr(route, "endpoint", None): route.path for route in app.router.routes}
+        app._metrics_route_paths = routes
+    return routes.get(endpoint, UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (keeps streaming responses streaming). Adds a Server-Timing header with the time
+    to response start and the request's DB time and statement count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = f'app;dur={(time.perf_counter() - started) * 1000:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} statements"'
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            await send(message)
+
+        IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            IN_FLIGHT.dec(method)
+            _current_request.reset(token)
+            route = _route_template(scope)
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method, route)
+            REQUESTS.inc(method, route, status)
+            REQUEST_STATEMENTS.observe(stats.statements, method, route)
+            DB_STATEMENTS.inc(route, amount=stats.statements)
+            DB_SECONDS.inc(route, amount=stats.db_seconds)
+
+
+def _pool_lines(pools: dict) -> list[str]:
+    """pool_stats() as gauges/counters labelled by engine."""
+    metrics = {
+        "checked_out": ("db_pool_checked_out", "gauge", "Connections currently checked out."),
+        "idle": ("db_pool_idle", "gauge", "Idle connections in the pool."),
+        "checkouts": ("db_pool_checkouts_total", "counter", "Connection checkouts."),
+        "timeouts": ("db_pool_timeouts_total", "counter", "Checkouts that timed out waiting for a connection."),
+        "wait_seconds_total": ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection."),
+    }
+    lines = []
+    for key, (name, kind, help_text) in metrics.items():
+        samples = [f'{name}{{engine="{engine}"}} {stats[key]:g}' for engine, stats in pools.items() if key in stats]
+        if samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples]
+    return lines
+
+
+def render_metrics(pools: dict = None) -> str:
+    """Prometheus text exposition of every metric, plus connection pool stats (database.pool_stats()) when given."""
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUESTS, IN_FLIGHT, REQUEST_STATEMENTS, DB_STATEMENTS, DB_SECONDS):
+        lines += metric.render()
+    lines += _pool_lines(pools or {})
+    return "\n".join(lines) + "\n"
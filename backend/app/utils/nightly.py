@@ -0,0 +1,144 @@
+"""
+Nightly pipeline: market prices and weather, settlement of the last NIGHTLY_LOOKBACK_DAYS days, rollups
+and the fleet daily report. Sites are split into chunks of NIGHTLY_CHUNK_SITES and run on a process pool;
+each chunk fetches, settles and commits on its own and then checkpoints its site-days, so a crashed run
+resumes at the first unfinished chunk. Every step is safe to repeat: prices and weather are upserts
+(weather skips populated site-days), settlement replaces its range and reports are content-addressed.
+"""
+import asyncio
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from multiprocessing import get_context
+from fastapi import HTTPException
+from ..database import SessionLocal, AsyncSessionLocal, AsyncReadSessionLocal, dispose_async_engines
+from ..crud import get_site_ids, get_checkpointed_sites, save_checkpoints, count_settled_blocks, count_complete_dam_blocks, settle_site_days
+from ..integration.iex import fetch_dam_prices
+from ..integration.weather import refresh_fleet_weather
+from .report_render import wait_for_job
+
+NIGHTLY_WORKERS = int(os.getenv("NIGHTLY_WORKERS", "4"))  # 1 runs chunks in-process (e.g., SQLite)
+NIGHTLY_CHUNK_SITES = int(os.getenv("NIGHTLY_CHUNK_SITES", "50"))  # Sites per unit of work and checkpoint
+NIGHTLY_LOOKBACK_DAYS = int(os.getenv("NIGHTLY_LOOKBACK_DAYS", "3"))  # Days re-checked per run; checkpointed site-days are skipped
+NIGHTLY_RENDER_TIMEOUT = 600  # Seconds to wait for the report's PDF/XLSX before moving on
+
+
+def settle_chunk(day: date, site_ids: list[int], run_id: str, force: bool = False, checkpoint: bool = True, ahead: tuple = ()) -> dict:
+    """
+    Worker entry point for one chunk of sites on one day: weather for the day (and the `ahead` days),
+    settlement with rollups, then checkpoints. Site-days with nothing settled or whose weather failed are
+    not checkpointed and are retried by the next run; checkpoint=False (prices incomplete) records none.
+    """
+    db = SessionLocal()
+    try:
+        done = set() if force else get_checkpointed_sites(db, site_ids, day)
+        pending = [site_id for site_id in site_ids if site_id not in done]
+        summary = {"sites": len(site_ids), "skipped": len(done), "settled": 0, "checkpointed": 0, "failed_sites": []}
+        if not pending:
+            return summary
+
+        async def fetch_weather():
+            results = [await refresh_fleet_weather(db, day, pending)]
+            for ahead_day in ahead:
+                results.append(await refresh_fleet_weather(db, ahead_day, pending))
+            return results
+        weather = asyncio.run(fetch_weather())
+        failed = set(weather[0]["failed_sites"])
+
+        settle_site_days(db, pending, day, day)
+        blocks = count_settled_blocks(db, pending, day)
+        finished = {site_id: n for site_id, n in blocks.items() if site_id not in failed} if checkpoint else {}
+        if finished:
+            save_checkpoints(db, day, run_id, finished)
+        summary.update(settled=len(blocks), checkpointed=len(finished), failed_sites=sorted(failed))
+        return summary
+    finally:
+        db.close()
+
+
+def _outcome(call):
+    """A chunk's summary, or the exception it raised (a crashed worker included); its site-days stay unchecked."""
+    try:
+        return call()
+    except Exception as e:
+        return e
+
+
+def _chunks(site_ids: list[int], size: int) -> list[list[int]]:
+    return [site_ids[i:i + size] for i in range(0, len(site_ids), size)]
+
+
+async def _fetch_prices(days: list[date]) -> list[date]:
+    """Fetch DAM prices for days not yet complete in the DB; returns the days that are complete afterwards."""
+    db = SessionLocal()
+    try:
+        for day in days:
+            if count_complete_dam_blocks(db, day) < 96:
+                await fetch_dam_prices(day, db)  # One at a time: the stores share this session
+        return [day for day in days if count_complete_dam_blocks(db, day) >= 96]
+    finally:
+        db.close()
+
+
+async def _daily_report(day: date):
+    """Fleet daily report through the reports endpoint (reused when its settlements are unchanged); None without data."""
+    from ..api.reports import get_daily_report  # The API package imports the whole app; only needed here
+    try:
+        async with AsyncSessionLocal() as db, AsyncReadSessionLocal() as read_db:
+            return await get_daily_report(day, None, db, read_db)
+    except HTTPException:
+        return None
+    finally:
+        await dispose_async_engines()  # Pooled async connections belong to this asyncio.run loop
+
+
+def run_nightly(run_date: date = None, lookback: int = NIGHTLY_LOOKBACK_DAYS, force: bool = False, workers: int = NIGHTLY_WORKERS) -> dict:
+    """
+    Settle run_date - lookback .. run_date - 1 and prefetch prices and weather for run_date and run_date + 1.
+    Days run oldest first, one at a time (their month rollups overlap); a day's chunks run in parallel.
+    force=True re-settles checkpointed site-days too.
+    """
+    run_date = run_date or date.today()
+    run_id = uuid.uuid4().hex
+    days = [run_date - timedelta(days=n) for n in range(lookback, 0, -1)]
+    ahead = (run_date, run_date + timedelta(days=1))
+    priced = set(asyncio.run(_fetch_prices(days + list(ahead))))
+
+    db = SessionLocal()
+    try:
+        site_ids = sorted(get_site_ids(db))
+    finally:
+        db.close()
+    chunks = _chunks(site_ids, NIGHTLY_CHUNK_SITES)
+
+    result = {"run_id": run_id, "sites": len(site_ids), "chunks": len(chunks), "days": []}
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) if workers > 1 and len(chunks) > 1 else None
+    try:
+        for day in days:
+            args = [(day, chunk, run_id, force, day in priced, ahead if day == days[-1] else ()) for chunk in chunks]
+            totals = {"date": str(day), "prices_complete": day in priced, "skipped": 0, "settled": 0, "checkpointed": 0, "failed_sites": [], "failed_chunks": 0}
+            if executor is None:
+                outcomes = [_outcome(lambda chunk_args=chunk_args: settle_chunk(*chunk_args)) for chunk_args in args]
+            else:
+                futures = [executor.submit(settle_chunk, *chunk_args) for chunk_args in args]
+                outcomes = [_outcome(future.result) for future in as_completed(futures)]
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    print(f"Nightly chunk failed for {day}: {outcome!r}")
+                    totals["failed_chunks"] += 1
+                    continue
+                for key in ("skipped", "settled", "checkpointed"):
+                    totals[key] += outcome[key]
+                totals["failed_sites"].extend(outcome["failed_sites"])
+
+            report = asyncio.run(_daily_report(day))
+            if report is not None:
+                totals["report_id"] = report["report_id"]
+                if report["job_id"]:
+                    totals["render"] = (wait_for_job(report["job_id"], NIGHTLY_RENDER_TIMEOUT) or {}).get("status")
+            result["days"].append(totals)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return result
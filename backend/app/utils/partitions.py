@@ -0,0 +1,87 @@
+"""
+Monthly range partitions for the block tables on Postgres (set up by migration 0003_partition_block_tables).
+Partitions are named <table>_YYYY_MM; a <table>_default partition catches dates outside the created range.
+Everything here is a no-op on SQLite or on tables that are not partitioned.
+"""
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from ..database import engine
+import os
+
+PARTITIONED_TABLES = ("schedules", "generations", "dsm_settlements")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))  # Future months kept ready
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))  # 0 keeps all history
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def add_months(month: date, months: int) -> date:
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}).first() is not None
+
+def list_partitions(conn: Connection, table: str) -> list[str]:
+    rows = conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"),
+        {"table": table},
+    )
+    return [row[0] for row in rows]
+
+def ensure_month_partitions(conn: Connection, table: str, first: date, last: date) -> list[str]:
+    """
+    Create the missing monthly partitions covering first..last; returns the names created.
+    Run ahead of the data: a month whose rows already sit in the default partition cannot be attached.
+    """
+    existing = set(list_partitions(conn, table))
+    created = []
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+def drop_partitions_before(conn: Connection, table: str, before: date) -> list[str]:
+    """
+    Detach and drop whole months older than `before` (metadata-only, no row deletes); returns the names dropped.
+    Rollups in dsm_site_days / dsm_site_months are separate tables and keep the history.
+    """
+    prefix = f"{table}_"
+    dropped = []
+    for name in list_partitions(conn, table):
+        suffix = name[len(prefix):]
+        try:
+            month = date(int(suffix[:4]), int(suffix[5:7]), 1)
+        except ValueError:
+            continue  # The default partition
+        if month < month_start(before):
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+def maintain_partitions(bind=engine, today: date = None) -> dict:
+    """
+    Keep PARTITION_MONTHS_AHEAD months of partitions ready and, when PARTITION_RETENTION_MONTHS is set,
+    drop months past retention. Meant for a daily scheduler job.
+    """
+    this_month = month_start(today or date.today())
+    result = {}
+    with bind.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            created = ensure_month_partitions(conn, table, this_month, add_months(this_month, PARTITION_MONTHS_AHEAD))
+            dropped = drop_partitions_before(conn, table, add_months(this_month, -PARTITION_RETENTION_MONTHS)) if PARTITION_RETENTION_MONTHS else []
+            result[table] = {"created": created, "dropped": dropped}
+    return result
@@ -0,0 +1,27 @@
+"""Report and revenue periods: '2025-10-07' (day), '2025-W41' (ISO week), '2025-10' (month) or '2025' (year)."""
+import calendar
+from datetime import date, timedelta
+from fastapi import HTTPException
+
+
+def period_range(period: str) -> tuple[date, date]:
+    """
+    Inclusive date range for a day, ISO week, month or year period string; 400 if it doesn't parse.
+    """
+    try:
+        if "-W" in period:
+            year, week = period.split("-W")
+            start = date.fromisocalendar(int(year), int(week), 1)
+            return start, start + timedelta(days=6)
+        parts = [int(p) for p in period.split("-")]
+        if len(parts) == 3:
+            day = date(*parts)
+            return day, day
+        if len(parts) == 2:
+            year, mon = parts
+            return date(year, mon, 1), date(year, mon, calendar.monthrange(year, mon)[1])
+        if len(parts) == 1:
+            return date(parts[0], 1, 1), date(parts[0], 12, 31)
+    except ValueError:
+        pass
+    raise HTTPException(400, f"Invalid period '{period}'")
@@ -0,0 +1,135 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context
+import pandas as pd
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", "report_artifacts")
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+MAX_TRACKED_JOBS = 1000  # Finished jobs beyond this are forgotten (artifacts stay on disk)
+EXPORT_FORMATS = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+# job_id -> {"report_id": int, "future": Future}. Per process: with several API workers (or the nightly run
+# alongside the API) a job is only tracked by the worker that queued it, and two workers may render the same
+# report at once (safe: each writes its own temp files). Job ids carry the report id so other workers can
+# still answer "done" from the artifacts on disk.
+_jobs = {}
+
+
+def artifact_path(report_id: int, fmt: str) -> str:
+    return os.path.join(REPORTS_DIR, f"{report_id}.{fmt}")
+
+
+def _write_atomic(path: str, write):
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{uuid.uuid4().hex}.partial{ext}"  # Unique per render; keep the extension, openpyxl picks its writer from it
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)  # Downloads never see half-written files
+    finally:
+        if os.path.exists(tmp_path):  # Failed render: don't leave the temp file behind
+            os.remove(tmp_path)
+
+
+def render_pdf(path: str, title: str, lines: list[str]):
+    p = canvas.Canvas(path, pagesize=letter)
+    p.drawString(100, 750, title)
+    y = 700
+    for line in lines:
+        if y < 50:  # New page instead of drawing off the bottom
+            p.showPage()
+            y = 750
+        p.drawString(100, y, line)
+        y -= 20
+    p.save()
+
+
+def render_excel(path: str, rows: list[dict]):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame(rows).to_excel(writer, index=False)
+
+
+def render_report_files(report_id: int, title: str, lines: list[str], rows: list[dict]) -> dict:
+    """Worker entry point: render PDF and XLSX for a report to REPORTS_DIR. Returns paths by format."""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    paths = {fmt: artifact_path(report_id, fmt) for fmt in EXPORT_FORMATS}
+    _write_atomic(paths["pdf"], lambda tmp: render_pdf(tmp, title, lines))
+    _write_atomic(paths["xlsx"], lambda tmp: render_excel(tmp, rows))
+    return paths
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=get_context("spawn"))
+        return _executor
+
+
+def submit_render(report_id: int, title: str, lines: list[str], rows: list[dict]) -> str:
+    """Queue rendering on the process pool; returns a job id for get_job_status."""
+    job_id = f"{report_id}-{uuid.uuid4().hex}"
+    for old_id in [j for j, job in _jobs.items() if job["future"].done()][:max(0, len(_jobs) - MAX_TRACKED_JOBS + 1)]:
+        del _jobs[old_id]
+    _jobs[job_id] = {"report_id": report_id, "future": _get_executor().submit(render_report_files, report_id, title, lines, rows)}
+    return job_id
+
+
+def find_pending_job(report_id: int):
+    """Id of a queued/running render for report_id, so repeated requests don't render twice."""
+    for job_id, job in _jobs.items():
+        if job["report_id"] == report_id and not job["future"].done():
+            return job_id
+    return None
+
+
+def artifacts_ready(report_id: int) -> bool:
+    return all(os.path.exists(artifact_path(report_id, fmt)) for fmt in EXPORT_FORMATS)
+
+
+def get_job_status(job_id: str):
+    """
+    {"job_id", "report_id", "status": queued|running|done|failed[, "error"]}. A job queued by another
+    process is "done" once its artifacts exist; otherwise unknown jobs give None.
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        report_id = job_id.split("-", 1)[0]
+        if report_id.isdigit() and artifacts_ready(int(report_id)):
+            return {"job_id": job_id, "report_id": int(report_id), "status": "done"}
+        return None
+    future = job["future"]
+    status = {"job_id": job_id, "report_id": job["report_id"]}
+    if future.running():
+        status["status"] = "running"
+    elif not future.done():
+        status["status"] = "queued"
+    elif future.exception() is not None:
+        status.update(status="failed", error=str(future.exception()))
+    else:
+        status["status"] = "done"
+    return status
+
+
+def wait_for_job(job_id: str, timeout: float = None):
+    """Block until a render finishes (or timeout); returns get_job_status. For batch callers, not request handlers."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        wait([job["future"]], timeout=timeout)
+    return get_job_status(job_id)
+
+
+def shutdown_render_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,81 @@
+"""
+What-if revenue scenarios: block data is loaded once (crud.load_scenario_inputs) and every parameter set
+is evaluated together as a (scenarios, blocks) array through calculate_dsm_batch.
+"""
+import os
+import numpy as np
+from ..crud import BLOCK_HOURS
+from .dsm_calc import calculate_dsm_batch
+
+SCENARIO_MAX_CELLS = int(os.getenv("SCENARIO_MAX_CELLS", "5000000"))  # scenarios x blocks per pass; bounds peak memory
+PRICE_SERIES = ("dam", "rtm")
+BASELINE = {
+    "name": "baseline",
+    "price": "dam",
+    "partial_threshold": 15.0,
+    "full_threshold": 20.0,
+    "partial_factor": 0.5,
+    "full_factor": 1.0,
+    "capacity_scale": 1.0,
+    "schedule_accuracy": 0.0,
+}
+
+
+def _column(batch: list[dict], key: str) -> np.ndarray:
+    return np.array([scenario[key] for scenario in batch], dtype=np.float64)[:, None]
+
+
+def _evaluate(inputs: dict, batch: list[dict]) -> list[dict]:
+    scale = _column(batch, "capacity_scale")
+    accuracy = _column(batch, "schedule_accuracy")
+    # capacity_scale scales the MW profile only: the DSM amount also multiplies by capacity, so scaling both
+    # would grow DSM by scale squared (20% more capacity -> 44% more DSM) instead of in line with output.
+    actual = inputs["actual"][None, :] * scale
+    # Schedule accuracy closes that fraction of each block's gap between schedule and actual
+    scheduled = (inputs["scheduled"][None, :] + accuracy * (inputs["actual"] - inputs["scheduled"])[None, :]) * scale
+    price = np.stack([inputs[scenario["price"]] for scenario in batch])
+    result = calculate_dsm_batch(
+        actual, scheduled, inputs["capacity"][None, :], price,
+        partial_threshold=_column(batch, "partial_threshold"),
+        full_threshold=_column(batch, "full_threshold"),
+        partial_factor=_column(batch, "partial_factor"),
+        full_factor=_column(batch, "full_factor"),
+        with_bands=False,
+    )
+    energy_revenue = (actual * price).sum(axis=1) * BLOCK_HOURS * 1000  # MWh -> kWh at INR/kWh, as in the rollups
+    payable = result["dsm_payable"].sum(axis=1)
+    receivable = result["dsm_receivable"].sum(axis=1)
+    codes = result["penalty_code"]
+    rows = []
+    for i, scenario in enumerate(batch):
+        dsm_loss = float(payable[i] - receivable[i])
+        rows.append({
+            **scenario,
+            "energy_revenue": float(energy_revenue[i]),
+            "dsm_payable": float(payable[i]),
+            "dsm_receivable": float(receivable[i]),
+            "dsm_loss": dsm_loss,
+            "net_revenue": float(energy_revenue[i]) - dsm_loss,
+            "blocks_none": int((codes[i] == 0).sum()),
+            "blocks_partial": int((codes[i] == 1).sum()),
+            "blocks_full": int((codes[i] == 2).sum()),
+        })
+    return rows
+
+
+def run_scenarios(inputs: dict, scenarios: list[dict]) -> list[dict]:
+    """
+    One comparison row per scenario, baseline (current CERC bands, DAM prices) first, with net-revenue deltas
+    against it. Scenario keys not given take the baseline value. Scenarios are evaluated in as few passes
+    as SCENARIO_MAX_CELLS allows.
+    """
+    params = [BASELINE] + [{**BASELINE, **scenario} for scenario in scenarios]
+    blocks = len(inputs["actual"])
+    per_pass = max(1, SCENARIO_MAX_CELLS // max(blocks, 1))
+    rows = []
+    for i in range(0, len(params), per_pass):
+        rows.extend(_evaluate(inputs, params[i:i + per_pass]))
+    baseline_net = rows[0]["net_revenue"]
+    for row in rows:
+        row["net_vs_baseline"] = row["net_revenue"] - baseline_net
+    return rows
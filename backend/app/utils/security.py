@@ -0,0 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+import asyncio
+import os
+
+# bcrypt is deliberately slow; a small dedicated pool keeps login bursts from starving
+# the shared threadpool that sync routes and DB calls run on.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, get_password_hash, password)
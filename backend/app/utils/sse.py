@@ -0,0 +1,25 @@
+"""
+Server-sent events: `event:`/`data:` framing over a StreamingResponse. Streams are (event, data) pairs;
+data is JSON-encoded so multi-line text stays on one `data:` line.
+"""
+import json
+from starlette.responses import StreamingResponse
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Keep reverse proxies from buffering the stream
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    """text/event-stream response from a sync (run in the threadpool) or async iterator of (event, data)."""
+    if hasattr(events, "__aiter__"):
+        async def body():
+            async for event, data in events:
+                yield sse_event(event, data)
+    else:
+        def body():
+            for event, data in events:
+                yield sse_event(event, data)
+    return StreamingResponse(body(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,141 @@
+"""
+Live SCADA telemetry: sub-block samples are averaged in memory into their 15-minute block, and closed
+blocks are written in batches (crud.store_telemetry_blocks: upsert generations, settle just those blocks).
+A block closes when its site sends a sample for a later block, or TELEMETRY_CLOSE_GRACE seconds after it
+ends. Samples for blocks already closed are counted as late and dropped. State is per process, so a site's
+stream must stay on one worker; blocks still open at shutdown are written as they stand.
+"""
+import atexit
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from ..database import SessionLocal
+from ..crud import store_telemetry_blocks
+
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "5"))  # Seconds between writes of closed blocks
+TELEMETRY_CLOSE_GRACE = float(os.getenv("TELEMETRY_CLOSE_GRACE", "60"))  # Seconds after a block ends before it closes on its own
+TELEMETRY_MAX_PENDING = 100_000  # Closed blocks kept for retry while the DB is down; oldest dropped beyond this
+GRID_TZ = timezone(timedelta(hours=5, minutes=30))  # Blocks follow IST; naive timestamps are taken as IST
+BLOCK_MINUTES = 15
+
+
+def parse_timestamp(value) -> datetime:
+    """Epoch seconds or ISO 8601 -> naive IST datetime."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, GRID_TZ).replace(tzinfo=None)
+    ts = datetime.fromisoformat(value)
+    return ts.astimezone(GRID_TZ).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def block_of(ts: datetime) -> tuple[date, int]:
+    return ts.date(), (ts.hour * 60 + ts.minute) // BLOCK_MINUTES + 1
+
+
+def block_end(day: date, block_no: int) -> datetime:
+    return datetime.combine(day, datetime.min.time()) + timedelta(minutes=block_no * BLOCK_MINUTES)
+
+
+class BlockAccumulator:
+    """
+    Running per-block averages for the fleet. add_samples() only touches memory; a background thread
+    flushes closed blocks every flush_interval seconds with its own session.
+    """
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = TELEMETRY_FLUSH_INTERVAL, close_grace: float = TELEMETRY_CLOSE_GRACE):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.close_grace = close_grace
+        self._open = {}  # site_id -> {(date, block_no): [sum_mw, samples]}
+        self._closed = {}  # (site_id, date) -> {block_no: mean_mw}, awaiting flush
+        self._watermark = {}  # site_id -> last closed (date, block_no)
+        self.stats = {"samples": 0, "late": 0, "blocks_closed": 0, "blocks_written": 0}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_samples(self, samples) -> dict:
+        """Accumulate (site_id, timestamp, mw) tuples; returns accepted/late counts for this call."""
+        accepted = late = 0
+        with self._lock:
+            for site_id, ts, mw in samples:
+                key = block_of(ts)
+                watermark = self._watermark.get(site_id)
+                if watermark is not None and key <= watermark:
+                    late += 1
+                    continue
+                blocks = self._open.setdefault(site_id, {})
+                if key not in blocks:
+                    for older in [k for k in blocks if k < key]:  # A later block has started: earlier ones are complete
+                        self._close(site_id, older)
+                    blocks[key] = [0.0, 0]
+                acc = blocks[key]
+                acc[0] += mw
+                acc[1] += 1
+                accepted += 1
+            self.stats["samples"] += accepted
+            self.stats["late"] += late
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+                self._thread.start()
+        return {"accepted": accepted, "late": late}
+
+    def _close(self, site_id: int, key: tuple):
+        """Move an open block to the flush batch (lock held)."""
+        total, count = self._open[site_id].pop(key)
+        day, block_no = key
+        self._closed.setdefault((site_id, day), {})[block_no] = total / count
+        self._watermark[site_id] = max(self._watermark.get(site_id, key), key)
+        self.stats["blocks_closed"] += 1
+
+    def close_expired(self, now: datetime = None, everything: bool = False):
+        """Close blocks that ended more than close_grace seconds ago (all open blocks when everything=True)."""
+        cutoff = (now or datetime.now(GRID_TZ).replace(tzinfo=None)) - timedelta(seconds=self.close_grace)
+        with self._lock:
+            for site_id, blocks in self._open.items():
+                for key in [k for k in blocks if everything or block_end(*k) <= cutoff]:
+                    self._close(site_id, key)
+
+    def open_blocks(self) -> int:
+        with self._lock:
+            return sum(len(blocks) for blocks in self._open.values())
+
+    def flush(self, everything: bool = False) -> int:
+        """Write closed blocks in one transaction; on failure they are kept for the next flush. Returns blocks written."""
+        self.close_expired(everything=everything)
+        with self._flush_lock:
+            with self._lock:
+                batch, self._closed = self._closed, {}
+            if not batch:
+                return 0
+            db = self.session_factory()
+            try:
+                written = store_telemetry_blocks(db, batch)["blocks"]
+                self.stats["blocks_written"] += written
+                return written
+            except Exception as e:
+                db.rollback()
+                print(f"Telemetry flush error: {e}")
+                with self._lock:  # Blocks closed meanwhile are newer; keep them over the retried batch
+                    for key, values in batch.items():
+                        self._closed[key] = {**values, **self._closed.get(key, {})}
+                    pending = sum(len(values) for values in self._closed.values())
+                    for key in sorted(self._closed, key=lambda k: k[1]):  # Oldest days first
+                        if pending <= TELEMETRY_MAX_PENDING:
+                            break
+                        pending -= len(self._closed.pop(key))
+                return 0
+            finally:
+                db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush(everything=True)
+
+
+telemetry = BlockAccumulator()
+atexit.register(telemetry.close)
@@ -0,0 +1,118 @@
+"""
+Hot paths of the DSM pipeline, each timed across the fleet sizes in FLEET_SIZES.
+"""
+import io
+import numpy as np
+import pytest
+from sqlalchemy import delete
+from app import crud
+from app.api.reports import get_daily_report, get_monthly_report
+from app.models import GenerationUpload, ScheduleUpload
+from app.schemas import Report
+from app.utils.dsm_calc import calculate_dsm, calculate_dsm_batch
+from app.utils.ingest import ingest_block_frames, iter_upload_frames
+from app.utils.scenarios import run_scenarios
+from .fleet import FLEET_SIZES, fleet_id, solar_profile
+
+SCENARIOS = [
+    {"name": f"bands-{partial}-{full}", "partial_threshold": partial, "full_threshold": full}
+    for partial, full in ((10, 15), (12, 18), (15, 25), (20, 25))
+] + [
+    {"name": "rtm", "price": "rtm"},
+    {"name": "capacity+20%", "capacity_scale": 1.2},
+    *({"name": f"accuracy-{a}", "schedule_accuracy": a} for a in (0.25, 0.5, 0.75)),
+]
+
+
+def _block_arrays(n_sites: int, days: int):
+    rng = np.random.default_rng(0)
+    scheduled = np.broadcast_to(100 * solar_profile(), (n_sites, days, 96)) + 1.0
+    actual = scheduled * (1 + rng.normal(0, 0.15, size=scheduled.shape))
+    return actual, scheduled
+
+
+def _clear_reports(fleet):
+    """Reports are content-addressed; drop them so every round builds its report (cold cache)."""
+    with fleet.Session() as db:
+        db.execute(delete(Report))
+        db.commit()
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES, ids=fleet_id)
+def bench_calculate_dsm(benchmark, size):
+    """Scalar calculate_dsm over every block, as the single-block path does."""
+    actual, scheduled = _block_arrays(*size)
+    pairs = list(zip(actual.ravel().tolist(), scheduled.ravel().tolist()))
+    benchmark(lambda: [calculate_dsm(a, s, 50.0, 4.0) for a, s in pairs])
+
+
+@pytest.mark.parametrize("size", FLEET_SIZES, ids=fleet_id)
+def bench_calculate_dsm_batch(benchmark, size):
+    actual, scheduled = _block_arrays(*size)
+    benchmark(calculate_dsm_batch, actual, scheduled, 50.0, 4.0)
+
+
+def bench_upload_schedule(benchmark, fleet, db):
+    """One site-day JSON upload (upsert + audit in one transaction) into a table of fleet size."""
+    upload = ScheduleUpload(site_id=fleet.site_ids[0], date=fleet.end, blocks=[{"block_no": b, "scheduled_mw": 40.0 + b % 7} for b in range(1, 97)])
+    benchmark(crud.upload_schedule, db, upload, None)
+
+
+def bench_upload_generation(benchmark, fleet, db):
+    upload = GenerationUpload(site_id=fleet.site_ids[0], date=fleet.end, blocks=[{"block_no": b, "scheduled_mw": 41.0 + b % 5} for b in range(1, 97)])
+    benchmark(crud.upload_generation, db, upload, None)
+
+
+def bench_bulk_schedule_ingest(benchmark, fleet, db):
+    """Streamed CSV upload of one day for every site (the /schedule/upload/bulk path)."""
+    lines = ["site_id,date,block_no,scheduled_mw"]
+    lines += [f"{site_id},{fleet.end},{b},{30.0 + b % 9}" for site_id in fleet.site_ids for b in range(1, 97)]
+    payload = "\n".join(lines).encode()
+    known = crud.get_site_ids(db)
+
+    def ingest():
+        frames = iter_upload_frames(io.BytesIO(payload), "day.csv")
+        return ingest_block_frames(frames, "scheduled_mw", known, lambda site_id, day, values: crud.store_schedule_day(db, site_id, day, values))
+    report = benchmark(ingest)
+    assert report["accepted"] == len(fleet.site_ids)
+
+
+def bench_settle_site_days(benchmark, fleet, db):
+    """Fleet settlement of the whole range: deviations, DSM, rollups (replaces the previous round's rows)."""
+    summary = benchmark(crud.settle_site_days, db, None, fleet.start, fleet.end)
+    assert summary["site_days"] == len(fleet.site_ids) * fleet.days
+    fleet.settled = True
+
+
+def bench_daily_report(benchmark, fleet, event_loop_runner):
+    fleet.ensure_settled()
+
+    async def build():
+        async with fleet.AsyncSession() as db:
+            return await get_daily_report(fleet.end, None, db, db)
+    # Reports get the same id each round, so only the first round queues a PDF/XLSX render
+    result = benchmark.pedantic(lambda: event_loop_runner(build()), setup=lambda: _clear_reports(fleet), rounds=10)
+    assert not result["cached"]
+
+
+def bench_monthly_report(benchmark, fleet, event_loop_runner):
+    fleet.ensure_settled()
+    month = fleet.start.strftime("%Y-%m")
+
+    async def build():
+        async with fleet.AsyncSession() as db:
+            return await get_monthly_report(month, None, db, db)
+    result = benchmark.pedantic(lambda: event_loop_runner(build()), setup=lambda: _clear_reports(fleet), rounds=10)
+    assert len(result["data"]["by_site"]) == len(fleet.site_ids)
+
+
+def bench_revenue_summary(benchmark, fleet, db):
+    fleet.ensure_settled()
+    summary = benchmark(crud.get_revenue_summary, db, fleet.site_ids[0], fleet.start.strftime("%Y-%m"))
+    assert summary["scenarios"]["without_dsm"] > 0
+
+
+def bench_revenue_scenarios(benchmark, fleet, db):
+    """Load the fleet's range once and compare len(SCENARIOS) + baseline parameter sets."""
+    rows = benchmark(lambda: run_scenarios(crud.load_scenario_inputs(db, None, fleet.start, fleet.end), SCENARIOS))
+    assert len(rows) == len(SCENARIOS) + 1
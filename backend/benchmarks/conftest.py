@@ -0,0 +1,68 @@
+"""
+Benchmark fixtures. Everything runs on throwaway SQLite files: the app's DATABASE_URL is pointed at a temp
+directory before any app import, and each fleet size gets its own database, generated once per session.
+BENCH_FLEET_SIZES ("SITESxDAYS,...", see fleet.py) picks the sizes; the default spans one site-week to 50 sites x 31 days.
+"""
+import asyncio
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="dsm-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/app.db"  # Never a real database, whatever .env says
+os.environ["REPORTS_DIR"] = os.path.join(_TMP, "report_artifacts")
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app import crud
+from app.database import Base, _make_async_engine, _make_engine
+from .fleet import FLEET_SIZES, fleet_id, generate_fleet
+
+_fleets = {}
+
+
+class Fleet:
+    """A generated fleet: its database (sync and async sessions) and date range."""
+
+    def __init__(self, n_sites: int, days: int):
+        url = f"sqlite:///{_TMP}/fleet_{n_sites}x{days}.db"
+        self.n_sites, self.days = n_sites, days
+        self.engine = _make_engine(url)
+        self.async_engine = _make_async_engine(url)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        self.AsyncSession = async_sessionmaker(self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        Base.metadata.create_all(self.engine)
+        with self.Session() as db:
+            generated = generate_fleet(db, n_sites, days)
+        self.site_ids, self.start, self.end = generated["site_ids"], generated["start"], generated["end"]
+        self.settled = False
+
+    def ensure_settled(self):
+        """Settle the whole range once, for benchmarks that read settlements and rollups."""
+        if not self.settled:
+            with self.Session() as db:
+                crud.settle_site_days(db, None, self.start, self.end)
+            self.settled = True
+
+
+@pytest.fixture(params=FLEET_SIZES, ids=fleet_id)
+def fleet(request) -> Fleet:
+    if request.param not in _fleets:
+        _fleets[request.param] = Fleet(*request.param)
+    return _fleets[request.param]
+
+
+@pytest.fixture
+def db(fleet):
+    with fleet.Session() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def event_loop_runner():
+    """Run coroutines (async endpoints) on one loop for the whole session."""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    for fleet in _fleets.values():
+        loop.run_until_complete(fleet.async_engine.dispose())
+    loop.close()
@@ -0,0 +1,91 @@
+"""
+Synthetic fleet generator: N solar sites x D days x 96 blocks of schedule, generation, DAM/RTM prices and
+weather, written through the same crud paths the app uses (so BLOCK_STORAGE applies). Deterministic per seed.
+
+    python -m benchmarks.fleet --sites 50 --days 31 --url sqlite:///fleet.db
+"""
+import argparse
+import os
+from datetime import date, timedelta
+from types import SimpleNamespace
+import numpy as np
+from sqlalchemy.orm import Session
+from app import crud
+from app.models import MarketPriceBlock
+from app.schemas import Site, Schedule, Generation
+
+FLEET_START = date(2025, 1, 1)
+FLEET_SIZES = [tuple(int(n) for n in size.split("x")) for size in os.getenv("BENCH_FLEET_SIZES", "1x7,10x7,10x31,50x31").split(",")]
+REGIONS = [("North", "Rajasthan"), ("West", "Gujarat"), ("South", "Karnataka"), ("South", "Tamil Nadu"), ("West", "Maharashtra")]
+_HOURS = (np.arange(96) + 0.5) / 4  # Block mid-points in hours
+
+
+def fleet_id(size: tuple) -> str:
+    return f"{size[0]}sites-{size[1]}days"
+
+
+def solar_profile() -> np.ndarray:
+    """Clear-sky shape over a day's 96 blocks: 0 at night, 1 at solar noon."""
+    return np.clip(np.sin((_HOURS - 6) / 13 * np.pi), 0, None)
+
+
+def generate_fleet(db: Session, n_sites: int, days: int, start: date = FLEET_START, seed: int = 0) -> dict:
+    """Create n_sites sites and fill start .. start + days - 1. Returns {"site_ids", "start", "end"}."""
+    rng = np.random.default_rng(seed)
+    sites = []
+    for i in range(n_sites):
+        region, state = REGIONS[i % len(REGIONS)]
+        sites.append(Site(
+            site_name=f"Synthetic Solar {i + 1}", capacity_mw=round(float(rng.uniform(20, 200)), 1), region=region, state=state,
+            latitude=float(rng.uniform(8, 30)), longitude=float(rng.uniform(68, 90)),
+        ))
+    db.add_all(sites)
+    db.commit()
+    site_ids = [site.site_id for site in sites]
+    capacity = np.array([site.capacity_mw for site in sites])[:, None]
+    profile = solar_profile()
+
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        clearness = rng.uniform(0.6, 1.0, size=(n_sites, 1))
+        scheduled = capacity * profile * 0.8 * clearness
+        actual = np.clip(scheduled * (1 + rng.normal(0, 0.12, size=scheduled.shape)), 0, None)
+        dam = 3.0 + 4.0 * np.clip(np.sin((_HOURS - 4) / 20 * np.pi), 0, None) + rng.uniform(-0.5, 0.5, size=96)
+        rtm = dam * rng.normal(1.0, 0.1, size=96)
+        crud.store_market_prices(
+            db, day, [MarketPriceBlock(block_no=b + 1, dam_price=round(float(dam[b]), 2), rtm_price=round(float(rtm[b]), 2)) for b in range(96)],
+            columns=("dam_price", "rtm_price"),
+        )
+        for i, site_id in enumerate(site_ids):
+            crud.bulk_upsert_blocks(db, Schedule, "scheduled_mw", site_id, day, {b + 1: round(float(scheduled[i, b]), 2) for b in range(96)})
+            crud.bulk_upsert_blocks(db, Generation, "actual_mw", site_id, day, {b + 1: round(float(actual[i, b]), 2) for b in range(96)})
+        db.commit()
+        crud.store_weather_days(db, day, {
+            site_id: [
+                SimpleNamespace(irradiance=round(1000 * profile[b] * clearness[i, 0], 1), temp=round(22 + 10 * profile[b], 1), wind_speed=3.0, cloud_cover=int(100 * (1 - clearness[i, 0])))
+                for b in range(96)
+            ]
+            for i, site_id in enumerate(site_ids)
+        })
+    return {"site_ids": site_ids, "start": start, "end": start + timedelta(days=days - 1)}
+
+
+if __name__ == "__main__":
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base, _make_engine
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sites", type=int, default=10)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--url", default="sqlite:///fleet.db")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--settle", action="store_true", help="Also settle the generated range")
+    args = parser.parse_args()
+
+    engine = _make_engine(args.url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        fleet = generate_fleet(db, args.sites, args.days, seed=args.seed)
+        if args.settle:
+            crud.settle_site_days(db, fleet["site_ids"], fleet["start"], fleet["end"])
+    print(f"{args.sites} site(s) x {args.days} day(s) -> {args.url}")
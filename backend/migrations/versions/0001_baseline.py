@@ -0,0 +1,148 @@
+"""Baseline: tables as created by db/schema.sql / Base.metadata.create_all before migrations.
+
+Databases that already have these tables: `alembic stamp 0001_baseline`, then `alembic upgrade head`.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+SCHEMA_SQL_INDEXES = [  # "Indexes for performance" from db/schema.sql
+    ("idx_schedules_site_date", "schedules", ["site_id", "date"]),
+    ("idx_generations_site_date", "generations", ["site_id", "date"]),
+    ("idx_deviations_site_date", "deviations", ["site_id", "date"]),
+    ("idx_market_prices_date", "market_prices", ["date"]),
+    ("idx_weather_site_date", "weather_data", ["site_id", "date"]),
+    ("idx_ai_memory_user", "ai_memory", ["user_id"]),
+]
+
+
+def _block_table(name: str, id_col: str, *columns, unique: bool = True):
+    """A per-(site, date, block) table: id, site_id, date, block_no, the given columns, created_at."""
+    args = [
+        sa.Column(id_col, sa.Integer(), primary_key=True),
+        sa.Column("site_id", sa.Integer(), sa.ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("block_no", sa.Integer(), nullable=False),
+        *columns,
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    ]
+    if unique:
+        args.append(sa.UniqueConstraint("site_id", "date", "block_no", name=f"{name}_site_id_date_block_no_key"))
+    op.create_table(name, *args)
+    op.create_index(f"ix_{name}_{id_col}", name, [id_col])
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(100), nullable=False),
+        sa.Column("password_hash", sa.String(255), nullable=False),
+        sa.Column("role", sa.Enum("admin", "operator", "engineer", name="roles"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "sites",
+        sa.Column("site_id", sa.Integer(), primary_key=True),
+        sa.Column("site_name", sa.String(100), nullable=False),
+        sa.Column("capacity_mw", sa.Float(), nullable=False),
+        sa.Column("region", sa.String(50)),
+        sa.Column("state", sa.String(50)),
+        sa.Column("latitude", sa.Float()),
+        sa.Column("longitude", sa.Float()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_sites_site_id", "sites", ["site_id"])
+
+    _block_table("schedules", "schedule_id", sa.Column("scheduled_mw", sa.Float(), nullable=False))
+    _block_table("generations", "generation_id", sa.Column("actual_mw", sa.Float(), nullable=False))
+    _block_table(
+        "deviations", "deviation_id",
+        sa.Column("deviation_percent", sa.Float()),
+        sa.Column("penalty_band", sa.Enum("none", "partial", "full", name="penalty_bands")),
+        unique=False,
+    )
+    _block_table(
+        "dsm_settlements", "dsm_id",
+        sa.Column("dsm_payable", sa.Float(), server_default="0"),
+        sa.Column("dsm_receivable", sa.Float(), server_default="0"),
+        sa.Column("market_price", sa.Float()),
+    )
+    _block_table(
+        "weather_data", "weather_id",
+        sa.Column("irradiance", sa.Float()),
+        sa.Column("temp", sa.Float()),
+        sa.Column("wind_speed", sa.Float()),
+        sa.Column("cloud_cover", sa.Integer()),
+        unique=False,
+    )
+
+    op.create_table(
+        "market_prices",
+        sa.Column("market_id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("block_no", sa.Integer(), nullable=False),
+        sa.Column("dam_price", sa.Float()),
+        sa.Column("rtm_price", sa.Float()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.UniqueConstraint("date", "block_no", name="market_prices_date_block_no_key"),
+    )
+    op.create_index("ix_market_prices_market_id", "market_prices", ["market_id"])
+
+    op.create_table(
+        "reports",
+        sa.Column("report_id", sa.Integer(), primary_key=True),
+        sa.Column("site_id", sa.Integer(), sa.ForeignKey("sites.site_id")),
+        sa.Column("report_type", sa.Enum("daily", "weekly", "monthly", "consolidated", name="report_types")),
+        sa.Column("period", sa.String(50)),
+        sa.Column("json_data", sa.JSON()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_reports_report_id", "reports", ["report_id"])
+
+    op.create_table(
+        "audit_logs",
+        sa.Column("log_id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id")),
+        sa.Column("action", sa.String(100), nullable=False),
+        sa.Column("details", sa.JSON()),
+        sa.Column("timestamp", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_audit_logs_log_id", "audit_logs", ["log_id"])
+
+    op.create_table(
+        "ai_memory",
+        sa.Column("memory_id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+        sa.Column("query", sa.Text(), nullable=False),
+        sa.Column("context", sa.JSON()),
+        sa.Column("response", sa.Text()),
+        sa.Column("timestamp", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_ai_memory_memory_id", "ai_memory", ["memory_id"])
+
+    for index, table, columns in SCHEMA_SQL_INDEXES:
+        op.create_index(index, table, columns)
+
+
+def downgrade():
+    for table in (
+        "ai_memory", "audit_logs", "reports", "market_prices", "weather_data", "dsm_settlements", "deviations",
+        "generations", "schedules", "sites", "users",
+    ):
+        op.drop_table(table)
+    for enum in ("report_types", "penalty_bands", "roles"):
+        sa.Enum(name=enum).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,45 @@
+"""Unique (site_id, date, block_no) on deviations and weather_data.
+
+Keeps the newest row of any duplicated block, then adds the constraint; its index replaces the
+plain (site_id, date) indexes from db/schema.sql. Tables that already have the key (a database built
+from the current db/schema.sql and stamped 0001_baseline) are left alone.
+
+Revision ID: 0002_block_unique_keys
+Revises: 0001_baseline
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_block_unique_keys"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+TABLES = {  # table -> (id column, index from db/schema.sql made redundant by the unique key)
+    "deviations": ("deviation_id", "idx_deviations_site_date"),
+    "weather_data": ("weather_id", "idx_weather_site_date"),
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, (id_col, old_index) in TABLES.items():
+        keys = [constraint["column_names"] for constraint in inspector.get_unique_constraints(table)]
+        if ["site_id", "date", "block_no"] in keys:
+            op.execute(f"DROP INDEX IF EXISTS {old_index}")
+            continue
+        op.execute(
+            f"DELETE FROM {table} WHERE {id_col} NOT IN "
+            f"(SELECT keep_id FROM (SELECT MAX({id_col}) AS keep_id FROM {table} GROUP BY site_id, date, block_no) AS newest)"
+        )
+        with op.batch_alter_table(table) as batch:
+            batch.create_unique_constraint(f"{table}_site_id_date_block_no_key", ["site_id", "date", "block_no"])
+        op.execute(f"DROP INDEX IF EXISTS {old_index}")
+
+
+def downgrade():
+    for table, (_, old_index) in TABLES.items():
+        with op.batch_alter_table(table) as batch:
+            batch.drop_constraint(f"{table}_site_id_date_block_no_key", type_="unique")
+        op.execute(f"CREATE INDEX IF NOT EXISTS {old_index} ON {table} (site_id, date)")
@@ -0,0 +1,88 @@
+"""Range-partition schedules, generations and dsm_settlements by month (Postgres only).
+
+Each table is rebuilt as `PARTITION BY RANGE (date)` with one partition per month from its oldest
+row to PARTITION_MONTHS_AHEAD months out, plus a default partition; rows are copied across and the
+id sequence carries over. The primary key becomes (id, date) since Postgres requires the partition
+key in every unique constraint; (site_id, date, block_no) stays unique. The copy holds an exclusive
+lock on each table, so run it in a maintenance window on large databases.
+
+Revision ID: 0003_partition_block_tables
+Revises: 0002_block_unique_keys
+Create Date: 2025-10-20
+"""
+from datetime import date
+from alembic import op
+from app.utils.partitions import PARTITION_MONTHS_AHEAD, add_months, ensure_month_partitions, month_start
+
+revision = "0003_partition_block_tables"
+down_revision = "0002_block_unique_keys"
+branch_labels = None
+depends_on = None
+
+TABLES = {  # table -> (id column, value columns)
+    "schedules": ("schedule_id", ["scheduled_mw DOUBLE PRECISION NOT NULL"]),
+    "generations": ("generation_id", ["actual_mw DOUBLE PRECISION NOT NULL"]),
+    "dsm_settlements": ("dsm_id", ["dsm_payable DOUBLE PRECISION DEFAULT 0", "dsm_receivable DOUBLE PRECISION DEFAULT 0", "market_price DOUBLE PRECISION"]),
+}
+
+
+def _columns(table: str) -> str:
+    id_col, values = TABLES[table]
+    return ", ".join([id_col, "site_id", "date", "block_no", *(v.split()[0] for v in values), "created_at"])
+
+
+def _create(table: str, partitioned: bool):
+    id_col, values = TABLES[table]
+    primary_key = f"{id_col}, date" if partitioned else id_col
+    op.execute(f"""
+        CREATE TABLE {table} (
+            {id_col} INTEGER NOT NULL DEFAULT nextval('{table}_{id_col}_seq'),
+            site_id INTEGER NOT NULL REFERENCES sites(site_id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            block_no INTEGER NOT NULL,
+            {", ".join(values)},
+            created_at TIMESTAMP DEFAULT now(),
+            CONSTRAINT {table}_pkey PRIMARY KEY ({primary_key}),
+            CONSTRAINT {table}_site_id_date_block_no_key UNIQUE (site_id, date, block_no)
+        ){" PARTITION BY RANGE (date)" if partitioned else ""}
+    """)
+
+
+def _move_aside(table: str, suffix: str):
+    """Rename a table and the constraint/index names the replacement will reuse."""
+    id_col = TABLES[table][0]
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_{suffix}")
+    for index in (f"{table}_pkey", f"{table}_site_id_date_block_no_key", f"ix_{table}_{id_col}"):
+        op.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index.replace(table, f'{table}_{suffix}', 1)}")
+
+
+def _copy_and_drop(table: str, suffix: str):
+    id_col = TABLES[table][0]
+    columns = _columns(table)
+    op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_{suffix} WHERE site_id IS NOT NULL")
+    op.execute(f"ALTER SEQUENCE {table}_{id_col}_seq OWNED BY {table}.{id_col}")  # Otherwise dropped with the old table
+    op.execute(f"DROP TABLE {table}_{suffix}")
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != "postgresql":
+        return
+    this_month = month_start(date.today())
+    for table in TABLES:
+        _move_aside(table, "unpartitioned")
+        _create(table, partitioned=True)
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        first = conn.exec_driver_sql(f"SELECT min(date) FROM {table}_unpartitioned").scalar()
+        ensure_month_partitions(conn, table, min(first or this_month, this_month), add_months(this_month, PARTITION_MONTHS_AHEAD))
+        _copy_and_drop(table, "unpartitioned")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, (id_col, _) in TABLES.items():
+        _move_aside(table, "partitioned")
+        _create(table, partitioned=False)
+        op.execute(f"CREATE INDEX ix_{table}_{id_col} ON {table} ({id_col})")
+        _copy_and_drop(table, "partitioned")  # Drops the monthly partitions with their parent
@@ -0,0 +1,33 @@
+"""Per-site-day checkpoints for the nightly settlement pipeline.
+
+Revision ID: 0004_nightly_checkpoints
+Revises: 0003_partition_block_tables
+Create Date: 2025-10-21
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_nightly_checkpoints"
+down_revision = "0003_partition_block_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "nightly_checkpoints" in sa.inspect(op.get_bind()).get_table_names():
+        return  # Database built from the current db/schema.sql
+    op.create_table(
+        "nightly_checkpoints",
+        sa.Column("checkpoint_id", sa.Integer(), primary_key=True),
+        sa.Column("site_id", sa.Integer(), sa.ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("run_id", sa.String(32), nullable=False),
+        sa.Column("blocks", sa.Integer()),
+        sa.Column("completed_at", sa.DateTime()),
+        sa.UniqueConstraint("site_id", "date", name="nightly_checkpoints_site_id_date_key"),
+    )
+    op.create_index("ix_nightly_checkpoints_checkpoint_id", "nightly_checkpoints", ["checkpoint_id"])
+
+
+def downgrade():
+    op.drop_table("nightly_checkpoints")
@@ -0,0 +1,29 @@
+"""Rolling per-user AI summaries for ai_memory compaction.
+
+Revision ID: 0005_ai_summaries
+Revises: 0004_nightly_checkpoints
+Create Date: 2025-10-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_ai_summaries"
+down_revision = "0004_nightly_checkpoints"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "ai_summaries" in sa.inspect(op.get_bind()).get_table_names():
+        return  # Database built from the current db/schema.sql
+    op.create_table(
+        "ai_summaries",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("turns", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("ai_summaries")
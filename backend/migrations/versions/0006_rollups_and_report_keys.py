@@ -0,0 +1,90 @@
+"""DSM rollup tables, packed block vectors and the report cache key.
+
+dsm_site_days / dsm_site_months (crud.refresh_rollups), site_day_blocks (BLOCK_STORAGE=vectors|both)
+and reports.cache_key with its index. Objects that already exist are left alone: databases migrated
+with an earlier copy of 0001_baseline have them already.
+
+Revision ID: 0006_rollups_and_report_keys
+Revises: 0005_ai_summaries
+Create Date: 2025-10-26
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_rollups_and_report_keys"
+down_revision = "0005_ai_summaries"
+branch_labels = None
+depends_on = None
+
+VECTOR_COLUMNS = (
+    "scheduled_mw", "actual_mw", "deviation_percent", "penalty_code", "dsm_payable", "dsm_receivable",
+    "market_price", "irradiance", "temp", "wind_speed", "cloud_cover",
+)
+
+
+def _rollup_columns(*keys):
+    return [
+        *keys,
+        sa.Column("blocks", sa.Integer(), server_default="0"),
+        sa.Column("blocks_none", sa.Integer(), server_default="0"),
+        sa.Column("blocks_partial", sa.Integer(), server_default="0"),
+        sa.Column("blocks_full", sa.Integer(), server_default="0"),
+        sa.Column("total_payable", sa.Float(), server_default="0"),
+        sa.Column("total_receivable", sa.Float(), server_default="0"),
+        sa.Column("net", sa.Float(), server_default="0"),
+        sa.Column("max_abs_deviation", sa.Float()),
+        sa.Column("actual_mwh", sa.Float(), server_default="0"),
+        sa.Column("energy_revenue", sa.Float(), server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    ]
+
+
+def _site_fk():
+    return sa.Column("site_id", sa.Integer(), sa.ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "dsm_site_days" not in tables:
+        op.create_table(
+            "dsm_site_days",
+            *_rollup_columns(sa.Column("rollup_id", sa.Integer(), primary_key=True), _site_fk(), sa.Column("date", sa.Date(), nullable=False)),
+            sa.UniqueConstraint("site_id", "date", name="dsm_site_days_site_id_date_key"),
+        )
+        op.create_index("ix_dsm_site_days_rollup_id", "dsm_site_days", ["rollup_id"])
+    if "dsm_site_months" not in tables:
+        op.create_table(
+            "dsm_site_months",
+            *_rollup_columns(
+                sa.Column("rollup_id", sa.Integer(), primary_key=True), _site_fk(),
+                sa.Column("month", sa.Date(), nullable=False), sa.Column("days", sa.Integer(), server_default="0"),
+            ),
+            sa.UniqueConstraint("site_id", "month", name="dsm_site_months_site_id_month_key"),
+        )
+        op.create_index("ix_dsm_site_months_rollup_id", "dsm_site_months", ["rollup_id"])
+    if "site_day_blocks" not in tables:
+        op.create_table(
+            "site_day_blocks",
+            sa.Column("vector_id", sa.Integer(), primary_key=True),
+            _site_fk(),
+            sa.Column("date", sa.Date(), nullable=False),
+            *(sa.Column(col, sa.LargeBinary()) for col in VECTOR_COLUMNS),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+            sa.UniqueConstraint("site_id", "date", name="site_day_blocks_site_id_date_key"),
+        )
+        op.create_index("ix_site_day_blocks_vector_id", "site_day_blocks", ["vector_id"])
+
+    if "cache_key" not in {col["name"] for col in inspector.get_columns("reports")}:
+        op.add_column("reports", sa.Column("cache_key", sa.String(64)))
+    if ["cache_key"] not in [index["column_names"] for index in inspector.get_indexes("reports")]:
+        op.create_index("ix_reports_cache_key", "reports", ["cache_key"])
+
+
+def downgrade():
+    op.drop_index("ix_reports_cache_key", table_name="reports")
+    with op.batch_alter_table("reports") as batch:
+        batch.drop_column("cache_key")
+    for table in ("site_day_blocks", "dsm_site_months", "dsm_site_days"):
+        op.drop_table(table)
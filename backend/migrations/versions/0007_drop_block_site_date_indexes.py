@@ -0,0 +1,27 @@
+"""Drop idx_schedules_site_date and idx_generations_site_date.
+
+Site/date lookups use the leading columns of UNIQUE(site_id, date, block_no), as on deviations and
+weather_data since 0002. On Postgres, 0003 already dropped them with the unpartitioned tables.
+
+Revision ID: 0007_drop_block_site_date_indexes
+Revises: 0006_rollups_and_report_keys
+Create Date: 2025-10-27
+"""
+from alembic import op
+
+revision = "0007_drop_block_site_date_indexes"
+down_revision = "0006_rollups_and_report_keys"
+branch_labels = None
+depends_on = None
+
+INDEXES = {"idx_schedules_site_date": "schedules", "idx_generations_site_date": "generations"}
+
+
+def upgrade():
+    for index in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def downgrade():
+    for index, table in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} (site_id, date)")
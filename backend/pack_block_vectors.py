@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""Pack existing per-block rows into site_day_blocks, one month at a time (before setting BLOCK_STORAGE=both/vectors)."""
+import sys
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from app.database import SessionLocal
+from app.crud import pack_block_vectors, _month_end
+from app.schemas import Schedule, Generation
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        if len(sys.argv) == 3:
+            first, last = (date.fromisoformat(arg) for arg in sys.argv[1:])
+        else:
+            bounds = [db.execute(select(func.min(model.date), func.max(model.date))).one() for model in (Schedule, Generation)]
+            dates = [d for pair in bounds for d in pair if d is not None]
+            first, last = (min(dates), max(dates)) if dates else (None, None)
+        site_days = 0
+        month = first
+        while month and month <= last:
+            site_days += pack_block_vectors(db, month, min(_month_end(month), last))
+            month = _month_end(month) + timedelta(days=1)
+        print(f"Packed {site_days} site-day(s)")
+    finally:
+        db.close()
@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+"""Rebuild dsm_site_days / dsm_site_months from dsm_settlements (e.g., after a bulk backfill)."""
+from app.database import SessionLocal
+from app.crud import rebuild_rollups
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        months = rebuild_rollups(db)
+        print(f"Rebuilt DSM rollups for {months} month(s)")
+    finally:
+        db.close()
@@ -1,10 +1,70 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+#!/usr/bin/env python
+"""
+Background jobs: nightly settlement pipeline, partition upkeep, AI memory compaction and the 6 AM report email.
+`python scheduler.py` runs the scheduler; `python scheduler.py nightly [YYYY-MM-DD] [--force]` runs the
+pipeline once (catch-up or manual re-run; finished site-days are skipped unless --force).
+"""
+import json
+import os
+import sys
+from datetime import date, timedelta
+from apscheduler.schedulers.blocking import BlockingScheduler
+from app.database import SessionLocal
+from app.crud import get_reports
+from app.utils.ai_context import compact_ai_memory
 from app.utils.email import send_daily_report
-import datetime
+from app.utils.nightly import run_nightly
+from app.utils.partitions import maintain_partitions
+from app.utils.report_render import artifact_path, shutdown_render_pool
+
+NIGHTLY_HOUR = int(os.getenv("NIGHTLY_HOUR", "0"))
+NIGHTLY_MINUTE = int(os.getenv("NIGHTLY_MINUTE", "30"))
+REPORT_EMAIL = os.getenv("REPORT_EMAIL", "admin@sprngenergy.com")
+
+def nightly_job():
+    print(json.dumps(run_nightly(), default=str))
+
+def ai_memory_job():
+    """Fold old AI turns into the per-user rolling summaries (retention)."""
+    db = SessionLocal()
+    try:
+        print(json.dumps(compact_ai_memory(db)))
+    finally:
+        db.close()
 
 def daily_report_job():
-    send_daily_report("admin@sprngenergy.com", "Daily DSM Report", "Summary here...")
+    """Email yesterday's fleet report (built by the nightly run) with its PDF when rendered."""
+    day = date.today() - timedelta(days=1)
+    db = SessionLocal()
+    try:
+        report = next((r for r in get_reports(db, report_type="daily", period=str(day), limit=10) if r.site_id is None), None)
+    finally:
+        db.close()
+    if report is None:
+        print(f"No daily report for {day}; nothing settled yet")
+        return
+    data = report.json_data
+    rows = "".join(f"<tr><td>{r['site_name']}</td><td>{r['total_payable']:.2f}</td><td>{r['total_receivable']:.2f}</td></tr>" for r in data["by_site"])
+    content = (
+        f"<h1>Daily DSM Report - {day}</h1>"
+        f"<p>Payable INR {data['total_payable']:.2f}, Receivable INR {data['total_receivable']:.2f}, Net INR {data['net']:.2f}</p>"
+        f"<table><tr><th>Site</th><th>Payable (INR)</th><th>Receivable (INR)</th></tr>{rows}</table>"
+    )
+    pdf = artifact_path(report.report_id, "pdf")
+    send_daily_report(REPORT_EMAIL, f"Daily DSM Report - {day}", content, attachment_path=pdf if os.path.exists(pdf) else None)
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(daily_report_job, 'cron', hour=6, minute=0)
-scheduler.start()
+if __name__ == "__main__":  # Guarded: the nightly process pool re-imports this module in its workers
+    if len(sys.argv) > 1 and sys.argv[1] == "nightly":
+        args = [arg for arg in sys.argv[2:] if arg != "--force"]
+        try:
+            result = run_nightly(date.fromisoformat(args[0]) if args else None, force="--force" in sys.argv)
+            print(json.dumps(result, default=str, indent=2))
+        finally:
+            shutdown_render_pool()
+    else:
+        scheduler = BlockingScheduler()
+        scheduler.add_job(nightly_job, 'cron', hour=NIGHTLY_HOUR, minute=NIGHTLY_MINUTE, max_instances=1, coalesce=True)
+        scheduler.add_job(maintain_partitions, 'cron', hour=1, minute=0)  # Next months' block-table partitions (Postgres)
+        scheduler.add_job(ai_memory_job, 'cron', hour=2, minute=0)
+        scheduler.add_job(daily_report_job, 'cron', hour=6, minute=0)
+        scheduler.start()
@@ -0,0 +1,37 @@
+"""
+Test fixtures. Like the benchmarks, tests run on throwaway SQLite files with local stand-ins for upstreams:
+DATABASE_URL and REPORTS_DIR point at a temp directory and AI_MODEL=fake before any app import.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="dsm-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/app.db"  # Never a real database, whatever .env says
+os.environ["AI_MODEL"] = "fake"
+os.environ["REPORTS_DIR"] = os.path.join(_TMP, "report_artifacts")
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, _make_engine
+from app.schemas import Site, User
+
+_databases = 0
+
+
+@pytest.fixture
+def db():
+    """A fresh database per test with two sites and one user."""
+    global _databases
+    _databases += 1
+    engine = _make_engine(f"sqlite:///{_TMP}/test_{_databases}.db")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, autoflush=False)() as session:
+        session.add_all([
+            Site(site_name="REWA Solar", capacity_mw=50, region="West", state="MP"),
+            Site(site_name="Bhadla Solar Park", capacity_mw=100, region="North", state="Rajasthan"),
+            User(name="Operator", email="operator@example.com", password_hash="x", role="operator"),
+            User(name="Engineer", email="engineer@example.com", password_hash="x", role="engineer"),
+        ])
+        session.commit()
+        yield session
+    engine.dispose()
@@ -0,0 +1,56 @@
+"""/ai/query paths against the fake model: DB lookups, the response cache and its invalidation."""
+from datetime import date
+import pytest
+from app import crud
+from app.integration import ai
+from app.models import AIQuery
+from app.schemas import AiMemory
+
+DAY = date(2025, 10, 7)
+WHY = "Why was DSM high for REWA on 2025-10-07?"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ai._response_cache.clear()
+
+
+def settle(db, scheduled_mw: float):
+    crud.store_schedule_day(db, 1, DAY, {block: scheduled_mw for block in range(1, 97)})
+    crud.store_generation_day(db, 1, DAY, {block: 40.0 if block % 3 else 30.0 for block in range(1, 97)}, None)
+    crud.settle_site_days(db, [1], DAY, DAY)
+
+
+def test_lookup_answered_from_db(db):
+    settle(db, 30.0)
+    facts = ai.dsm_facts(db, 1, DAY)
+    response = ai.process_ai_query(db, 1, AIQuery(query="Show DSM for REWA on 2025-10-07"))
+    assert response.source == "lookup"
+    assert f"payable INR {facts['payable']:,.2f}" in response.response
+    assert not response.response.startswith("[fake model]")
+
+
+def test_model_answer_cached(db):
+    settle(db, 30.0)
+    first = ai.process_ai_query(db, 1, AIQuery(query=WHY))
+    again = ai.process_ai_query(db, 1, AIQuery(query="why was dsm high for rewa on 2025-10-07"))
+    assert (first.source, again.source) == ("model", "cache")
+    assert again.response == first.response
+    assert db.query(AiMemory).count() == 2
+
+
+def test_cache_not_shared_after_conversation(db):
+    settle(db, 30.0)
+    ai.process_ai_query(db, 1, AIQuery(query="What is the outlook for Bhadla tomorrow?"))
+    first = ai.process_ai_query(db, 1, AIQuery(query=WHY))  # Prompt carries user 1's earlier turn
+    other = ai.process_ai_query(db, 2, AIQuery(query=WHY))
+    assert (first.source, other.source) == ("model", "model")
+    assert ai.process_ai_query(db, 1, AIQuery(query=WHY)).source == "cache"
+
+
+def test_resettlement_invalidates_cache(db):
+    settle(db, 30.0)
+    assert ai.process_ai_query(db, 1, AIQuery(query=WHY)).source == "model"
+    assert ai.process_ai_query(db, 2, AIQuery(query=WHY)).source == "cache"
+    settle(db, 35.0)
+    assert ai.process_ai_query(db, 2, AIQuery(query=WHY)).source == "model"
@@ -0,0 +1,56 @@
+"""Buffered audit logging: batches are written by the background flusher, never on the caller's thread."""
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+from app.schemas import AuditLog
+from app.utils.audit import AuditBuffer
+
+
+def event(n):
+    return {"user_id": 1, "action": "test", "details": {"n": n}, "timestamp": datetime(2025, 10, 7)}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_full_batch_flushed_off_the_caller_thread(db):
+    make_session = sessionmaker(bind=db.get_bind())
+    writers = []
+
+    def session_factory():
+        writers.append(threading.current_thread())
+        return make_session()
+
+    buffer = AuditBuffer(session_factory, batch_size=10, flush_interval=60)
+    for n in range(10):
+        buffer.add(event(n))
+    assert threading.current_thread() not in writers
+    assert wait_for(lambda: db.query(AuditLog).count() == 10)  # Woken by the full batch, not the 60s interval
+    buffer.close()
+    assert [row.details["n"] for row in db.query(AuditLog).order_by(AuditLog.log_id)] == list(range(10))
+
+
+def test_oldest_dropped_past_hard_cap():
+    def session_factory():
+        raise RuntimeError("database down")
+
+    buffer = AuditBuffer(session_factory, batch_size=1000, flush_interval=60, max_buffer=5)
+    for n in range(8):
+        buffer.add(event(n))
+    assert buffer.dropped == 3
+    assert [e["details"]["n"] for e in buffer._events] == [3, 4, 5, 6, 7]
+
+
+def test_failed_flush_keeps_events():
+    def session_factory():
+        raise RuntimeError("database down")
+
+    buffer = AuditBuffer(session_factory, batch_size=1000, flush_interval=60)
+    buffer.add(event(1))
+    assert buffer.flush() is False
+    assert [e["details"]["n"] for e in buffer._events] == [1]
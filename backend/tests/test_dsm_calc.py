@@ -0,0 +1,75 @@
+"""calculate_dsm_batch must match the scalar calculate_dsm exactly, element for element."""
+import numpy as np
+import pytest
+from app.utils.dsm_calc import PENALTY_BANDS, calculate_dsm, calculate_dsm_batch
+
+KEYS = ("deviation_percent", "penalty_band", "dsm_payable", "dsm_receivable")
+
+
+def assert_matches_scalar(actual, scheduled, capacity, price):
+    actual, scheduled, capacity, price = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (actual, scheduled, capacity, price)))
+    batch = calculate_dsm_batch(actual, scheduled, capacity, price)
+    for index in np.ndindex(actual.shape):
+        expected = calculate_dsm(float(actual[index]), float(scheduled[index]), float(capacity[index]), float(price[index]))
+        got = {key: batch[key][index].item() for key in KEYS}
+        assert got == expected, (index, actual[index], scheduled[index], capacity[index], price[index])
+
+
+def test_band_boundaries():
+    # Exactly 15% and 20% (none/partial and partial/full edges), just either side of them, both directions
+    offsets = np.array([0, 14.99, 15, 15.000001, 15.01, 19.99, 20, 20.000001, 20.01, 100])
+    scheduled = np.array([100.0, 10.0, 40.0, 7.3])[:, None]
+    actual = np.concatenate([scheduled * (1 + offsets / 100), scheduled * (1 - offsets / 100)], axis=1)
+    assert_matches_scalar(actual, scheduled, 50.0, 3.0)
+    # Values that land on the edges only after float arithmetic (11.5 / 10 -> 15.000000000000002 %)
+    assert_matches_scalar([11.5, 12.0, 8.5, 8.0, 1.15, 1.2], [10, 10, 10, 10, 1, 1], 25.0, 4.2)
+
+
+def test_zero_schedule():
+    assert_matches_scalar([0.0, 5.0, 120.0], 0.0, 50.0, 3.0)
+    batch = calculate_dsm_batch([5.0], [0.0], 50.0)
+    assert batch["penalty_band"].tolist() == ["none"] and batch["dsm_payable"].tolist() == [0.0]
+
+
+def test_rounding_ties():
+    # Deviations and amounts sitting on .xx5, where np.round(x, 2) and round(x, 2) can disagree
+    deviations = np.array([0.005, 0.015, 0.125, 1.005, 2.675, 1.115, 0.285, 10.045])
+    scheduled = 10.0
+    assert_matches_scalar(scheduled - deviations, scheduled, 1.0, 1.0)  # Receivable = |deviation|
+    assert_matches_scalar(scheduled + deviations, scheduled, 1.0, 1.0)
+    assert_matches_scalar(1000 + deviations * 10, 1000.0, [[0.1], [3.3]], [0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5])
+
+
+def test_broadcast_inputs_and_thresholds():
+    rng = np.random.default_rng(1)
+    sites, days = 3, 4
+    scheduled = np.round(rng.uniform(0, 50, (sites, days, 96)), 1)
+    actual = np.round(scheduled * rng.uniform(0.7, 1.3, scheduled.shape), 2)
+    capacity = np.array([20.0, 55.5, 120.0])[:, None, None]
+    price = np.round(rng.uniform(2, 8, (days, 96)), 2)
+    assert_matches_scalar(actual, scheduled, capacity, price)
+
+    # Threshold sets broadcast along a leading scenario axis; the CERC defaults reproduce the scalar bands
+    thresholds = calculate_dsm_batch(actual, scheduled, capacity, price, partial_threshold=np.array([15.0, 10.0])[:, None, None, None],
+                                     full_threshold=np.array([20.0, 25.0])[:, None, None, None])
+    default = calculate_dsm_batch(actual, scheduled, capacity, price)
+    assert thresholds["deviation_percent"].shape == thresholds["dsm_receivable"].shape == (sites, days, 96)  # Band-independent
+    for key in KEYS:
+        assert np.array_equal(np.broadcast_to(thresholds[key], thresholds["penalty_code"].shape)[0], default[key])
+    raw = np.abs(np.where(scheduled != 0, (actual - scheduled) / np.where(scheduled != 0, scheduled, 1) * 100, 0))
+    expected = np.where(raw <= 10, 0, np.where(raw <= 25, 1, 2))
+    assert np.array_equal(thresholds["penalty_code"][1], expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_blocks(seed):
+    rng = np.random.default_rng(seed)
+    n = 5000
+    scheduled = np.round(rng.uniform(0, 60, n), rng.integers(0, 3))
+    scheduled[rng.random(n) < 0.05] = 0.0
+    actual = np.round(scheduled * rng.uniform(0.6, 1.4, n), 2)
+    assert_matches_scalar(actual, scheduled, np.round(rng.uniform(5, 200, n), 1), np.round(rng.uniform(0, 12, n), 2))
+
+
+def test_band_names():
+    assert PENALTY_BANDS.tolist() == ["none", "partial", "full"]
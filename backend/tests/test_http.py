@@ -0,0 +1,89 @@
+"""Shared upstream client: retries, what is not retried, and the circuit breaker, against mock transports."""
+import asyncio
+import itertools
+import httpx
+import pytest
+from app.integration import http, stub_server
+from app.integration.http import AsyncHttpClient, CircuitBreaker, CircuitOpenError
+
+URL = "https://upstream.test/data"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http, "HTTP_BACKOFF", 0)
+
+
+def mock_client(statuses: list[int], delay: float = 0):
+    """A client whose upstream answers with statuses in turn (the last one repeats); returns (client, calls)."""
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if delay:
+            await asyncio.sleep(delay)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1], json={"call": len(calls)})
+    return AsyncHttpClient(transport=httpx.MockTransport(handler)), calls
+
+
+def test_retries_on_503():
+    client, calls = mock_client([503, 503, 200])
+    assert asyncio.run(client.get_json(URL)) == {"call": 3}
+    assert len(calls) == 3
+    assert client.breaker("upstream.test").failures == 0
+
+
+def test_no_retry_on_404():
+    client, calls = mock_client([404])
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.get_json(URL))
+    assert len(calls) == 1
+    assert client.breaker("upstream.test").failures == 0  # The upstream answered: not a breaker failure
+
+
+def test_breaker_opens_then_half_opens_for_one_trial():
+    client, calls = mock_client([503, 503, 503, 503, 503, 503, 200], delay=0.05)
+    client._breakers["upstream.test"] = CircuitBreaker(threshold=2, reset_after=0.2)
+
+    async def scenario():
+        for _ in range(2):  # Each call exhausts its retries: two failed calls open the breaker
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.get_json(URL)
+        with pytest.raises(CircuitOpenError):
+            await client.get_json(URL)
+        assert len(calls) == 6  # Open: refused without calling upstream
+        await asyncio.sleep(0.25)
+        results = await asyncio.gather(*(client.get_json(URL) for _ in range(5)), return_exceptions=True)
+        assert len(calls) == 7  # Half-open: a single trial call
+        assert [r for r in results if not isinstance(r, Exception)] == [{"call": 7}]
+        assert all(isinstance(r, CircuitOpenError) for r in results if isinstance(r, Exception))
+        assert await client.get_json(URL) == {"call": 8}  # The successful trial closed it
+    asyncio.run(scenario())
+
+
+def test_failed_trial_reopens():
+    client, calls = mock_client([503])
+    client._breakers["upstream.test"] = CircuitBreaker(threshold=1, reset_after=0.1)
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_json(URL)
+        await asyncio.sleep(0.15)
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_json(URL)  # The trial fails
+        with pytest.raises(CircuitOpenError):
+            await client.get_json(URL)
+    asyncio.run(scenario())
+
+
+def test_stub_server_failures_are_retried(monkeypatch):
+    monkeypatch.setattr(stub_server, "STUB_FAIL_EVERY", 2)  # Every second request answers 503
+    monkeypatch.setattr(stub_server, "_requests", itertools.count(1))
+    client = AsyncHttpClient(transport=httpx.ASGITransport(app=stub_server.app))
+
+    async def scenario():
+        first = await client.get_json("http://stub/v1/market-data/day-ahead/2025-10-07")
+        second = await client.get_json("http://stub/v1/market-data/day-ahead/2025-10-07")  # 503, then retried
+        return first, second
+    first, second = asyncio.run(scenario())
+    assert first == second and len(first) == 24
@@ -0,0 +1,50 @@
+"""Read-through market price cache: concurrent misses for a date share one load."""
+import asyncio
+from datetime import date
+import pytest
+from app.integration import iex
+
+DAY = date(2025, 10, 7)
+BLOCKS = [{"block_no": b, "dam_price": 3.0, "rtm_price": None} for b in range(1, 97)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    iex.invalidate_price_cache()
+    yield
+    iex.invalidate_price_cache()
+
+
+def test_concurrent_misses_load_once(monkeypatch):
+    loads = []
+
+    async def load(db, target_date):
+        loads.append(target_date)
+        await asyncio.sleep(0.05)
+        iex._cache_put(target_date, BLOCKS, 60)
+        return BLOCKS
+    monkeypatch.setattr(iex, "_load_market_prices", load)
+
+    async def scenario():
+        return await asyncio.gather(*(iex.get_cached_market_prices(None, DAY) for _ in range(5)))
+    assert asyncio.run(scenario()) == [BLOCKS] * 5
+    assert loads == [DAY]
+    assert iex._price_loads == {}
+
+
+def test_waiters_retry_after_failed_load(monkeypatch):
+    loads = []
+
+    async def load(db, target_date):
+        loads.append(target_date)
+        await asyncio.sleep(0.05)
+        if len(loads) == 1:
+            raise RuntimeError("database unavailable")
+        return BLOCKS
+    monkeypatch.setattr(iex, "_load_market_prices", load)
+
+    async def scenario():
+        return await asyncio.gather(*(iex.get_cached_market_prices(None, DAY) for _ in range(3)), return_exceptions=True)
+    first, *rest = asyncio.run(scenario())
+    assert isinstance(first, RuntimeError)  # Only the caller whose load failed sees the error
+    assert rest == [BLOCKS, BLOCKS] and len(loads) == 2  # One waiter retries; the other joins its load
@@ -0,0 +1,89 @@
+"""ingest_block_frames: per-(site, day) accept/reject decisions over streamed chunks."""
+from datetime import date
+import pandas as pd
+import pytest
+from app.utils.ingest import ingest_block_frames
+
+DAY = date(2025, 10, 7)
+NEXT_DAY = date(2025, 10, 8)
+SITES = {1, 2}
+
+
+def rows(site_id, day, blocks, value=10.0):
+    return pd.DataFrame({"site_id": site_id, "date": day.isoformat(), "block_no": list(blocks), "scheduled_mw": value})
+
+
+def ingest(*frames, fail_on=()):
+    written = {}
+
+    def write_group(site_id, day, values):
+        if (site_id, day) in fail_on:
+            raise RuntimeError("database is locked")
+        written[(site_id, day)] = values
+
+    return ingest_block_frames(iter(frames), "scheduled_mw", SITES, write_group), written
+
+
+def by_key(report):
+    return {(g["site_id"], g["date"]): g for g in report["groups"]}
+
+
+def test_complete_days_across_chunks():
+    report, written = ingest(rows(1, DAY, range(1, 50)), pd.concat([rows(1, DAY, range(50, 97)), rows(2, DAY, range(1, 97))]))
+    assert (report["rows"], report["accepted"], report["rejected"]) == (192, 2, 0)
+    assert sorted(written[(1, DAY)]) == list(range(1, 97))
+
+
+def test_duplicate_block_rejects_day():
+    report, written = ingest(rows(1, DAY, range(1, 97)).iloc[:60], rows(1, DAY, [5, *range(61, 97)]))
+    group = by_key(report)[(1, DAY)]
+    assert group["status"] == "rejected" and "duplicate block_no (1 rows)" in group["reason"]
+    assert written == {}
+
+
+def test_late_rows_are_ignored_with_warning():
+    report, written = ingest(rows(1, DAY, range(1, 97)), rows(1, DAY, [3, 4], value=99.0))
+    group = by_key(report)[(1, DAY)]
+    assert group["status"] == "accepted"
+    assert group["warnings"] == {"rows after the day was written (ignored)": 2}
+    assert written[(1, DAY)][3] == 10.0
+
+
+def test_incomplete_day_rejected():
+    report, written = ingest(rows(1, DAY, range(1, 97)), rows(1, NEXT_DAY, range(1, 41)))
+    groups = by_key(report)
+    assert groups[(1, DAY)]["status"] == "accepted"
+    assert groups[(1, NEXT_DAY)] == {"site_id": 1, "date": NEXT_DAY, "status": "rejected", "reason": "incomplete: 40 of 96 blocks"}
+    assert list(written) == [(1, DAY)]
+
+
+def test_unknown_site_rows_are_unattributed():
+    report, _ = ingest(pd.concat([rows(1, DAY, range(1, 97)), rows(7, DAY, range(1, 5))]))
+    assert report["unattributed_rows"] == {"unknown site_id": 4}
+    assert report["accepted"] == 1 and len(report["groups"]) == 1
+
+
+def test_write_failure_rejects_only_that_day():
+    report, written = ingest(rows(1, DAY, range(1, 97)), rows(2, DAY, range(1, 97)), rows(1, NEXT_DAY, range(1, 97)), fail_on={(2, DAY)})
+    groups = by_key(report)
+    assert groups[(2, DAY)] == {"site_id": 2, "date": DAY, "status": "rejected", "reason": "write failed: database is locked"}
+    assert (report["accepted"], report["rejected"]) == (2, 1)
+    assert set(written) == {(1, DAY), (1, NEXT_DAY)}
+
+
+def test_broken_file_after_writes_returns_report():
+    def frames():
+        yield rows(1, DAY, range(1, 97))
+        yield rows(2, DAY, range(1, 30))
+        raise ValueError("bad chunk")
+
+    written = {}
+    report = ingest_block_frames(frames(), "scheduled_mw", SITES, lambda site_id, day, values: written.update({(site_id, day): values}))
+    assert report["error"] == "Upload stopped: bad chunk"
+    assert by_key(report)[(2, DAY)]["reason"] == "incomplete: 29 of 96 blocks (upload stopped)"
+    assert list(written) == [(1, DAY)]
+
+
+def test_missing_columns_before_any_write_raises():
+    with pytest.raises(ValueError, match="Missing columns: scheduled_mw"):
+        ingest(rows(1, DAY, range(1, 97)).drop(columns="scheduled_mw"))
@@ -0,0 +1,26 @@
+"""run_scenarios on a hand-built block set (no database)."""
+import numpy as np
+import pytest
+from app.utils.scenarios import run_scenarios
+
+INPUTS = {
+    "actual": np.array([40.0, 30.0, 55.0, 0.0]),
+    "scheduled": np.array([50.0, 30.0, 45.0, 10.0]),
+    "capacity": np.full(4, 50.0),
+    "dam": np.full(4, 3.0),
+    "rtm": np.full(4, 4.0),
+}
+
+
+def test_capacity_scale_is_linear():
+    baseline, scaled = run_scenarios(INPUTS, [{"name": "capacity+20%", "capacity_scale": 1.2}])
+    for key in ("energy_revenue", "dsm_payable", "dsm_receivable"):
+        assert scaled[key] == pytest.approx(baseline[key] * 1.2, rel=1e-3)  # Per-block rounding aside
+    assert [scaled[k] for k in ("blocks_none", "blocks_partial", "blocks_full")] == [baseline[k] for k in ("blocks_none", "blocks_partial", "blocks_full")]
+
+
+def test_baseline_first_and_deltas():
+    rows = run_scenarios(INPUTS, [{"name": "rtm", "price": "rtm"}])
+    assert [row["name"] for row in rows] == ["baseline", "rtm"]
+    assert rows[0]["net_vs_baseline"] == 0
+    assert rows[1]["net_vs_baseline"] == pytest.approx(rows[1]["net_revenue"] - rows[0]["net_revenue"])
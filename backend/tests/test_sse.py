@@ -0,0 +1,101 @@
+"""Streaming endpoints over SSE: AI answers from the fake streaming model, daily report render progress, alert subscriptions."""
+import asyncio
+import json
+import os
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from app import crud
+from app.api.alerts import _alert_events
+from app.auth import get_current_user
+from app.database import Base, SessionLocal, engine
+from app.integration import ai
+from app.main import app
+from app.schemas import Site, User
+from app.utils.alerts import broker
+from app.utils.report_render import artifact_path, shutdown_render_pool
+
+DAY = date(2025, 10, 7)
+WHY = "Why was DSM high for REWA on 2025-10-07?"
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def client():
+    """The app on its own (DATABASE_URL) database with one settled site-day, as user 1."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add_all([
+            Site(site_name="REWA Solar", capacity_mw=50, region="West", state="MP"),
+            User(name="Operator", email="operator@example.com", password_hash="x", role="operator"),
+        ])
+        db.commit()
+        crud.store_schedule_day(db, 1, DAY, {block: 30.0 for block in range(1, 97)})
+        crud.store_generation_day(db, 1, DAY, {block: 40.0 if block % 3 else 30.0 for block in range(1, 97)}, None)
+        crud.settle_site_days(db, [1], DAY, DAY)
+    ai._response_cache.clear()
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(user_id=1, role=SimpleNamespace(value="operator"))
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    shutdown_render_pool()
+
+
+def test_ai_stream_start_tokens_done(client):
+    response = client.post("/ai/query/stream", json={"query": WHY})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "start" and events[0][1] == {"source": "model"}
+    assert names[-1] == "done" and set(names[1:-1]) == {"token"} and len(names) > 3  # Word by word
+    done = events[-1][1]
+    assert "".join(data["text"] for name, data in events if name == "token") == done["response"]
+    assert done["response"].startswith("[fake model]") and done["source"] == "model"
+
+
+def test_ai_stream_replays_cached_answer(client):
+    first = parse_events(client.post("/ai/query/stream", json={"query": WHY}).text)
+    again = parse_events(client.post("/ai/query/stream", json={"query": WHY}).text)
+    assert [name for name, _ in again] == ["start", "token", "done"]
+    assert again[0][1] == {"source": "cache"}
+    assert again[1][1]["text"] == first[-1][1]["response"] == again[2][1]["response"]
+
+
+def test_ai_stream_lookup(client):
+    events = parse_events(client.post("/ai/query/stream", json={"query": "Show DSM for REWA on 2025-10-07"}).text)
+    assert [name for name, _ in events] == ["start", "token", "done"]
+    assert events[0][1] == {"source": "lookup"}
+
+
+def test_report_stream_ends_with_artifacts(client):
+    events = parse_events(client.get(f"/reports/daily/{DAY}/stream").text)
+    assert [name for name, _ in events] == ["data", "pdf", "xlsx", "done"]
+    report_id = events[0][1]["report_id"]
+    assert events[0][1]["json_data"]["by_site"][0]["site_name"] == "REWA Solar"
+    assert events[-1][1]["downloads"] == {fmt: f"/reports/{report_id}/download/{fmt}" for fmt in ("pdf", "xlsx")}
+    for fmt in ("pdf", "xlsx"):
+        assert os.path.getsize(artifact_path(report_id, fmt)) > 0
+    download = client.get(events[-1][1]["downloads"]["pdf"])
+    assert download.status_code == 200 and download.content.startswith(b"%PDF")
+
+
+def test_alert_stream_subscribes_while_open():
+    async def scenario():
+        events = _alert_events([1], None, None)
+        registered_before = broker.has_subscribers()
+        first = await events.__anext__()
+        registered_open = broker.has_subscribers()
+        await events.aclose()
+        return registered_before, first, registered_open, broker.has_subscribers()
+
+    before, first, while_open, after = asyncio.run(scenario())
+    assert (before, while_open, after) == (False, True, False)
+    assert first == ("ready", {"site_ids": [1], "regions": [], "states": []})
@@ -0,0 +1,56 @@
+"""Whole-day schedule uploads through upsert_rows on SQLite (INSERT ... ON CONFLICT DO UPDATE)."""
+from datetime import date, timedelta
+from app import crud
+from app.models import ScheduleBlock, ScheduleUpload
+from app.schemas import AuditLog, Schedule
+
+DAY = date(2025, 10, 7)
+
+
+def upload(db, value):
+    crud.upload_schedule(db, ScheduleUpload(site_id=1, date=DAY, blocks=[ScheduleBlock(block_no=b, scheduled_mw=value(b)) for b in range(1, 97)]), user_id=1)
+
+
+def stored(db, site_id=1):
+    return {row.block_no: (row.schedule_id, row.scheduled_mw) for row in db.query(Schedule).filter_by(site_id=site_id, date=DAY)}
+
+
+def test_upload_new_day(db):
+    upload(db, lambda b: b * 0.5)
+    rows = stored(db)
+    assert len(rows) == 96 and rows[10][1] == 5.0
+    audits = db.query(AuditLog).all()
+    assert [(a.action, a.details["blocks"]) for a in audits] == [("upload_schedule", 96)]  # One record per upload
+
+
+def test_reupload_updates_in_place(db):
+    upload(db, lambda b: b * 0.5)
+    before = stored(db)
+    upload(db, lambda b: 40.0 if b == 48 else b * 0.5 + 1)
+    after = stored(db)
+    assert db.query(Schedule).count() == 96
+    assert {b: row_id for b, (row_id, _) in after.items()} == {b: row_id for b, (row_id, _) in before.items()}  # Updated, not re-inserted
+    assert after[48][1] == 40.0 and after[1][1] == 1.5
+    assert db.query(AuditLog).count() == 2
+
+
+def test_batches_larger_than_batch_size(db):
+    days = crud.UPSERT_BATCH_SIZE // 96 * 2 + 3  # Several statements' worth of rows
+    rows = [{"site_id": site_id, "date": DAY + timedelta(d), "block_no": b, "scheduled_mw": float(b)}
+            for site_id in (1, 2) for d in range(days) for b in range(1, 97)]
+    assert len(rows) > 2 * crud.UPSERT_BATCH_SIZE
+    crud.upsert_rows(db, Schedule, rows, ["site_id", "date", "block_no"], ["scheduled_mw"])
+    db.commit()
+    assert db.query(Schedule).count() == len(rows)
+
+    changed = [{**row, "scheduled_mw": row["scheduled_mw"] + 100} for row in rows[::2]]
+    crud.upsert_rows(db, Schedule, changed, ["site_id", "date", "block_no"], ["scheduled_mw"])
+    db.commit()
+    assert db.query(Schedule).count() == len(rows)
+    assert db.query(Schedule).filter(Schedule.scheduled_mw > 100).count() == len(changed)
+
+
+def test_upsert_does_not_commit(db):
+    crud.upsert_rows(db, Schedule, [{"site_id": 1, "date": DAY, "block_no": 1, "scheduled_mw": 1.0}], ["site_id", "date", "block_no"], ["scheduled_mw"])
+    db.rollback()
+    assert db.query(Schedule).count() == 0
@@ -1,5 +1,7 @@
 -- Database Schema for SPRNG DSM Portal
--- Run this in PostgreSQL/Supabase to create tables
+-- Reference DDL. The schema is versioned with Alembic (backend/migrations): `cd backend && alembic upgrade head`.
+-- A database created from this file: `alembic stamp 0001_baseline && alembic upgrade head`.
+-- On Postgres, migration 0003 range-partitions schedules, generations and dsm_settlements by month.
 
 -- Users & Auth
 CREATE TABLE users (
@@ -52,7 +54,9 @@ CREATE TABLE deviations (
     date DATE NOT NULL,
     block_no INTEGER NOT NULL,
     deviation_percent DECIMAL(5,2),  -- (actual - scheduled)/scheduled * 100
-    penalty_band VARCHAR(10)  -- 'none', 'partial', 'full'
+    penalty_band VARCHAR(10),  -- 'none', 'partial', 'full'
+    UNIQUE(site_id, date, block_no),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE dsm_settlements (
@@ -67,6 +71,44 @@ CREATE TABLE dsm_settlements (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- DSM rollups (maintained incrementally with settlements; rebuild via backend/rebuild_rollups.py)
+CREATE TABLE dsm_site_days (
+    rollup_id SERIAL PRIMARY KEY,
+    site_id INTEGER REFERENCES sites(site_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    blocks INTEGER DEFAULT 0,
+    blocks_none INTEGER DEFAULT 0,
+    blocks_partial INTEGER DEFAULT 0,
+    blocks_full INTEGER DEFAULT 0,
+    total_payable DECIMAL(14,2) DEFAULT 0,
+    total_receivable DECIMAL(14,2) DEFAULT 0,
+    net DECIMAL(14,2) DEFAULT 0,  -- receivable - payable
+    max_abs_deviation DECIMAL(8,2),
+    actual_mwh DECIMAL(12,2) DEFAULT 0,
+    energy_revenue DECIMAL(16,2) DEFAULT 0,  -- actual energy x market price
+    UNIQUE(site_id, date),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE dsm_site_months (
+    rollup_id SERIAL PRIMARY KEY,
+    site_id INTEGER REFERENCES sites(site_id) ON DELETE CASCADE,
+    month DATE NOT NULL,  -- First day of month
+    days INTEGER DEFAULT 0,
+    blocks INTEGER DEFAULT 0,
+    blocks_none INTEGER DEFAULT 0,
+    blocks_partial INTEGER DEFAULT 0,
+    blocks_full INTEGER DEFAULT 0,
+    total_payable DECIMAL(16,2) DEFAULT 0,
+    total_receivable DECIMAL(16,2) DEFAULT 0,
+    net DECIMAL(16,2) DEFAULT 0,
+    max_abs_deviation DECIMAL(8,2),
+    actual_mwh DECIMAL(14,2) DEFAULT 0,
+    energy_revenue DECIMAL(18,2) DEFAULT 0,
+    UNIQUE(site_id, month),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Market Prices (from Regent/IEX)
 CREATE TABLE market_prices (
     market_id SERIAL PRIMARY KEY,
@@ -88,9 +130,41 @@ CREATE TABLE weather_data (
     temp DECIMAL(4,2),  -- °C
     wind_speed DECIMAL(4,2),  -- m/s
     cloud_cover INTEGER CHECK (cloud_cover BETWEEN 0 AND 100),  -- %
+    UNIQUE(site_id, date, block_no),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Packed per-site-day series (BLOCK_STORAGE=vectors|both): 96 little-endian float64 per column, NaN = missing block
+CREATE TABLE site_day_blocks (
+    vector_id SERIAL PRIMARY KEY,
+    site_id INTEGER REFERENCES sites(site_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    scheduled_mw BYTEA,
+    actual_mw BYTEA,
+    deviation_percent BYTEA,
+    penalty_code BYTEA,  -- 0 none, 1 partial, 2 full
+    dsm_payable BYTEA,
+    dsm_receivable BYTEA,
+    market_price BYTEA,
+    irradiance BYTEA,
+    temp BYTEA,
+    wind_speed BYTEA,
+    cloud_cover BYTEA,
+    UNIQUE(site_id, date),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Nightly pipeline checkpoints (backend/scheduler.py): site-days already fetched and settled
+CREATE TABLE nightly_checkpoints (
+    checkpoint_id SERIAL PRIMARY KEY,
+    site_id INTEGER REFERENCES sites(site_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    run_id VARCHAR(32) NOT NULL,
+    blocks INTEGER DEFAULT 0,  -- Blocks settled
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(site_id, date)
+);
+
 -- Reports
 CREATE TABLE reports (
     report_id SERIAL PRIMARY KEY,
@@ -98,6 +172,7 @@ CREATE TABLE reports (
     report_type VARCHAR(20),  -- 'daily', 'weekly', 'monthly', 'consolidated'
     period VARCHAR(50),  -- e.g., '2025-10-07' or '2025-W40'
     json_data JSONB,  -- Store chart data, summaries
+    cache_key VARCHAR(64),  -- sha256 of type/period/site + data version stamp
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -115,15 +190,20 @@ CREATE TABLE ai_memory (
     memory_id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
     query TEXT NOT NULL,
-    context JSONB,  -- Previous queries/responses
+    context JSONB,  -- Answer metadata (source, prompt tokens)
     response TEXT,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Indexes for performance
-CREATE INDEX idx_schedules_site_date ON schedules(site_id, date);
-CREATE INDEX idx_generations_site_date ON generations(site_id, date);
-CREATE INDEX idx_deviations_site_date ON deviations(site_id, date);
+-- Rolling per-user summaries of AI turns compacted out of ai_memory
+CREATE TABLE ai_summaries (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    summary TEXT NOT NULL DEFAULT '',
+    turns INTEGER NOT NULL DEFAULT 0,  -- Turns folded in so far
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes for performance (site/date lookups on block tables use their UNIQUE(site_id, date, block_no) index)
 CREATE INDEX idx_market_prices_date ON market_prices(date);
-CREATE INDEX idx_weather_site_date ON weather_data(site_id, date);
 CREATE INDEX idx_ai_memory_user ON ai_memory(user_id);
+CREATE INDEX ix_reports_cache_key ON reports(cache_key);